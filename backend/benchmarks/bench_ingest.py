@@ -0,0 +1,45 @@
+"""
+Benchmark /upload-file ingestion of the same exam as xlsx, CSV, Parquet and
+JSON Lines, all read by upload_main_sheet.
+
+Run from the repository root (Parquet needs pyarrow):
+    python -m backend.benchmarks.bench_ingest
+"""
+import time
+
+from backend import utils
+from backend.benchmarks.synthetic import export_exam_file, make_exam_workbook
+
+
+def _best_of(f, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        f.seek(0)
+        start = time.perf_counter()
+        utils.upload_main_sheet(f)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes=(1000, 10000, 40000), repeat=3):
+    print(f"{'pairs':>8} {'format':>8} {'size (KiB)':>11} {'best (s)':>9} {'vs xlsx':>8}")
+    for size in sizes:
+        workbook = make_exam_workbook(pairs=size, rooms=max(1, size // 32))
+        expected = None
+        xlsx_time = None
+        for upload_format in utils.UPLOAD_FORMATS:
+            f = export_exam_file(workbook, upload_format)
+            assert utils.detect_upload_format(f) == upload_format
+            roster, rooms, college_name, exam_name = utils.upload_main_sheet(f)
+            parsed = ([pair.__getstate__() for pair in roster], utils.find_capacity_per_room(rooms),
+                      college_name, exam_name)
+            expected = expected or parsed
+            assert parsed == expected, upload_format
+            seconds = _best_of(f, repeat)
+            xlsx_time = xlsx_time or seconds
+            print(f"{size:>8} {upload_format:>8} {len(f.getvalue()) / 1024:>11.0f} {seconds:>9.3f} "
+                  f"{xlsx_time / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
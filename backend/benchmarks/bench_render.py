@@ -0,0 +1,47 @@
+"""
+Serial versus process-pool rendering of the room sheets.
+
+Times build_workbook_in_memory plus saving for large synthetic exams, once
+rendering every room sheet in-process and once per pool size with
+render_executor=room_render_pool(n). Pools are started (and warmed up) before
+timing, as a server would keep one running.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_render
+"""
+from io import BytesIO
+import os
+import time
+
+from backend import utils
+from backend.benchmarks.synthetic import make_plan
+
+
+def build_and_save(allocation, roster, render_executor=None) -> float:
+    room_layout, unallocated, branch_counts, branch_ranges = allocation.as_tuple()
+    start = time.perf_counter()
+    wb = utils.build_workbook_in_memory(room_layout, "Synthetic College", "Synthetic Exam", branch_counts,
+                                        unallocated, branch_range_per_room=branch_ranges,
+                                        branch_names=roster.branches, render_executor=render_executor)
+    wb.save(BytesIO())
+    return time.perf_counter() - start
+
+
+def main(sizes=(200, 500), pool_sizes=None):
+    if pool_sizes is None:
+        cpus = os.cpu_count() or 1
+        pool_sizes = sorted({1, 2, 4, cpus} - {n for n in (2, 4) if n > cpus})
+    print(f"{'rooms':>6} {'workers':>8} {'time (s)':>9} {'speedup':>8}")
+    plans = {rooms: make_plan(rooms) for rooms in sizes}
+    for rooms, (roster, allocation) in plans.items():
+        serial = build_and_save(allocation, roster)
+        print(f"{rooms:>6} {'serial':>8} {serial:>9.2f} {1:>8.2f}")
+        for workers in pool_sizes:
+            with utils.room_render_pool(workers) as pool:
+                list(pool.map(utils.find_capacity_per_room, [{}] * workers))  # start workers, import utils
+                elapsed = build_and_save(allocation, roster, pool)
+            print(f"{rooms:>6} {workers:>8} {elapsed:>9.2f} {serial / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark request validation and response serialisation for a 50k-pair
+UploadInfo, typed schemas.UploadInfo against the untyped schema it replaced.
+
+Validation covers parsing the JSON body and turning it into a Roster, as
+_resolve_upload does. Serialisation covers the /upload-file handle (FastAPI's
+validate + dump path vs the orjson response) and echoing the whole body.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_schemas
+"""
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+
+from backend import schemas, utils
+from backend.benchmarks.synthetic import make_exam_workbook
+from backend.main import ORJSONResponse
+
+
+class LegacyUploadInfo(BaseModel):
+    """schemas.UploadInfo before pairs, rooms and room_capacity were typed."""
+    pairs: list
+    rooms: list
+    college_name: str
+    exam_name: str
+    room_capacity: dict
+    blocked_seats: dict[str, list[tuple[int, int]]] | None = None
+    avoid_same_branch: bool = False
+    time_budget: float = 1.0
+    room_objective: str | None = None
+    room_costs: dict[str, float] | None = None
+    building_cost: float = 0.0
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _payload(pairs: int) -> dict:
+    f = make_exam_workbook(pairs=pairs, rooms=max(1, pairs // 32))
+    rooms = list(utils.iter_rooms(f))
+    f.seek(0)
+    college_name, exam_name = utils.upload_college_sem(f)
+    f.seek(0)
+    return {
+        "pairs": list(utils.iter_student_pairs(f)),
+        "rooms": rooms,
+        "college_name": college_name,
+        "exam_name": exam_name,
+        "room_capacity": utils.find_capacity_per_room(rooms),
+    }
+
+
+def main(pairs: int = 50000, repeat: int = 5):
+    payload = _payload(pairs)
+    body = json.dumps(payload).encode()
+    legacy = LegacyUploadInfo.model_validate_json(body)
+    typed = schemas.UploadInfo.model_validate_json(body)
+    handle = {"upload_id": "0" * 64, "college_name": payload["college_name"], "exam_name": payload["exam_name"],
+              "room_capacity": payload["room_capacity"], "total_pairs": pairs}
+    handle_adapter = TypeAdapter(schemas.UploadHandle)
+
+    cases = [
+        ("validate", "legacy", lambda: LegacyUploadInfo.model_validate_json(body)),
+        ("validate", "typed", lambda: schemas.UploadInfo.model_validate_json(body)),
+        ("to roster", "legacy", lambda: utils.as_roster(legacy.model_dump()["pairs"])),
+        ("to roster", "typed", lambda: utils.as_roster(dict(typed)["pairs"])),
+        ("handle", "response_model", lambda: handle_adapter.dump_json(schemas.UploadHandle.model_validate(handle))),
+        ("handle", "orjson", lambda: ORJSONResponse(handle).body),
+        ("echo body", "json.dumps", lambda: json.dumps(jsonable_encoder(legacy)).encode()),
+        ("echo body", "model_dump_json", lambda: typed.model_dump_json()),
+        ("echo body", "orjson", lambda: ORJSONResponse(dict(typed)).body),
+    ]
+    print(f"{pairs} pairs, {len(payload['rooms'])} rooms, body {len(body) / 1024:.0f} KiB")
+    print(f"{'step':<10} {'variant':<16} {'best (ms)':>10}")
+    for step, variant, func in cases:
+        print(f"{step:<10} {variant:<16} {_best_of(func, repeat) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Startup-time benchmark: how long `import backend.main` takes in a fresh
+interpreter, measured with `python -X importtime`.
+
+Each target runs `repeat` times in a new process and keeps its best
+cumulative import time, split into the modules that dominate it. "startup"
+is what a server worker pays before it can answer; "prewarm" adds
+utils.prewarm(), i.e. the pandas and openpyxl imports that are deferred to the
+first upload or workbook. Results are written as JSON and can be compared like
+bench_suite's:
+
+    python -m backend.benchmarks.bench_startup --output startup.json
+    python -m backend.benchmarks.bench_startup --compare startup.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+from backend.benchmarks.bench_suite import REGRESSION_THRESHOLD, environment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TARGETS = {
+    "startup": "import backend.main",
+    "prewarm": "import backend.main; backend.main.utils.prewarm()",
+}
+MODULES = ("fastapi", "pydantic", "numpy", "pandas", "openpyxl", "backend.utils", "backend.workbook")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(code: str) -> tuple:
+    """(total seconds, {module: cumulative seconds}) for the imports `code` triggers in a new interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True,
+                            text=True, check=True)
+    total, modules = 0, {}
+    for match in _LINE.finditer(result.stderr):
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent == 1:
+            total += cumulative  # top-level imports; nested ones are already in their parent's cumulative time
+        if name in MODULES and name not in modules:
+            modules[name] = cumulative
+    return total / 1e6, {name: us / 1e6 for name, us in modules.items()}
+
+
+def run(targets: list, repeat: int = 5) -> dict:
+    results = []
+    print(f"{'target':<8} {'total (s)':>9}  slowest modules (cumulative s)")
+    for target in targets:
+        best = None
+        for _ in range(repeat):
+            total, modules = import_times(TARGETS[target])
+            if best is None or total < best[0]:
+                best = (total, modules)
+        total, modules = best
+        top = ", ".join(f"{name} {seconds:.3f}" for name, seconds in
+                        sorted(modules.items(), key=lambda item: -item[1]))
+        print(f"{target:<8} {total:>9.3f}  {top}")
+        results.append({"target": target, "code": TARGETS[target], "repeat": repeat, "seconds": total,
+                        "modules": modules})
+    return {"environment": environment(), "results": results}
+
+
+def compare(report: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> int:
+    """Print new/old ratios per target; returns how many exceeded threshold."""
+    old = {r["target"]: r for r in baseline["results"]}
+    regressions = 0
+    print(f"\nvs {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')})")
+    print(f"{'target':<8} {'time x':>7}")
+    for result in report["results"]:
+        before = old.get(result["target"])
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{result['target']:<8} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--targets", default=",".join(TARGETS), help="comma separated target names")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_results_startup.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    targets = args.targets.split(",")
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"unknown target: {', '.join(unknown)}")
+
+    report = run(targets, args.repeat)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Peak Python heap while reading the roster: pandas DataFrame + to_dict versus
+the streaming iter_student_pairs reader.
+
+The streaming peak should stay roughly flat as the roster grows.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_streaming
+"""
+import time
+import tracemalloc
+
+import pandas as pd
+
+from backend import utils
+from backend.benchmarks.synthetic import make_exam_workbook
+
+
+def _pandas_records(f):
+    df = pd.read_excel(f, sheet_name="main", usecols=utils.STUDENT_COLUMNS)
+    return len(df.to_dict(orient="records"))
+
+
+def _streaming_count(f):
+    return sum(1 for _ in utils.iter_student_pairs(f))
+
+
+def _measure(func, f):
+    f.seek(0)
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(f)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak / (1024 * 1024)
+
+
+def main(sizes=(5000, 20000, 80000)):
+    print(f"{'pairs':>8} {'pandas MiB':>11} {'stream MiB':>11} {'pandas s':>9} {'stream s':>9}")
+    for size in sizes:
+        f = make_exam_workbook(pairs=size, rooms=max(1, size // 32))
+        n1, t1, m1 = _measure(_pandas_records, f)
+        n2, t2, m2 = _measure(_streaming_count, f)
+        assert n1 == n2 == size
+        print(f"{size:>8} {m1:>11.1f} {m2:>11.1f} {t1:>9.2f} {t2:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Style-object churn while building and saving a large seating plan.
+
+Counts how many openpyxl Font/Alignment/Border/Side/PatternFill objects are
+constructed by the sheet builders, and times building and saving the
+workbook for a synthetic many-room exam. The Side/Border objects that remain
+after the STYLES registry come from openpyxl formatting merged ranges.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_styles
+"""
+from collections import Counter
+from contextlib import contextmanager
+from io import BytesIO
+import time
+
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from backend import utils
+from backend.benchmarks.synthetic import make_plan
+
+STYLE_CLASSES = (Font, Alignment, Border, Side, PatternFill)
+
+
+@contextmanager
+def count_constructions(counter: Counter):
+    """Count instances created of each STYLE_CLASSES class while active."""
+    originals = {cls: cls.__init__ for cls in STYLE_CLASSES}
+
+    def counting(cls, init):
+        def __init__(self, *args, **kwargs):
+            counter[cls.__name__] += 1
+            init(self, *args, **kwargs)
+        return __init__
+
+    for cls, init in originals.items():
+        cls.__init__ = counting(cls, init)
+    try:
+        yield counter
+    finally:
+        for cls, init in originals.items():
+            cls.__init__ = init
+
+
+def measure(rooms: int):
+    roster, allocation = make_plan(rooms)
+    room_layout, unallocated, branch_counts, branch_ranges = allocation.as_tuple()
+
+    counter = Counter()
+    with count_constructions(counter):
+        start = time.perf_counter()
+        wb = utils.build_workbook_in_memory(room_layout, "Synthetic College", "Synthetic Exam", branch_counts,
+                                            unallocated, branch_range_per_room=branch_ranges,
+                                            branch_names=roster.branches)
+        built = time.perf_counter()
+        wb.save(BytesIO())
+        saved = time.perf_counter()
+    return counter, built - start, saved - built
+
+
+def main(sizes=(50, 300)):
+    print(f"{'rooms':>6} {'style objs':>11} {'build (s)':>10} {'save (s)':>9}")
+    for rooms in sizes:
+        counter, build_time, save_time = measure(rooms)
+        print(f"{rooms:>6} {sum(counter.values()):>11} {build_time:>10.2f} {save_time:>9.2f}   {dict(counter)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Timing and memory benchmark suite for the hot paths in utils.py.
+
+For every scale, a synthetic exam is generated and each case below is run
+`repeat` times for its best wall time, then once more under tracemalloc for
+its peak Python heap. Results are printed as a table and written as JSON, so
+two runs can be compared:
+
+    python -m backend.benchmarks.bench_suite --scales small,medium --output before.json
+    python -m backend.benchmarks.bench_suite --scales small,medium --compare before.json
+
+Cases: upload_students, find_capacity_per_room, fill_room, fill_room_row_gap,
+fill_room_col_gap, allocate_seats_spread (greedy pass only), select_rooms,
+_find_consecutive_ranges, build_qpd_sheet, build_msp_base_sheet,
+build_msp_sheet, build_room_sheet (every room), build_workbook (to a
+temporary file) and build_workbook_update (adding the plan to a copy of the
+input workbook).
+"""
+import argparse
+from contextlib import redirect_stdout
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl import Workbook
+
+from backend import utils
+from backend.benchmarks.synthetic import ROLL_FORMATS, make_exam_workbook
+
+# name: (pairs, rooms, branches); rooms are 8 x 4 benches, so normal seating fits about pairs / 32 rooms
+SCALES = {
+    "small": (1000, 32, 4),
+    "medium": (5000, 160, 8),
+    "large": (20000, 640, 12),
+}
+
+REGRESSION_THRESHOLD = 1.2  # --compare flags cases that got this much slower or bigger
+
+
+class Exam:
+    """Inputs shared by the cases of one scale, prepared outside the timed region."""
+
+    def __init__(self, pairs: int, rooms: int, branches: int, roll_format: str):
+        self.file = make_exam_workbook(pairs, rooms, branches=branches, roll_format=roll_format)
+        self.roster, self.rooms, self.college_name, self.exam_name = utils.upload_main_sheet(self.file)
+        self.file.seek(0)
+        self.room_capacity = utils.find_capacity_per_room(self.rooms)
+        (self.room_layout, self.unallocated, self.branch_counts,
+         self.branch_ranges) = utils.fill_room(self.roster, self.room_capacity)
+        self.roll_strings = [pair.roll1 for pair in self.roster] + [pair.roll2 for pair in self.roster]
+
+
+def _upload_students(exam: Exam):
+    exam.file.seek(0)
+    utils.upload_students(exam.file)
+
+def _sheet(build):
+    def run(exam: Exam):
+        build(Workbook().active, exam)
+    return run
+
+def _room_sheets(exam: Exam):
+    wb = Workbook()
+    for room_name, rows in exam.room_layout.items():
+        utils.build_room_sheet(wb.create_sheet(), room_name, rows, exam.college_name, exam.exam_name,
+                               exam.branch_counts.get(room_name, {}), exam.roster.branches)
+
+def _build_workbook(exam: Exam):
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()):
+        utils.build_workbook(exam.room_layout, os.path.join(tmp, "plan.xlsx"), exam.college_name, exam.exam_name,
+                             exam.branch_counts, exam.unallocated, "01-01-2026", "10:00-12:00",
+                             exam.branch_ranges, exam.roster.branches)
+
+def _update_workbook(exam: Exam):
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()):
+        path = os.path.join(tmp, "exam.xlsx")
+        with open(path, "wb") as f:
+            f.write(exam.file.getvalue())
+        utils.build_workbook(exam.room_layout, path, exam.college_name, exam.exam_name, exam.branch_counts,
+                             exam.unallocated, "01-01-2026", "10:00-12:00", exam.branch_ranges, exam.roster.branches)
+
+CASES = {
+    "upload_students": _upload_students,
+    "find_capacity_per_room": lambda exam: utils.find_capacity_per_room(exam.rooms),
+    "fill_room": lambda exam: utils.fill_room(exam.roster, exam.room_capacity),
+    "fill_room_row_gap": lambda exam: utils.fill_room_row_gap(exam.roster, exam.room_capacity),
+    "fill_room_col_gap": lambda exam: utils.fill_room_col_gap(exam.roster, exam.room_capacity),
+    "allocate_seats_spread": lambda exam: utils.allocate_seats_spread(exam.roster, exam.room_capacity, time_budget=0),
+    "select_rooms": lambda exam: utils.select_rooms(exam.room_capacity, len(exam.roster) // 2, "col_gap",
+                                                    objective="invigilators", building_cost=1.0),
+    "_find_consecutive_ranges": lambda exam: utils._find_consecutive_ranges(exam.roll_strings),
+    "build_qpd_sheet": _sheet(lambda ws, exam: utils.build_qpd_sheet(
+        ws, exam.branch_counts, exam.college_name, exam.exam_name, "01-01-2026", "10:00-12:00", exam.unallocated)),
+    "build_msp_base_sheet": _sheet(lambda ws, exam: utils.build_msp_base_sheet(ws, exam.branch_ranges)),
+    "build_msp_sheet": _sheet(lambda ws, exam: utils.build_msp_sheet(ws, exam.branch_ranges)),
+    "build_room_sheet": _room_sheets,
+    "build_workbook": _build_workbook,
+    "build_workbook_update": _update_workbook,
+}
+
+
+def time_case(func, exam: Exam, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(exam)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func, exam: Exam) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(exam)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": {"openpyxl": openpyxl.__version__, "pandas": pd.__version__, "numpy": np.__version__},
+    }
+
+
+def run(scales: list, cases: list, repeat: int = 3, roll_format: str = "newline") -> dict:
+    results = []
+    print(f"{'scale':>7} {'case':<26} {'best (s)':>9} {'peak (KiB)':>11}")
+    for scale in scales:
+        pairs, rooms, branches = SCALES[scale]
+        exam = Exam(pairs, rooms, branches, roll_format)
+        for name in cases:
+            func = CASES[name]
+            seconds = time_case(func, exam, repeat)
+            peak = peak_memory(func, exam)
+            print(f"{scale:>7} {name:<26} {seconds:>9.4f} {peak / 1024:>11.0f}")
+            results.append({"scale": scale, "case": name, "pairs": pairs, "rooms": rooms, "branches": branches,
+                            "roll_format": roll_format, "repeat": repeat, "seconds": seconds, "peak_bytes": peak})
+    return {"environment": environment(), "results": results}
+
+
+def compare(report: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> int:
+    """Print new/old ratios per case; returns how many exceeded threshold."""
+    old = {(r["scale"], r["case"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\nvs {baseline['environment'].get('commit')} ({baseline['environment'].get('timestamp')})")
+    print(f"{'scale':>7} {'case':<26} {'time x':>7} {'peak x':>7}")
+    for result in report["results"]:
+        before = old.get((result["scale"], result["case"]))
+        if before is None:
+            continue
+        time_ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        peak_ratio = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else float("inf")
+        flag = "  REGRESSION" if time_ratio > threshold or peak_ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{result['scale']:>7} {result['case']:<26} {time_ratio:>7.2f} {peak_ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scales", default="small,medium", help=f"comma separated, from {', '.join(SCALES)}")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma separated case names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--roll-format", default="newline", choices=sorted(ROLL_FORMATS))
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    scales = args.scales.split(",")
+    cases = args.cases.split(",")
+    unknown = [s for s in scales if s not in SCALES] + [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"unknown scale or case: {', '.join(unknown)}")
+
+    report = run(scales, cases, args.repeat, args.roll_format)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark /upload-file ingestion: three separate "main" sheet reads versus
+the single-pass upload_main_sheet.
+
+Run from the repository root:
+    python -m backend.benchmarks.bench_upload
+"""
+import time
+
+from backend import utils
+from backend.benchmarks.synthetic import make_exam_workbook
+
+
+def _three_pass(f):
+    pairs = utils.upload_students(f)
+    f.seek(0)
+    rooms = utils.upload_rooms(f)
+    f.seek(0)
+    college_name, exam_name = utils.upload_college_sem(f)
+    f.seek(0)
+    return pairs, rooms, college_name, exam_name
+
+
+def _single_pass(f):
+    result = utils.upload_main_sheet(f)
+    f.seek(0)
+    return result
+
+
+def _labels(roster):
+    return [pair.labels(roster.branches) for pair in roster.pairs]
+
+
+def _best_of(func, f, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(f)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes=(1000, 10000, 40000), repeat=3):
+    print(f"{'pairs':>8} {'3-pass (s)':>12} {'1-pass (s)':>12} {'speedup':>8}")
+    for size in sizes:
+        f = make_exam_workbook(pairs=size, rooms=max(1, size // 32))
+        pairs, *three = _three_pass(f)
+        roster, *single = _single_pass(f)
+        assert _labels(utils.Roster.from_pairs(pairs)) == _labels(roster) and three == single
+        three = _best_of(_three_pass, f, repeat)
+        single = _best_of(_single_pass, f, repeat)
+        print(f"{size:>8} {three:>12.3f} {single:>12.3f} {three / single:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
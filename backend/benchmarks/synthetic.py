@@ -0,0 +1,127 @@
+"""
+Synthetic exam workbook generator for benchmarks.
+
+make_exam_workbook produces a workbook with a "main" sheet in the same layout
+the upload endpoint expects:
+
+    Roll No. Series-1 | Roll No. Series-2 | Room No. | Row | Column | College Name | Exam Name
+
+export_exam_file converts such a workbook to the CSV, Parquet or JSON Lines
+uploads /upload-file also accepts. make_plan skips the workbook and returns an
+allocated plan directly.
+"""
+import csv
+from io import BytesIO, StringIO
+import json
+
+from openpyxl import Workbook
+
+from backend import utils
+from backend.utils import MAIN_SHEET_COLUMNS
+
+SEMESTERS = ("II", "IV", "VI", "VIII")
+
+# How a (series base, index, branch) becomes a cell, for each roll format the parser accepts
+ROLL_FORMATS = {
+    "newline": lambda base, i, branch: f"{base + i}\n{branch}",            # 2200970130001\nIT-II
+    "space": lambda base, i, branch: f"{base + i} {branch}",                # 2200970130001 IT-II
+    "prefixed": lambda base, i, branch: f"CS{base // 10**11}B{i:05d}\n{branch}",  # CS22B00001\nIT-II
+    "suffixed": lambda base, i, branch: f"{base % 10**6 + i}A\n{branch}",        # 130001A\nIT-II
+    "numeric": lambda base, i, branch: base + i,                           # 2200970130001, no branch
+}
+
+
+def branch_names(count: int) -> tuple:
+    """count distinct 'BRANCH-SEM' names, e.g. ('BR0-II', 'BR1-IV', ...)."""
+    return tuple(f"BR{b}-{SEMESTERS[b % len(SEMESTERS)]}" for b in range(count))
+
+
+def make_exam_workbook(pairs: int = 1000, rooms: int = 40, rows: int = 8, cols: int = 4,
+                       branches: tuple = ("IT-II", "AI-DS-IV"),
+                       college_name: str = "Synthetic College of Engineering",
+                       exam_name: str = "Synthetic Exam", roll_format: str = "newline"):
+    """
+    Build a synthetic exam workbook and return it as a BytesIO.
+
+    Args:
+        pairs: Number of rows of student pairs (each row seats two students)
+        rooms: Number of rooms listed in the room columns
+        rows: Rows of benches in every room
+        cols: Columns of benches in every room
+        branches: Branch names, or a number of branches to generate with branch_names;
+            Series-1 and Series-2 cycle through them in blocks
+        college_name: Value written to the first 'College Name' cell
+        exam_name: Value written to the first 'Exam Name' cell
+        roll_format: One of ROLL_FORMATS
+    """
+    if isinstance(branches, int):
+        branches = branch_names(branches)
+    if roll_format not in ROLL_FORMATS:
+        raise ValueError(f"Unknown roll format '{roll_format}', expected one of {sorted(ROLL_FORMATS)}")
+    cell = ROLL_FORMATS[roll_format]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("main")
+    ws.append(MAIN_SHEET_COLUMNS)
+
+    block = max(1, pairs // max(1, len(branches)))
+    for i in range(max(pairs, rooms)):
+        row = [None] * len(MAIN_SHEET_COLUMNS)
+        if i < pairs:
+            b1 = branches[(i // block) % len(branches)]
+            b2 = branches[(i // block + 1) % len(branches)]
+            row[0] = cell(2200970130000, i, b1)
+            row[1] = cell(2100971630000, i, b2)
+        if i < rooms:
+            row[2] = f"R-{i + 1:03d}"
+            row[3] = rows
+            row[4] = cols
+        if i == 0:
+            row[5] = college_name
+            row[6] = exam_name
+        ws.append(row)
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def export_exam_file(workbook: BytesIO, upload_format: str) -> BytesIO:
+    """Return the "main" sheet of a make_exam_workbook result as an upload in another format."""
+    if upload_format == "xlsx":
+        return BytesIO(workbook.getvalue())
+    rows = list(utils.iter_main_sheet(BytesIO(workbook.getvalue())))
+    if upload_format == "csv":
+        text = StringIO()
+        writer = csv.writer(text)
+        writer.writerow(MAIN_SHEET_COLUMNS)
+        writer.writerows(rows)
+        return BytesIO(text.getvalue().encode("utf-8"))
+    if upload_format == "jsonl":
+        lines = (json.dumps(dict(zip(MAIN_SHEET_COLUMNS, row))) for row in rows)
+        return BytesIO("\n".join(lines).encode("utf-8"))
+    if upload_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Roll columns may mix ints and text, so they are stored as strings like a CSV would
+        columns = {name: [None if value is None else str(value) for value in values]
+                   if name in utils.STUDENT_COLUMNS else list(values)
+                   for name, values in zip(MAIN_SHEET_COLUMNS, zip(*rows))}
+        buffer = BytesIO()
+        pq.write_table(pa.table(columns), buffer)
+        buffer.seek(0)
+        return buffer
+    raise ValueError(f"Unknown upload format '{upload_format}', expected one of {utils.UPLOAD_FORMATS}")
+
+
+def make_plan(rooms: int, rows: int = 8, cols: int = 4, branches: int = 6):
+    """Return (roster, Allocation) for rooms full rooms of rows x cols benches."""
+    names = branch_names(branches)
+    pairs = [{"Roll No. Series-1": f"{2200970130000 + i}\n{names[i % branches]}",
+              "Roll No. Series-2": f"{2100971630000 + i}\n{names[(i + 1) % branches]}"}
+             for i in range(rooms * rows * cols)]
+    room_capacity = {f"R-{r + 1:03d}": {"rows": rows, "cols": cols, "capacity": rows * cols} for r in range(rooms)}
+    roster = utils.as_roster(pairs)
+    return roster, utils.allocate_seats(roster, room_capacity)
@@ -0,0 +1,243 @@
+"""
+Background generation of seating plans.
+
+POST /jobs/{mode} queues a plan on a local ProcessPoolExecutor and returns a
+job id straight away. The workbook is allocated, built and saved to a
+temporary directory in a worker process, so several large plans run on
+separate cores without holding a request thread or the server's GIL. Workers
+send progress back over a multiprocessing queue that a listener thread folds
+into the job table; no external broker is involved.
+"""
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from backend import utils
+
+MAX_WORKERS = int(os.environ.get("SEATING_JOB_WORKERS", 0)) or os.cpu_count() or 1
+TTL_SECONDS = 60 * 60
+MAX_JOBS = 256
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """
+    State of one background plan, as reported by GET /jobs/{job_id}.
+
+    Attributes:
+        stage: Human readable step ('queued', 'allocating', 'rendering', 'saving', ...)
+        done, total: Room sheets rendered so far out of the total
+        path: Finished workbook on disk, once status is DONE
+    """
+
+    __slots__ = ("job_id", "mode", "filename", "status", "stage", "done", "total",
+                 "unallocated", "same_branch_neighbours", "error", "path", "created_at", "finished_at", "future")
+
+    def __init__(self, job_id: str, mode: str, filename: str):
+        self.job_id = job_id
+        self.mode = mode
+        self.filename = filename
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.done = 0
+        self.total = 0
+        self.unallocated = None
+        self.same_branch_neighbours = None
+        self.error = None
+        self.path = None
+        self.created_at = time.monotonic()
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def as_dict(self) -> dict:
+        if self.status == DONE:
+            progress = 1.0
+        else:
+            progress = self.done / self.total if self.total else 0.0
+        return {
+            "job_id": self.job_id,
+            "mode": self.mode,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "progress": round(progress, 4),
+            "unallocated": self.unallocated,
+            "same_branch_neighbours": self.same_branch_neighbours,
+            "error": self.error,
+        }
+
+
+# Worker side ---------------------------------------------------------------
+
+_progress_queue = None
+
+
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+
+
+def _report(job_id: str, stage: str, done: int = 0, total: int = 0):
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, stage, done, total))
+
+
+def run_job(job_id: str, upload: dict, mode: str, blocked_seats: dict, output_dir: str,
+            date: str = "", shift_time: str = "", avoid_same_branch: bool = False, time_budget: float = 1.0) -> dict:
+    """Build one plan in a worker process and save it under output_dir."""
+    _report(job_id, "allocating")
+
+    def progress(done, total):
+        _report(job_id, "rendering", done, total)
+
+    wb, allocation = utils.generate_plan_workbook(upload["pairs"], upload["room_capacity"], upload["college_name"],
+                                                  upload["exam_name"], mode, blocked_seats, progress,
+                                                  date=date, shift_time=shift_time,
+                                                  avoid_same_branch=avoid_same_branch, time_budget=time_budget)
+    _report(job_id, "saving")
+    path = os.path.join(output_dir, f"{job_id}.xlsx")
+    wb.save(path)
+    wb.close()
+    return {"path": path, "unallocated": allocation.unallocated,
+            "same_branch_neighbours": utils.adjacency_stats(allocation)["total"]}
+
+
+# Server side ---------------------------------------------------------------
+
+class JobManager:
+    """
+    Thread-safe table of background jobs backed by a lazily started process pool.
+
+    Args:
+        max_workers: Worker processes in the pool
+        ttl_seconds: Seconds a finished job (and its file) is kept
+        max_jobs: Finished jobs kept at most; the oldest are dropped first
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, ttl_seconds: float = TTL_SECONDS, max_jobs: int = MAX_JOBS):
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self._jobs = {}  # {job_id: Job}, in submission order
+        self._lock = threading.Lock()
+        self._executor = None
+        self._queue = None
+        self._listener = None
+        self._output_dir = None
+
+    def _start(self):
+        # spawn, not fork: the server process runs threads that a forked child would inherit mid-state
+        context = multiprocessing.get_context("spawn")
+        self._queue = context.Queue()
+        self._output_dir = tempfile.mkdtemp(prefix="seating-plans-")
+        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                             initializer=_init_worker, initargs=(self._queue,))
+        self._listener = threading.Thread(target=self._listen, name="job-progress", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        for job_id, stage, done, total in iter(self._queue.get, None):
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.finished:
+                    continue  # progress that arrived after the result
+                job.status = RUNNING
+                job.stage = stage
+                if total:
+                    job.done, job.total = done, total
+
+    def submit(self, upload: dict, mode: str, filename: str, blocked_seats: dict = None,
+               date: str = "", shift_time: str = "", avoid_same_branch: bool = False, time_budget: float = 1.0) -> Job:
+        """Queue a plan for the given parsed upload and return its Job."""
+        job = Job(uuid.uuid4().hex, mode, filename)
+        payload = {key: upload[key] for key in ("pairs", "room_capacity", "college_name", "exam_name")}
+        with self._lock:
+            if self._executor is None:
+                self._start()
+            self._purge()
+            self._jobs[job.job_id] = job
+            job.future = self._executor.submit(run_job, job.job_id, payload, mode, blocked_seats, self._output_dir,
+                                               date, shift_time, avoid_same_branch, time_budget)
+        job.future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def wait(self, job: Job, timeout: float = None) -> Job:
+        """Block until job has finished (or failed) and return it."""
+        concurrent.futures.wait([job.future], timeout)
+        if job.future.done():
+            self._finish(job, job.future)  # waiters wake before done callbacks run
+        return job
+
+    def _finish(self, job: Job, future):
+        with self._lock:
+            if job.finished:
+                return
+            try:
+                result = future.result()
+            except Exception as exc:
+                job.status = job.stage = FAILED
+                job.error = str(exc) or type(exc).__name__
+            else:
+                job.status = job.stage = DONE
+                job.path = result["path"]
+                job.unallocated = result["unallocated"]
+                job.same_branch_neighbours = result["same_branch_neighbours"]
+                job.done = job.total
+            job.finished_at = time.monotonic()
+
+    def get(self, job_id: str):
+        """Return the Job, or None if unknown or expired."""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id: str):
+        """Forget a finished job and delete its file."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                self._drop(job)
+
+    def _drop(self, job: Job):
+        del self._jobs[job.job_id]
+        if job.path:
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+
+    def _purge(self):
+        now = time.monotonic()
+        finished = [job for job in self._jobs.values() if job.finished]
+        expired = [job for job in finished if job.finished_at + self.ttl_seconds <= now]
+        expired += [job for job in finished if job not in expired][:max(0, len(finished) - len(expired) - self.max_jobs)]
+        for job in expired:
+            self._drop(job)
+
+    def shutdown(self):
+        """Stop the pool, cancel queued jobs and delete finished files."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            output_dir, self._output_dir = self._output_dir, None
+            self._jobs.clear()
+        if executor is None:
+            return
+        executor.shutdown(wait=True, cancel_futures=True)
+        self._queue.put(None)
+        self._listener.join()
+        shutil.rmtree(output_dir, ignore_errors=True)
@@ -1,184 +1,511 @@
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import StreamingResponse
-from io import BytesIO
-import tempfile
+from contextlib import asynccontextmanager
+import json
 import os
-import time
-from backend import utils, schemas
+import re
+import sys
+import threading
+import uuid
+from zipfile import ZIP_STORED, ZipFile
+
+import anyio
+from fastapi import FastAPI, File, Header, HTTPException, UploadFile
+from fastapi.responses import FileResponse, Response, StreamingResponse
+import orjson
+from backend import metrics, utils, schemas
+from backend.jobs import DONE, FAILED, JobManager
+from backend.result_cache import ResultCache, cache_key, iter_file
 from backend.schemas import UploadInfo
+from backend.upload_cache import UploadCache, content_hash, estimate_size
+
+upload_cache = UploadCache()
+plan_cache = UploadCache(max_entries=32)  # {plan_id: plan} kept for /plans/{plan_id}/replan
+job_manager = JobManager()
+result_cache = ResultCache(os.environ.get("SEATING_RESULT_CACHE_DIR"))  # finished workbooks by request key
+render_pool = None  # room_render_pool shared by the generate endpoints when SEATING_RENDER_WORKERS > 0
+ingest_limiter = None  # caps the threads parsing uploads, created on the first upload
+
+MAX_UPLOAD_BYTES = int(os.environ.get("SEATING_MAX_UPLOAD_BYTES", 0)) or 100 * 1024 * 1024
+INGEST_WORKERS = int(os.environ.get("SEATING_INGEST_WORKERS", 0)) or 2
+PREWARM = os.environ.get("SEATING_PREWARM", "0") not in ("", "0")
+
+class ORJSONResponse(Response):
+    """JSON rendered by orjson: much faster for large bodies, and NaN/inf become null instead of raising."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that answers 413 to request bodies over max_bytes on the given paths.
+
+    A declared Content-Length is checked before anything is read; otherwise the
+    body is counted as it arrives and reading stops as soon as it passes the limit.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: tuple):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        detail = f"Upload is larger than the limit of {self.max_bytes} bytes"
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await ORJSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
 
-app = FastAPI()
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)  # re-raised by FastAPI's body parsing
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global render_pool
+    render_workers = int(os.environ.get("SEATING_RENDER_WORKERS", 0))
+    if render_workers > 0:
+        render_pool = utils.room_render_pool(render_workers)
+    if PREWARM:
+        # Load pandas and openpyxl while the server already answers, rather than in the first upload or download
+        threading.Thread(target=utils.prewarm, name="prewarm", daemon=True).start()
+    yield
+    job_manager.shutdown()
+    result_cache.close()
+    if render_pool is not None:
+        render_pool.shutdown(cancel_futures=True)
+        render_pool = None
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, paths=("/upload-file",))
+app.add_middleware(metrics.ServerTimingMiddleware)
+
+def _resolve_upload(info: schemas.UploadRef | schemas.UploadInfo) -> dict:
+    """Return the parsed upload for a handle, or the inline UploadInfo body."""
+    if isinstance(info, schemas.UploadRef):
+        upload = upload_cache.get(info.upload_id)
+        if upload is None:
+            raise HTTPException(status_code=404, detail="Upload not found or expired, please upload the file again")
+        return upload
+    upload = dict(info)  # fields are plain dicts and lists already, no need to dump
+    upload["pairs"] = utils.as_roster(info.pairs)
+    return upload
+
+def _observe(allocation: utils.Allocation):
+    """Add a finished allocation to the student and room counters."""
+    metrics.STUDENTS.inc(2 * len(allocation.roster) - allocation.unallocated, event="seated")
+    metrics.STUDENTS.inc(allocation.unallocated, event="unallocated")
+    metrics.ROOMS.inc(len(allocation.seats))
 
 @app.get('/root')
 def root():
     return {"message": "Exam Hall Seat Allocation System"}
 
-@app.post('/upload-file', response_model= schemas.UploadInfo)
-async def upload_file(file: UploadFile = File(...)):
-    f = file.file
-    
-    pairs = utils.upload_students(f)
-    f.seek(0)
+@app.get('/metrics')
+def prometheus_metrics():
+    """Request latency, stage timings and counters in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
-    rooms = utils.upload_rooms(f)
-    f.seek(0)
+def _ingest(f) -> dict:
+    """Hash and parse an uploaded file, reusing the cached parse of an identical file; returns its handle."""
+    # Identical files share a handle and skip parsing entirely
+    upload_id = content_hash(f)
+    upload = upload_cache.get(upload_id)
 
-    college_name, exam_name = utils.upload_college_sem(f)
-    f.seek(0)
+    if upload is None:
+        # Parse the "main" sheet (or CSV/Parquet/JSON Lines table) once instead of once per section
+        try:
+            roster, rooms, college_name, exam_name = utils.upload_main_sheet(f)
+        except ValueError as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        f.seek(0)
+        metrics.STUDENTS.inc(2 * len(roster), event="parsed")
 
-    room_capacity = utils.find_capacity_per_room(rooms)
-    f.seek(0)
+        upload = {
+            "pairs": roster,
+            "rooms": rooms,
+            "college_name": college_name,
+            "exam_name": exam_name,
+            "room_capacity": utils.find_capacity_per_room(rooms)
+        }
+        if not upload_cache.put(upload_id, upload):
+            # Handing out the id anyway would only move the failure to a 404 on the next request
+            raise HTTPException(status_code=413, detail="Upload is too large to keep on the server")
 
+    metrics.annotate(pairs=len(upload["pairs"]))
     return {
-        "pairs": pairs,
-        "rooms": rooms,
-        "college_name": college_name,
-        "exam_name": exam_name,
-        "room_capacity": room_capacity
+        "upload_id": upload_id,
+        "college_name": upload["college_name"],
+        "exam_name": upload["exam_name"],
+        "room_capacity": upload["room_capacity"],
+        "total_pairs": len(upload["pairs"])
     }
 
-@app.post('/generate-plan')
-def generate_plan(info: schemas.UploadInfo):
-    room_layout, branch_counts_per_room = utils.fill_room(info.pairs, info.room_capacity)
-    
-    # Generate workbook in memory
-    wb = utils.build_workbook_in_memory(room_layout, info.college_name, info.exam_name, branch_counts_per_room)
-    
-    # Save to temporary file to ensure complete write
-    tmp_path = None
+@app.post('/upload-file', response_model= schemas.UploadHandle, response_class=ORJSONResponse)
+async def upload_file(file: UploadFile = File(...)):
+    global ingest_limiter
+    if ingest_limiter is None:
+        ingest_limiter = anyio.CapacityLimiter(INGEST_WORKERS)
+    # Starlette has already spooled the file to disk in chunks while it was received. Hashing and
+    # parsing are CPU-bound, so they run on a few worker threads while the event loop keeps serving.
+    handle = await anyio.to_thread.run_sync(_ingest, file.file, limiter=ingest_limiter)
+    # Built from clean ingested values, so it is rendered directly instead of being validated again
+    return ORJSONResponse(handle)
+
+def _select_rooms(upload: dict, info, mode: str) -> dict:
+    """The upload with the rooms chosen by info.room_objective moved to the front of its catalogue."""
+    if info.room_objective is None:
+        return upload
+    room_masks = utils.masks_from_blocked_seats(upload["room_capacity"], info.blocked_seats)
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-            tmp_path = tmp_file.name
-        
-        # Save workbook and ensure it's closed
-        wb.save(tmp_path)
-        wb.close()
-        
-        # Ensure file is fully written by checking file size is stable
-        prev_size = 0
-        for _ in range(10):  # Check up to 10 times
-            if os.path.exists(tmp_path):
-                current_size = os.path.getsize(tmp_path)
-                if current_size == prev_size and current_size > 0:
-                    break
-                prev_size = current_size
-            time.sleep(0.1)
-        
-        # Read the complete file into BytesIO
-        with open(tmp_path, 'rb') as f:
-            file_bytes = f.read()
-        
-        # Create BytesIO from complete bytes
-        file_stream = BytesIO(file_bytes)
-        
-        # Return as streaming response
-        return StreamingResponse(
-            file_stream,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=seating_plan.xlsx"}
-        )
-    finally:
-        # Clean up temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        with metrics.span("select_rooms"):
+            room_capacity = utils.select_rooms(upload["room_capacity"], len(upload["pairs"]), mode, room_masks,
+                                               info.room_objective, info.room_costs, info.building_cost)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {**upload, "room_capacity": room_capacity}
+
+def _result_key(info: schemas.UploadRef | schemas.UploadInfo, mode: str) -> str:
+    """Cache key of the workbook a generate request produces: its students and rooms, mode and options."""
+    if isinstance(info, schemas.UploadRef):
+        source = info.upload_id  # already a content hash of the uploaded file
+    else:
+        source = info.model_dump(include={"pairs", "rooms", "college_name", "exam_name", "room_capacity"})
+    options = info.model_dump(exclude={"upload_id", "pairs", "rooms", "college_name", "exam_name", "room_capacity"})
+    # The same benches listed in another order or twice block the same seats
+    options["blocked_seats"] = {room: sorted(set(map(tuple, seats)))
+                                for room, seats in (info.blocked_seats or {}).items() if seats}
+    return cache_key("generate", source, mode, options)
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def _cached_workbook(key: str, if_none_match: str | None):
+    """304 if the client has the result already, the cached file if there is one, else None."""
+    etag = f'"{key}"'
+    if _etag_matches(if_none_match, etag):
+        metrics.RESULT_CACHE.inc(result="not_modified")
+        return Response(status_code=304, headers={"ETag": etag})
+    cached = result_cache.open(key)
+    if cached is None:
+        metrics.RESULT_CACHE.inc(result="miss")
+        return None
+    metrics.RESULT_CACHE.inc(result="hit")
+    file, size, headers = cached
+    return StreamingResponse(iter_file(file), media_type=utils.XLSX_MEDIA_TYPE,
+                             headers={**headers, "ETag": etag, "Content-Length": str(size)})
+
+def _workbook_response(key: str, wb, headers: dict) -> StreamingResponse:
+    """Stream a new workbook while it is saved, keeping a copy in the result cache."""
+    return StreamingResponse(result_cache.store(key, utils.iter_workbook_bytes(wb), headers),
+                             media_type=utils.XLSX_MEDIA_TYPE, headers={**headers, "ETag": f'"{key}"'})
+
+def _plan_filename(mode: str) -> str:
+    return "seating_plan.xlsx" if mode == "normal" else f"seating_plan_{mode}.xlsx"
+
+def _generate(info: schemas.UploadRef | schemas.UploadInfo, mode: str, filename: str, if_none_match: str = None):
+    metrics.annotate(mode=mode)
+    key = _result_key(info, mode)
+    cached = _cached_workbook(key, if_none_match)
+    if cached is not None:
+        return cached
+
+    upload = _resolve_upload(info)
+    metrics.annotate(pairs=len(upload["pairs"]))
+    upload = _select_rooms(upload, info, mode)
+
+    # Build the workbook in memory and stream it while it is saved
+    wb, allocation = utils.generate_plan_workbook(upload["pairs"], upload["room_capacity"], upload["college_name"],
+                                                  upload["exam_name"], mode, info.blocked_seats,
+                                                  render_executor=render_pool, avoid_same_branch=info.avoid_same_branch,
+                                                  time_budget=info.time_budget)
+    _observe(allocation)
+
+    return _workbook_response(key, wb, {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Unallocated-Seats": str(allocation.unallocated),
+        "Rooms-Used": str(len(allocation.seats)),
+        "Same-Branch-Neighbours": str(utils.adjacency_stats(allocation)["total"])
+    })
+
+@app.post('/generate-plan')
+def generate_plan(info: schemas.UploadRef | schemas.UploadInfo, if_none_match: str | None = Header(None)):
+    return _generate(info, "normal", "seating_plan.xlsx", if_none_match)
 
 @app.post('/generate-plan-row-gap')
-def generate_plan_row_gap(info: schemas.UploadInfo):
-    room_layout, unallocated, branch_counts_per_room = utils.fill_room_row_gap(info.pairs, info.room_capacity)
-    
-    # Generate workbook in memory
-    wb = utils.build_workbook_in_memory(room_layout, info.college_name, info.exam_name, branch_counts_per_room)
-    
-    # Save to temporary file to ensure complete write
-    tmp_path = None
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-            tmp_path = tmp_file.name
-        
-        # Save workbook and ensure it's closed
-        wb.save(tmp_path)
-        wb.close()
-        
-        # Ensure file is fully written by checking file size is stable
-        import time
-        prev_size = 0
-        for _ in range(10):  # Check up to 10 times
-            if os.path.exists(tmp_path):
-                current_size = os.path.getsize(tmp_path)
-                if current_size == prev_size and current_size > 0:
-                    break
-                prev_size = current_size
-            time.sleep(0.1)
-        
-        # Read the complete file into BytesIO
-        with open(tmp_path, 'rb') as f:
-            file_bytes = f.read()
-        
-        # Create BytesIO from complete bytes
-        file_stream = BytesIO(file_bytes)
-        
-        # Return as streaming response with unallocated count in headers
-        return StreamingResponse(
-            file_stream,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": "attachment; filename=seating_plan_row_gap.xlsx",
-                "Unallocated-Seats": str(unallocated)
-            }
-        )
-    finally:
-        # Clean up temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+def generate_plan_row_gap(info: schemas.UploadRef | schemas.UploadInfo, if_none_match: str | None = Header(None)):
+    return _generate(info, "row_gap", "seating_plan_row_gap.xlsx", if_none_match)
 
 @app.post('/generate-plan-col-gap')
-def generate_plan_col_gap(info: schemas.UploadInfo):
-    room_layout, unallocated, branch_counts_per_room = utils.fill_room_col_gap(info.pairs, info.room_capacity)
-    
-    # Generate workbook in memory
-    wb = utils.build_workbook_in_memory(room_layout, info.college_name, info.exam_name, branch_counts_per_room)
-    
-    # Save to temporary file to ensure complete write
-    tmp_path = None
+def generate_plan_col_gap(info: schemas.UploadRef | schemas.UploadInfo, if_none_match: str | None = Header(None)):
+    return _generate(info, "col_gap", "seating_plan_col_gap.xlsx", if_none_match)
+
+@app.post('/generate-plan-checkerboard')
+def generate_plan_checkerboard(info: schemas.UploadRef | schemas.UploadInfo, if_none_match: str | None = Header(None)):
+    return _generate(info, "checkerboard", "seating_plan_checkerboard.xlsx", if_none_match)
+
+@app.post('/jobs/{mode}', response_model=schemas.JobStatus, status_code=202)
+def submit_job(mode: str, info: schemas.UploadRef | schemas.UploadInfo):
+    """Queue a plan for background generation and return its job id right away."""
+    if mode not in utils.SEAT_MASKS:
+        raise HTTPException(status_code=404, detail=f"Unknown seating mode '{mode}'")
+    upload = _resolve_upload(info)
+    metrics.annotate(mode=mode, pairs=len(upload["pairs"]))
+    upload = _select_rooms(upload, info, mode)
+    job = job_manager.submit(upload, mode, _plan_filename(mode), info.blocked_seats,
+                             avoid_same_branch=info.avoid_same_branch, time_budget=info.time_budget)
+    return job.as_dict()
+
+def _get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get('/jobs/{job_id}', response_model=schemas.JobStatus)
+def job_status(job_id: str):
+    return _get_job(job_id).as_dict()
+
+@app.get('/jobs/{job_id}/file')
+def job_file(job_id: str):
+    job = _get_job(job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+    return FileResponse(
+        job.path,
+        media_type=utils.XLSX_MEDIA_TYPE,
+        filename=job.filename,
+        headers={"Unallocated-Seats": str(job.unallocated)}
+    )
+
+def _plan_size(plan: dict) -> int:
+    """Estimated bytes of a stored plan: its allocation and the room sheets rendered for it so far."""
+    allocation = plan["allocation"]
+    size = sys.getsizeof(allocation.roster) + allocation.waiting.nbytes
+    size += sum(grid.nbytes for grid in allocation.seats.values())
+    size += estimate_size(allocation.branch_counts) + estimate_size(allocation.branch_ranges)
+    size += sum(sys.getsizeof(xml) + estimate_size(style_table) for xml, style_table in plan["room_parts"].values())
+    return size
+
+def _store_plan(allocation: utils.Allocation, college_name: str, exam_name: str, room_parts: dict,
+                changed_rooms: list, moved: int = 0, unseated: int = 0) -> dict:
+    plan_id = uuid.uuid4().hex
+    plan = {
+        "allocation": allocation,
+        "college_name": college_name,
+        "exam_name": exam_name,
+        "room_parts": room_parts  # {room: rendered sheet}, filled on download
+    }
+    if not plan_cache.put(plan_id, plan, _plan_size(plan)):
+        raise HTTPException(status_code=507, detail="Plan is too large to keep on the server")
+    return {
+        "plan_id": plan_id,
+        "mode": allocation.mode,
+        "total_pairs": len(allocation.roster),
+        "rooms": len(allocation.seats),
+        "unallocated": allocation.unallocated,
+        "changed_rooms": changed_rooms,
+        "moved": moved,
+        "unseated": unseated,
+        "adjacency": utils.adjacency_stats(allocation)
+    }
+
+def _get_plan(plan_id: str) -> dict:
+    plan = plan_cache.get(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Plan not found or expired")
+    return plan
+
+def _allocate(info: schemas.UploadRef | schemas.UploadInfo, mode: str) -> tuple:
+    """(upload, Allocation) for a request body, without building a workbook."""
+    if mode not in utils.SEAT_MASKS:
+        raise HTTPException(status_code=404, detail=f"Unknown seating mode '{mode}'")
+    upload = _resolve_upload(info)
+    metrics.annotate(mode=mode, pairs=len(upload["pairs"]))
+    upload = _select_rooms(upload, info, mode)
+    room_masks = utils.masks_from_blocked_seats(upload["room_capacity"], info.blocked_seats)
+    with metrics.span("allocate"):
+        if info.avoid_same_branch:
+            allocation = utils.allocate_seats_spread(upload["pairs"], upload["room_capacity"], mode, room_masks,
+                                                     info.time_budget)
+        else:
+            allocation = utils.allocate_seats(upload["pairs"], upload["room_capacity"], mode, room_masks)
+    _observe(allocation)
+    return upload, allocation
+
+@app.post('/preview/{mode}', response_model=schemas.PlanPreview)
+def preview(mode: str, info: schemas.UploadRef | schemas.UploadInfo):
+    """Seat layout as compact per-room matrices, for showing a plan without building an xlsx."""
+    _, allocation = _allocate(info, mode)
+    return utils.allocation_preview(allocation)
+
+@app.post('/plans/{mode}', response_model=schemas.PlanHandle)
+def create_plan(mode: str, info: schemas.UploadRef | schemas.UploadInfo):
+    """Allocate seats and keep the allocation server-side, so it can be re-planned incrementally."""
+    upload, allocation = _allocate(info, mode)
+    return _store_plan(allocation, upload["college_name"], upload["exam_name"], {}, list(allocation.seats))
+
+@app.post('/plans/{plan_id}/replan', response_model=schemas.PlanHandle)
+def replan(plan_id: str, delta: schemas.PlanDelta):
+    """Apply late registrations, withdrawals or room changes to a plan; returns a new plan_id."""
+    plan = _get_plan(plan_id)
+    allocation = plan["allocation"]
+    unknown = [room for room in delta.remove_rooms if room not in allocation.room_capacity]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown room(s): {', '.join(unknown)}")
+
+    metrics.annotate(mode=allocation.mode, pairs=len(allocation.roster))
+    with metrics.span("allocate"):
+        result = utils.replan_seats(allocation, delta.add_pairs, delta.remove_rolls, delta.add_rooms, delta.remove_rooms)
+    _observe(result.allocation)
+    # Room sheets that did not change are reused as already rendered
+    changed = set(result.changed_rooms)
+    room_parts = {room: part for room, part in plan["room_parts"].items()
+                  if room in result.allocation.seats and room not in changed}
+    return _store_plan(result.allocation, plan["college_name"], plan["exam_name"], room_parts,
+                       result.changed_rooms, result.moved, result.unseated)
+
+@app.get('/plans/{plan_id}/preview', response_model=schemas.PlanPreview)
+def plan_preview(plan_id: str):
+    allocation = _get_plan(plan_id)["allocation"]
+    metrics.annotate(mode=allocation.mode, pairs=len(allocation.roster))
+    return utils.allocation_preview(allocation)
+
+@app.get('/plans/{plan_id}/file')
+def plan_file(plan_id: str, if_none_match: str | None = Header(None)):
+    plan = _get_plan(plan_id)
+    allocation = plan["allocation"]
+    metrics.annotate(mode=allocation.mode, pairs=len(allocation.roster))
+    # A plan never changes once stored (re-planning makes a new plan_id), so its id is key enough
+    key = cache_key("plan", plan_id)
+    cached = _cached_workbook(key, if_none_match)
+    if cached is not None:
+        return cached
+    wb = utils.build_workbook_in_memory(allocation.room_layout(), plan["college_name"], plan["exam_name"],
+                                        allocation.branch_counts, allocation.unallocated,
+                                        branch_range_per_room=allocation.branch_ranges,
+                                        branch_names=allocation.roster.branches, render_executor=render_pool,
+                                        room_parts=plan["room_parts"], branch_index=allocation.branch_index())
+    # The room sheets just rendered are kept with the plan, so its entry grew
+    plan_cache.resize(plan_id, _plan_size(plan))
+    return _workbook_response(key, wb, {
+        "Content-Disposition": f"attachment; filename={_plan_filename(allocation.mode)}",
+        "Unallocated-Seats": str(allocation.unallocated)
+    })
+
+def _batch_room_capacity(batch: schemas.BatchPlan) -> dict:
+    if batch.rooms_upload_id is not None:
+        rooms = upload_cache.get(batch.rooms_upload_id)
+        if rooms is None:
+            raise HTTPException(status_code=404, detail="Room upload not found or expired, please upload the file again")
+        return rooms["room_capacity"]
+    if batch.room_capacity:
+        return batch.room_capacity
+    raise HTTPException(status_code=422, detail="Give either rooms_upload_id or room_capacity")
+
+def _session_upload(session: schemas.Session, batch: schemas.BatchPlan, room_capacity: dict) -> dict:
+    if session.upload_id is not None:
+        students = upload_cache.get(session.upload_id)
+        if students is None:
+            raise HTTPException(status_code=404,
+                                detail=f"Upload for session {session.date} {session.shift_time} not found or expired")
+    elif session.pairs:
+        students = {"pairs": utils.as_roster(session.pairs), "college_name": "", "exam_name": ""}
+    else:
+        raise HTTPException(status_code=422, detail=f"Session {session.date} {session.shift_time} has no students")
+    return {
+        "pairs": students["pairs"],
+        "room_capacity": room_capacity,
+        "college_name": batch.college_name if batch.college_name is not None else students["college_name"],
+        "exam_name": batch.exam_name if batch.exam_name is not None else students["exam_name"]
+    }
+
+def _session_filename(session: schemas.Session, index: int, used: set) -> str:
+    stem = session.name or f"seating_plan_{session.date}_{session.shift_time}"
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", stem.removesuffix(".xlsx")).strip("._") or f"session_{index}"
+    filename = f"{stem}.xlsx"
+    suffix = 2
+    while filename in used:
+        filename = f"{stem}_{suffix}.xlsx"
+        suffix += 1
+    used.add(filename)
+    return filename
+
+def _discard_jobs(jobs: list):
+    for job in jobs:
+        job_manager.discard(job.job_id)
+
+def _iter_batch_zip(jobs: list, manifest: list):
+    """Stream a zip of the finished session workbooks straight from their files, then delete them."""
+    def write(pipe):
+        # Workbooks are already deflated, so they are stored as-is
+        with ZipFile(pipe, "w", ZIP_STORED) as archive:
+            for job in jobs:
+                archive.write(job.path, job.filename)
+            archive.writestr("sessions.json", json.dumps(manifest, indent=2))
+
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-            tmp_path = tmp_file.name
-        
-        # Save workbook and ensure it's closed
-        wb.save(tmp_path)
-        wb.close()
-        
-        # Ensure file is fully written by checking file size is stable
-        import time
-        prev_size = 0
-        for _ in range(10):  # Check up to 10 times
-            if os.path.exists(tmp_path):
-                current_size = os.path.getsize(tmp_path)
-                if current_size == prev_size and current_size > 0:
-                    break
-                prev_size = current_size
-            time.sleep(0.1)
-        
-        # Read the complete file into BytesIO
-        with open(tmp_path, 'rb') as f:
-            file_bytes = f.read()
-        
-        # Create BytesIO from complete bytes
-        file_stream = BytesIO(file_bytes)
-        
-        # Return as streaming response
-        return StreamingResponse(
-            file_stream,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": "attachment; filename=seating_plan_col_gap.xlsx",
-                "Unallocated-Seats": str(unallocated)
-            }
-        )
+        yield from utils.iter_written_bytes(write)
     finally:
-        # Clean up temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        _discard_jobs(jobs)
+
+@app.post('/generate-batch')
+def generate_batch(batch: schemas.BatchPlan):
+    """Plan every session of a timetable against one room catalogue; returns a zip with a workbook per session."""
+    if batch.mode not in utils.SEAT_MASKS:
+        raise HTTPException(status_code=422, detail=f"Unknown seating mode '{batch.mode}'")
+    if not batch.sessions:
+        raise HTTPException(status_code=422, detail="No sessions given")
+
+    # Resolve everything first so a bad handle fails before any work is queued
+    room_capacity = _batch_room_capacity(batch)
+    uploads = [_select_rooms(_session_upload(session, batch, room_capacity), batch, batch.mode)
+               for session in batch.sessions]
+    metrics.annotate(mode=batch.mode, pairs=sum(len(upload["pairs"]) for upload in uploads))
+
+    # Every session is a background job, so sessions are allocated and rendered in parallel
+    used = set()
+    jobs = [job_manager.submit(upload, batch.mode, _session_filename(session, index, used), batch.blocked_seats,
+                               session.date, session.shift_time, batch.avoid_same_branch, batch.time_budget)
+            for index, (session, upload) in enumerate(zip(batch.sessions, uploads), start=1)]
+
+    manifest = []
+    try:
+        for session, upload, job in zip(batch.sessions, uploads, jobs):
+            with metrics.span("jobs"):
+                job_manager.wait(job)
+            if job.status != DONE:
+                raise HTTPException(status_code=500,
+                                    detail=f"Session {session.date} {session.shift_time} failed: {job.error}")
+            manifest.append({"file": job.filename, "date": session.date, "shift_time": session.shift_time,
+                             "total_pairs": len(upload["pairs"]),
+                             "unallocated": job.unallocated, "same_branch_neighbours": job.same_branch_neighbours})
+    except Exception:
+        _discard_jobs(jobs)
+        raise
+
+    return StreamingResponse(
+        _iter_batch_zip(jobs, manifest),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=seating_plans.zip",
+            "Unallocated-Seats": str(sum(entry["unallocated"] for entry in manifest))
+        }
+    )
 
 if __name__ == "__main__":
     import uvicorn
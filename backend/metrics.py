@@ -0,0 +1,222 @@
+"""
+Per-request stage timings and Prometheus metrics.
+
+`with span("allocate"):` times a block of work. The duration goes into the
+seating_stage_seconds histogram and, when the block runs for an HTTP request,
+into that request's `Server-Timing` header (added by ServerTimingMiddleware).
+Request latency is recorded per endpoint, seating mode and input size, and
+GET /metrics renders everything in the Prometheus text format. No client
+library is needed.
+
+Only this process is measured: work done in the job pool's worker processes
+shows up as the latency of the requests that waited for it, and a streamed
+download's save runs after its headers were sent, so it is in the histogram
+but not in the header.
+"""
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_CLASSES = ((1000, "0-1k"), (10000, "1k-10k"), (100000, "10k-100k"))  # (pairs below, label)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # {label values: state}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines += [line for key, state in items for line in self._sample_lines(key, state)]
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic total, one per combination of label values."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _sample_lines(self, key: tuple, total) -> list:
+        return [f"{self.name}{_label_text(self.labelnames, key)} {total}"]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observed values, one set per combination of label values."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # [per-bucket counts, sum, count]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _sample_lines(self, key: tuple, state) -> list:
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket in zip(self.buckets, counts):
+            cumulative += bucket
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {count}")
+        lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """The metrics rendered by GET /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = Histogram("seating_request_seconds", "Time until the response headers were sent.",
+                            ("endpoint", "method", "status", "mode", "size"))
+STAGE_SECONDS = Histogram("seating_stage_seconds", "Time spent in one stage of parsing, planning or saving.",
+                          ("stage",))
+STUDENTS = Counter("seating_students_total", "Students parsed from uploads, seated or left unallocated.", ("event",))
+ROOMS = Counter("seating_rooms_total", "Rooms that were given students by a plan.")
+SHEETS = Counter("seating_sheets_total", "Worksheets built, by kind.", ("kind",))
+RESULT_CACHE = Counter("seating_result_cache_total", "Result cache lookups: hit, miss or not_modified.", ("result",))
+
+
+def size_class(pairs: int) -> str:
+    """Coarse bucket of an input size for the size label, so label values stay few."""
+    for limit, label in SIZE_CLASSES:
+        if pairs < limit:
+            return label
+    return f"{SIZE_CLASSES[-1][0] // 1000}k+"
+
+
+class RequestTimings:
+    """Stage durations and labels gathered while one request is handled."""
+
+    __slots__ = ("stages", "mode", "size")
+
+    def __init__(self):
+        self.stages = {}  # {stage: seconds}, in first-seen order
+        self.mode = ""
+        self.size = ""
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def header(self, total: float) -> str:
+        """The Server-Timing value, e.g. 'parse;dur=12.1, allocate;dur=3.4, total;dur=16.0'."""
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current = contextvars.ContextVar("seating_request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as one stage of the current request (if any)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+
+
+def annotate(mode: str = None, pairs: int = None):
+    """Label the current request's latency with its seating mode and input size."""
+    timings = _current.get()
+    if timings is None:
+        return
+    if mode is not None:
+        timings.mode = mode
+    if pairs is not None:
+        timings.size = size_class(pairs)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that collects the spans of each HTTP request, adds them as a
+    Server-Timing header and records the request in seating_request_seconds.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - start
+                message["headers"] = [*message.get("headers", ()),
+                                      (b"server-timing", timings.header(total).encode("latin-1"))]
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(total, endpoint=getattr(route, "path", "unmatched"), method=scope["method"],
+                                        status=message["status"], mode=timings.mode, size=timings.size)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,192 @@
+"""
+Disk-backed cache of generated plan workbooks.
+
+A result is stored under a content key: the sha256 of the normalised request
+(the upload's hash or the inline body, the seating mode and the options, see
+cache_key). The generate endpoints serve a repeat request straight from the
+file instead of allocating and rendering again, and the key doubles as the
+response's ETag, so a client that already has the file gets 304 Not Modified.
+
+Files live in SEATING_RESULT_CACHE_DIR, where they are kept across restarts,
+or in a temporary directory removed at shutdown. Once their total size passes
+max_bytes, the least recently used files are deleted.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+CACHE_VERSION = 1  # bump when the workbook layout changes, so files from older code are never served
+MAX_BYTES = int(os.environ.get("SEATING_RESULT_CACHE_BYTES", 0)) or 1024 * 1024 * 1024
+SUFFIX = ".xlsx"
+
+
+def cache_key(*parts) -> str:
+    """sha256 hex digest of JSON-serialisable parts, independent of dict key order."""
+    payload = json.dumps([CACHE_VERSION, *parts], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def iter_file(file, chunk_size: int = 64 * 1024):
+    """Yield an open binary file in chunks and close it."""
+    try:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            yield chunk
+    finally:
+        file.close()
+
+
+class ResultCache:
+    """
+    Thread-safe, size-bounded LRU of result files with a small JSON record each.
+
+    Args:
+        directory: Where files are kept; None for a temporary directory
+        max_bytes: Upper bound on the summed size of the cached files
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {key: (size, meta)}, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._started = False
+        self._owns_directory = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def _path(self, key: str, suffix: str = SUFFIX) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def _start(self):
+        # Called with the lock held
+        if self._started:
+            return
+        self._started = True
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="seating-results-")
+            self._owns_directory = True
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Pick up files from an earlier run, oldest use first
+        found = []
+        for name in os.listdir(self.directory):
+            key, ext = os.path.splitext(name)
+            if ext != SUFFIX:
+                continue
+            try:
+                stat = os.stat(self._path(key))
+                with open(self._path(key, ".json")) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            found.append((stat.st_mtime, key, stat.st_size, meta))
+        for _, key, size, meta in sorted(found):
+            self._entries[key] = (size, meta)
+            self._total_bytes += size
+        self._evict()
+
+    def open(self, key: str):
+        """Return (open binary file, size, meta) for a cached result, or None."""
+        with self._lock:
+            self._start()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            try:
+                file = open(self._path(key), "rb")
+            except OSError:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(self._path(key))  # keeps the LRU order across restarts
+        except OSError:
+            pass
+        size, meta = entry
+        return file, size, meta
+
+    def store(self, key: str, chunks, meta: dict):
+        """
+        Pass chunks through while writing them to the cache.
+
+        The result is only added once the last chunk was written; if the consumer
+        stops early (e.g. the client disconnected), the partial file is deleted.
+        """
+        with self._lock:
+            self._start()
+        fd, part = tempfile.mkstemp(suffix=".part", dir=self.directory)
+        committed = False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            committed = self._commit(key, part, meta)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            if not committed:
+                _remove(part)
+
+    def _commit(self, key: str, part: str, meta: dict) -> bool:
+        size = os.path.getsize(part)
+        if size > self.max_bytes:
+            return False  # would evict everything else and still not fit
+        fd, meta_part = tempfile.mkstemp(suffix=".json.part", dir=self.directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        with self._lock:
+            if key in self._entries:
+                # A concurrent store of the same request got there first; the key is
+                # a content hash, so its file is as good as ours and may be in use
+                _remove(meta_part)
+                return False
+            os.replace(meta_part, self._path(key, ".json"))
+            os.replace(part, self._path(key))
+            self._entries[key] = (size, meta)
+            self._total_bytes += size
+            self._evict()
+        return True
+
+    def discard(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+    def close(self):
+        """Forget every entry; a temporary directory is deleted with its files."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            if self._owns_directory:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+                self._owns_directory = False
+            self._started = False
+
+    def _pop(self, key: str):
+        size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+        _remove(self._path(key))
+        _remove(self._path(key, ".json"))
+
+    def _evict(self):
+        while self._entries and self._total_bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # already gone, or still open elsewhere on Windows
@@ -1,8 +1,121 @@
-from pydantic import BaseModel
+from typing import Literal
 
-class UploadInfo(BaseModel):
-    pairs: list
-    rooms: list
+from pydantic import BaseModel, ConfigDict, Field
+# typing_extensions so pydantic accepts the TypedDicts on Python < 3.12 as well
+from typing_extensions import NotRequired, TypedDict
+
+from backend.utils import MAX_TIME_BUDGET
+
+# Pairs and rooms stay plain dicts after validation, as utils expects, instead of
+# becoming model instances that would have to be dumped again for every request.
+Pair = TypedDict("Pair", {
+    "Roll No. Series-1": str | None,  # 'roll\nbranch' as in the sheet
+    "Roll No. Series-2": str | None,
+    "s1": str | None,  # short spelling of the same two cells
+    "s2": str | None,
+}, total=False)
+
+Room = TypedDict("Room", {
+    "Room No.": str | None,
+    "Row": int | None,
+    "Column": int | None,
+})
+
+class RoomSpec(TypedDict):
+    rows: int
+    cols: int
+    capacity: NotRequired[int]
+
+class PlanOptions(BaseModel):
+    """Seating options shared by every request that allocates seats."""
+    blocked_seats: dict[str, list[tuple[int, int]]] | None = None  # {room_no: [(row, col), ...]} benches to leave empty
+    avoid_same_branch: bool = False  # spread branches so neighbours differ (allocate_seats_spread)
+    time_budget: float = Field(1.0, ge=0, le=MAX_TIME_BUDGET)  # seconds of local search for avoid_same_branch
+    room_objective: Literal["rooms", "invigilators", "cost"] | None = None  # pick rooms (select_rooms); None fills in catalogue order
+    room_costs: dict[str, float] | None = None  # {room_no: cost} for room_objective 'cost'
+    building_cost: float = 0.0  # extra cost per building used
+
+class UploadInfo(PlanOptions):
+    model_config = ConfigDict(coerce_numbers_to_str=True)  # roll numbers may arrive as JSON numbers
+
+    pairs: list[Pair]
+    rooms: list[Room]
+    college_name: str
+    exam_name: str
+    room_capacity: dict[str, RoomSpec]
+
+class UploadHandle(BaseModel):
+    upload_id: str
     college_name: str
     exam_name: str
-    room_capacity: dict
\ No newline at end of file
+    room_capacity: dict[str, RoomSpec]
+    total_pairs: int
+
+class UploadRef(PlanOptions):
+    upload_id: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    mode: str
+    status: str  # queued, running, done or failed
+    stage: str
+    done: int  # room sheets rendered so far
+    total: int
+    progress: float  # 0.0 - 1.0
+    unallocated: int | None = None
+    same_branch_neighbours: int | None = None
+    error: str | None = None
+
+class Session(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    date: str
+    shift_time: str
+    upload_id: str | None = None  # students from an earlier /upload-file
+    pairs: list[Pair] | None = None  # or the pairs inline, as in UploadInfo
+    name: str | None = None  # workbook name inside the zip
+
+class BatchPlan(PlanOptions):
+    sessions: list[Session]
+    rooms_upload_id: str | None = None  # room catalogue from an earlier /upload-file, shared by every session
+    room_capacity: dict[str, RoomSpec] | None = None  # or the catalogue inline
+    mode: str = "normal"
+    college_name: str | None = None  # defaults to each session's upload
+    exam_name: str | None = None
+
+class PlanDelta(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    add_pairs: list[Pair] = []  # pair dicts, as in UploadInfo.pairs
+    remove_rolls: list[str] = []
+    add_rooms: dict[str, RoomSpec] = {}  # {room_no: {'rows': 8, 'cols': 4}}; an existing room is resized
+    remove_rooms: list[str] = []
+
+class PlanHandle(BaseModel):
+    plan_id: str
+    mode: str
+    total_pairs: int
+    rooms: int  # rooms with a sheet
+    unallocated: int
+    changed_rooms: list[str]  # room sheets that differ from the previous plan
+    moved: int  # students that were already seated and changed seat
+    unseated: int  # students that were already seated and lost their seat without getting another
+    adjacency: dict  # same-branch neighbours, see utils.adjacency_stats
+
+class RoomPreview(BaseModel):
+    room: str
+    rows: int
+    cols: int
+    series1: list[list[int]]  # index into PlanPreview.students, -1 for an empty seat
+    series2: list[list[int]]
+    branch1: list[list[int]]  # index into PlanPreview.branches, 0 for none
+    branch2: list[list[int]]
+    mask: list[list[int]]  # 1 where a pair may sit
+
+class PlanPreview(BaseModel):
+    mode: str
+    branches: list[str]
+    students: list[str]  # each distinct roll once
+    student_branches: list[int]
+    unallocated: int
+    rooms: list[RoomPreview]
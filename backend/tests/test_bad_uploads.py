@@ -0,0 +1,45 @@
+import io
+import zipfile
+
+from openpyxl import Workbook
+import pytest
+
+from backend import utils
+from backend.benchmarks.synthetic import make_exam_workbook
+
+
+def _xlsx(sheet_title: str) -> bytes:
+    wb = Workbook()
+    wb.active.title = sheet_title
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _zip() -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as f:
+        f.writestr("notes.txt", "not a workbook")
+    return out.getvalue()
+
+
+def _damaged_sheet() -> bytes:
+    body = bytearray(make_exam_workbook(pairs=3000, rooms=8).getvalue())
+    info = zipfile.ZipFile(io.BytesIO(bytes(body))).getinfo("xl/worksheets/sheet1.xml")
+    start = info.header_offset + 30 + len(info.filename) + len(info.extra) + info.compress_size // 2
+    for i in range(start, start + 50):
+        body[i] ^= 0x5A
+    return bytes(body)
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"PK\x03\x04" + b"garbage" * 20, "Not a readable .xlsx workbook"),
+    (_zip(), "Not a readable .xlsx workbook"),
+    (_xlsx("main")[:300], "Not a readable .xlsx workbook"),
+    (_damaged_sheet(), "Not a readable .xlsx workbook"),
+    (_xlsx("Sheet1"), "no 'main' sheet"),
+])
+def test_malformed_workbooks_raise_value_error(body, message):
+    assert utils.detect_upload_format(io.BytesIO(body)) == "xlsx"
+    with pytest.raises(ValueError, match=message):
+        utils.upload_main_sheet(io.BytesIO(body))
@@ -0,0 +1,74 @@
+import numpy as np
+
+from backend import utils
+
+
+def _pairs(count: int, start: int = 1000) -> list:
+    return [{"Roll No. Series-1": f"{start + 2 * i}\nCSE-II", "Roll No. Series-2": f"{start + 2 * i + 1}\nECE-IV"}
+            for i in range(count)]
+
+
+def _plan(pairs: int = 30, blocked_seats: dict = None) -> utils.Allocation:
+    room_capacity = {"R-001": {"rows": 5, "cols": 4}, "R-002": {"rows": 5, "cols": 4}, "R-003": {"rows": 5, "cols": 4}}
+    room_masks = utils.masks_from_blocked_seats(room_capacity, blocked_seats)
+    return utils.allocate_seats(utils.as_roster(_pairs(pairs)), room_capacity, "normal", room_masks)
+
+
+def _seated(allocation: utils.Allocation) -> dict:
+    """{pair index: (room, row, col)} of every seated pair."""
+    return {int(grid[row, col]): (room, row, col) for room, grid in allocation.seats.items()
+            for row, col in zip(*np.nonzero(grid >= 0))}
+
+
+def _check(allocation: utils.Allocation):
+    seated = [idx for grid in allocation.seats.values() for idx in grid[grid >= 0].tolist()]
+    everyone = seated + allocation.waiting.tolist()
+    assert len(everyone) == len(set(everyone))
+    for room, grid in allocation.seats.items():
+        spec = allocation.room_capacity[room]
+        assert grid.shape == (spec["rows"], spec["cols"])
+        allowed = utils._room_allowed_seats(allocation.room_masks, allocation.mode, room, *grid.shape)
+        assert not ((grid >= 0) & ~allowed).any()
+
+
+def test_add_and_remove_pairs_keep_everyone_else_seated():
+    plan = _plan()
+    before = _seated(plan)
+    result = utils.replan_seats(plan, add_pairs=_pairs(2, start=5000), remove_rolls=["1000", "1001", "1003"])
+    _check(result.allocation)
+    after = _seated(result.allocation)
+    assert 0 not in after  # both students of the first bench left
+    assert after[1] == before[1]  # one student left on the bench, who keeps it
+    assert {idx: seat for idx, seat in after.items() if idx in before} == {idx: before[idx] for idx in after
+                                                                         if idx in before}
+    assert {30, 31} <= set(after) and result.allocation.roster[30].roll1 == "5000"
+    assert (result.moved, result.unseated, result.allocation.unallocated) == (0, 0, 0)
+    assert _seated(plan) == before  # the old plan is left untouched
+
+
+def test_resizing_a_room_with_blocked_seats():
+    plan = _plan(blocked_seats={"R-001": [[1, 1]]})
+    assert plan.seats["R-001"][0, 0] == -1
+    result = utils.replan_seats(plan, add_rooms={"R-001": {"rows": 6, "cols": 5}})
+    _check(result.allocation)
+    assert result.allocation.seats["R-001"].shape == (6, 5)
+    assert "R-001" not in result.allocation.room_masks  # the old blocked bench is gone with the old layout
+    assert result.changed_rooms == ["R-001"]
+    assert (result.moved, result.unseated) == (19, 0)
+
+
+def test_removed_rooms_reseat_their_students_and_report_the_rest():
+    plan = _plan()
+    result = utils.replan_seats(plan, remove_rooms=["R-001"])
+    _check(result.allocation)
+    assert list(result.allocation.seats) == ["R-002", "R-003"]
+    assert (result.moved, result.unseated, result.allocation.unallocated) == (20, 0, 0)
+
+    result = utils.replan_seats(plan, remove_rooms=["R-001", "R-003"])
+    _check(result.allocation)
+    assert (result.moved, result.unseated, len(result.allocation.waiting)) == (10, 10, 10)
+    assert result.allocation.unallocated == 20
+
+    result = utils.replan_seats(plan, remove_rooms=["R-002", "R-003"])
+    _check(result.allocation)
+    assert (result.moved, result.unseated) == (0, 10)  # R-001 is already full
@@ -0,0 +1,20 @@
+import os
+
+from backend.result_cache import ResultCache
+
+
+def test_second_store_of_a_key_keeps_the_first():
+    cache = ResultCache()
+    try:
+        first = cache.store("k", iter([b"aa", b"bb"]), {"n": 1})
+        second = cache.store("k", iter([b"aa", b"bb"]), {"n": 2})
+        assert next(first) == next(second) == b"aa"
+        assert b"".join(first) == b"bb"
+        file, size, meta = cache.open("k")
+        with file:
+            assert b"".join(second) == b"bb"  # the open file is neither deleted nor replaced
+            assert file.read() == b"aabb"
+        assert (len(cache), cache.total_bytes, size, meta) == (1, 4, 4, {"n": 1})
+        assert sorted(os.listdir(cache.directory)) == ["k.json", "k.xlsx"]
+    finally:
+        cache.close()
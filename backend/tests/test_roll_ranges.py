@@ -0,0 +1,14 @@
+import pytest
+
+from backend import utils
+
+
+@pytest.mark.parametrize("rolls, expected", [
+    (["1", "2", "3", "007"], ["1-3", "007"]),
+    (["201", "202", "0099"], ["201-202", "0099"]),
+    (["CS45", "CS46", "CS045"], ["CS45-CS46", "CS045"]),
+    (["CS045", "CS046", "CS047"], ["CS045-CS047"]),
+    (["101A", "102A", "104A"], ["101A-102A", "104A"]),
+])
+def test_labels_keep_each_roll_as_written(rolls, expected):
+    assert sorted(utils._find_consecutive_ranges(rolls)) == sorted(expected)
@@ -0,0 +1,105 @@
+import itertools
+import math
+import random
+import time
+
+import pytest
+
+from backend import utils
+
+
+def _chosen(selected: dict, usable: dict, need: int) -> list:
+    """The chosen rooms: the shortest prefix of select_rooms' order that seats need pairs."""
+    chosen, benches = [], 0
+    for room_no in selected:
+        if benches >= need:
+            break
+        chosen.append(room_no)
+        benches += usable[room_no]
+    return chosen
+
+
+def _total_cost(rooms, costs: dict, building_cost: float) -> float:
+    return sum(costs[r] for r in rooms) + building_cost * len({utils._room_building(r) for r in rooms})
+
+
+def _brute_force(usable: dict, costs: dict, need: int, building_cost: float = 0.0) -> tuple:
+    """(lowest cost, fewest benches at that cost) over every set of rooms that seats need pairs."""
+    best = None
+    for size in range(1, len(usable) + 1):
+        for rooms in itertools.combinations(usable, size):
+            benches = sum(usable[r] for r in rooms)
+            if benches < need:
+                continue
+            cost = _total_cost(rooms, costs, building_cost)
+            if best is None or cost < best[0] - 1e-9 or (math.isclose(cost, best[0]) and benches < best[1]):
+                best = (cost, benches)
+    return best
+
+
+def test_cost_is_not_outweighed_by_spare_benches():
+    rooms = {"A": {"rows": 5, "cols": 2}, "B": {"rows": 50, "cols": 2}}
+    selected = utils.select_rooms(rooms, 10, objective="cost", room_costs={"A": 1.2, "B": 1.0})
+    assert list(selected) == ["B", "A"]
+
+
+def test_ties_go_to_fewer_spare_benches():
+    rooms = {"A": {"rows": 50, "cols": 2}, "B": {"rows": 5, "cols": 2}}
+    assert list(utils.select_rooms(rooms, 10)) == ["B", "A"]
+
+
+@pytest.mark.parametrize("objective", utils.ROOM_OBJECTIVES)
+def test_matches_brute_force(objective):
+    rng = random.Random(14)
+    for _ in range(200):
+        room_capacity = {f"R{i}": {"rows": rng.randint(1, 6), "cols": rng.randint(1, 4)}
+                         for i in range(rng.randint(2, 8))}
+        usable = dict(zip(room_capacity, utils._usable_seats(room_capacity, "normal").tolist()))
+        if objective == "rooms":
+            costs = dict.fromkeys(room_capacity, 1.0)
+        elif objective == "invigilators":
+            costs = {r: max(math.ceil(n * 2 / utils.STUDENTS_PER_INVIGILATOR), 1) for r, n in usable.items()}
+        else:
+            costs = {r: round(rng.uniform(0.1, 3.0), rng.choice((0, 1, 2))) for r in room_capacity}
+        need = rng.randint(1, sum(usable.values()) - 1)
+
+        selected = utils.select_rooms(room_capacity, need, objective=objective, room_costs=costs)
+        chosen = _chosen(selected, usable, need)
+        best_cost, best_benches = _brute_force(usable, costs, need)
+        assert math.isclose(sum(costs[r] for r in chosen), best_cost), (room_capacity, costs, need, chosen)
+        assert sum(usable[r] for r in chosen) == best_benches, (room_capacity, costs, need, chosen)
+
+
+def test_building_cost_matches_brute_force():
+    rng = random.Random(15)
+    for _ in range(150):
+        room_capacity = {f"{rng.choice('ABC')}-{i}": {"rows": rng.randint(1, 6), "cols": rng.randint(1, 4)}
+                         for i in range(rng.randint(2, 8))}
+        usable = dict(zip(room_capacity, utils._usable_seats(room_capacity, "normal").tolist()))
+        costs = {r: round(rng.uniform(0.1, 3.0), 1) for r in room_capacity}
+        building_cost = rng.choice((0.5, 1.0, 2.5, 10.0))
+        need = rng.randint(1, sum(usable.values()) - 1)
+
+        selected = utils.select_rooms(room_capacity, need, objective="cost", room_costs=costs,
+                                      building_cost=building_cost)
+        chosen = _chosen(selected, usable, need)
+        best_cost, best_benches = _brute_force(usable, costs, need, building_cost)
+        assert math.isclose(_total_cost(chosen, costs, building_cost), best_cost), (room_capacity, costs, need)
+        assert sum(usable[r] for r in chosen) == best_benches, (room_capacity, costs, need, chosen)
+
+
+def test_building_cost_is_fast_on_a_large_catalogue():
+    rng = random.Random(16)
+    room_capacity = {f"B{b:02d}-{r:03d}": {"rows": rng.randint(4, 10), "cols": rng.randint(2, 6)}
+                     for b in range(20) for r in range(20)}
+    costs = {r: round(rng.uniform(0.5, 3.0), 2) for r in room_capacity}
+    need = int(utils._usable_seats(room_capacity, "normal").sum()) // 2
+    for objective in utils.ROOM_OBJECTIVES:
+        start = time.perf_counter()
+        utils.select_rooms(room_capacity, need, objective=objective, room_costs=costs, building_cost=5.0)
+        assert time.perf_counter() - start < 0.5, objective  # the per-building search took seconds
+
+
+def test_negative_building_cost_is_rejected():
+    with pytest.raises(ValueError):
+        utils.select_rooms({"A": {"rows": 5, "cols": 2}, "B": {"rows": 5, "cols": 2}}, 5, building_cost=-1.0)
@@ -0,0 +1,20 @@
+from backend.upload_cache import UploadCache
+
+
+def test_put_reports_entries_over_max_bytes():
+    cache = UploadCache(max_bytes=100)
+    assert cache.put("small", "x", size=60)
+    assert not cache.put("big", "y", size=101)
+    assert cache.get("big") is None
+    assert cache.get("small") == "x" and cache.total_bytes == 60
+
+
+def test_resize_reaccounts_and_evicts():
+    cache = UploadCache(max_bytes=100)
+    cache.put("old", "x", size=40)
+    cache.put("new", "y", size=40)
+    assert cache.resize("new", 70)
+    assert cache.get("old") is None  # evicted to make room
+    assert cache.total_bytes == 70
+    assert not cache.resize("new", 101) and cache.get("new") is None and cache.total_bytes == 0
+    assert not cache.resize("missing", 10)
@@ -0,0 +1,139 @@
+"""
+Server-side cache of parsed uploads.
+
+/upload-file stores the parsed roster here under a content hash of the
+uploaded file and returns that hash as `upload_id`. The generate endpoints
+look the upload up again instead of receiving the whole roster back as JSON.
+"""
+from collections import OrderedDict
+import hashlib
+import sys
+import threading
+import time
+
+MAX_ENTRIES = 64
+TTL_SECONDS = 60 * 60
+MAX_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(file, chunk_size: int = 1024 * 1024) -> str:
+    """Return the sha256 hex digest of a file object, leaving it rewound."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def estimate_size(value) -> int:
+    """Rough deep size in bytes of nested dicts/lists/tuples of plain values."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+class UploadCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and a total memory cap.
+
+    Args:
+        max_entries: Maximum number of uploads kept
+        ttl_seconds: Seconds an upload stays valid after it was stored
+        max_bytes: Upper bound on the summed estimated size of all entries
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: float = TTL_SECONDS,
+                 max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {upload_id: (expires_at, size, upload)}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, upload_id):
+        return self.get(upload_id) is not None
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, upload_id: str):
+        """Return the cached upload, or None if unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(upload_id)
+            if entry is None:
+                return None
+            expires_at, _, upload = entry
+            if expires_at <= time.monotonic():
+                self._pop(upload_id)
+                return None
+            self._entries.move_to_end(upload_id)
+            return upload
+
+    def put(self, upload_id: str, upload, size: int = None) -> bool:
+        """
+        Store an upload, evicting expired then least recently used entries.
+
+        Returns False, and stores nothing, if the upload alone is over max_bytes.
+        """
+        if size is None:
+            size = estimate_size(upload)
+        with self._lock:
+            if upload_id in self._entries:
+                self._pop(upload_id)
+            if size > self.max_bytes:
+                return False  # would evict everything else and still not fit
+            self._entries[upload_id] = (time.monotonic() + self.ttl_seconds, size, upload)
+            self._total_bytes += size
+            self._evict()
+        return True
+
+    def resize(self, upload_id: str, size: int) -> bool:
+        """
+        Re-account an entry that grew or shrank in place, evicting others if needed.
+
+        Returns False if the entry is gone, or was dropped because it no longer fits.
+        """
+        with self._lock:
+            entry = self._entries.get(upload_id)
+            if entry is None:
+                return False
+            expires_at, old_size, upload = entry
+            if size > self.max_bytes:
+                self._pop(upload_id)
+                return False
+            self._entries[upload_id] = (expires_at, size, upload)
+            self._total_bytes += size - old_size
+            self._evict()
+            return upload_id in self._entries
+
+    def discard(self, upload_id: str):
+        with self._lock:
+            if upload_id in self._entries:
+                self._pop(upload_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _pop(self, upload_id):
+        _, size, _ = self._entries.pop(upload_id)
+        self._total_bytes -= size
+
+    def _evict(self):
+        now = time.monotonic()
+        for upload_id in [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]:
+            self._pop(upload_id)
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            self._pop(next(iter(self._entries)))
@@ -1,31 +1,68 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+import csv
+from functools import lru_cache
+from io import TextIOWrapper
+import json
 import math
-import os
+import queue
+import random
 import re
+import sys
+import threading
+import time
 from typing import Any
+from zipfile import BadZipFile
+import zlib
 
-import pandas as pd
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Alignment, Border, Font, Side, PatternFill
-from openpyxl.utils import get_column_letter
+import numpy as np
 
+from backend import metrics
 
-def _clean_value(value):
-    """Convert NaN, None, or pandas NaN to empty string."""
+# The sheet and workbook builders need openpyxl, which (with pandas) takes far longer to import than
+# the rest of this module, so they live in backend.workbook and are only loaded on first use
+_WORKBOOK_NAMES = frozenset({
+    "CellStyle", "STYLES", "THICK_BORDER", "THIN_BORDER", "YELLOW_FILL", "register_styles",
+    "build_qpd_sheet", "build_msp_base_sheet", "build_msp_sheet", "generate_qpd", "build_room_sheet",
+    "render_room_sheet_xml", "room_render_pool", "PlanWorkbook", "build_workbook_in_memory",
+    "generate_plan_workbook", "build_workbook",
+})
+
+
+def __getattr__(name):
+    if name in _WORKBOOK_NAMES:
+        from backend import workbook
+        return getattr(workbook, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def prewarm():
+    """Import the heavy dependencies of parsing and rendering now, instead of in the first request that needs them."""
+    with metrics.span("prewarm"):
+        import pandas  # noqa: F401  (layout previews)
+        from backend import workbook  # noqa: F401  (openpyxl, for xlsx uploads and every workbook)
+
+
+def _is_na(value) -> bool:
+    """
+    pd.isna for one cell value, without importing pandas: None and float NaN are
+    checked here, and pandas' own NA/NaT can only occur once pandas is loaded.
+    """
     if value is None:
-        return ""
-    try:
-        # Check for pandas/numpy NaN
-        if pd.isna(value):
-            return ""
-    except (TypeError, ValueError):
-        pass
+        return True
+    if isinstance(value, (float, np.floating)):
+        return math.isnan(value)
+    pd = sys.modules.get("pandas")
+    if pd is None:
+        return False
     try:
-        # Check for float NaN
-        if isinstance(value, float) and math.isnan(value):
-            return ""
+        return bool(pd.isna(value))
     except (TypeError, ValueError):
-        pass
+        return False
+
+def _clean_value(value):
+    """Convert NaN, None, or pandas NaN to empty string."""
+    if _is_na(value):
+        return ""
     # Check for string "nan" or "NaN"
     if isinstance(value, str) and value.lower() in ('nan', 'none', ''):
         return ""
@@ -34,7 +71,7 @@ def _clean_value(value):
 def _split_roll_and_branch(raw_value: str):
     """Return (roll_no, branch) tuple from a raw string."""
     # Handle NaN, None, or empty values
-    if raw_value is None or pd.isna(raw_value):
+    if _is_na(raw_value):
         return "", ""
 
     text = str(raw_value).strip()
@@ -62,90 +99,543 @@ def _extract_roll_number(roll_str):
         return int(match.group())
     return None
 
-def _find_consecutive_ranges(numbers):
-    """Find consecutive number ranges from a list of roll number strings.
-    Returns a list of strings like ['201-208', '210-220']"""
-    if not numbers:
-        return []
-    
-    # Extract numeric values and filter out None
-    numeric_values = []
-    for n in numbers:
-        num = _extract_roll_number(n)
-        if num is not None:
-            numeric_values.append(num)
-    
-    if not numeric_values:
-        return []
-    
-    # Sort and find consecutive ranges
-    sorted_nums = sorted(set(numeric_values))  # Remove duplicates and sort
-    ranges = []
-    start = sorted_nums[0]
-    end = sorted_nums[0]
-    
-    for i in range(1, len(sorted_nums)):
-        if sorted_nums[i] == end + 1:
-            # Consecutive, extend range
-            end = sorted_nums[i]
+_ROLL_PARTS = re.compile(r"(.*?)(\d+)(\D*)", re.S)
+
+def _roll_parts(roll: str):
+    """
+    Split a roll number around its last run of digits: 'CS-045' -> ('CS-', 45, '', 3).
+
+    Returns (prefix, serial, suffix, width), width being the zero-padded digit count
+    (0 when not padded), or None if the roll has no digits or the serial overflows int64.
+    """
+    match = _ROLL_PARTS.fullmatch(roll)
+    if match is None:
+        return None
+    prefix, digits, suffix = match.groups()
+    serial = int(digits)
+    if serial >= 2 ** 63:
+        return None
+    width = len(digits) if len(digits) > 1 and digits[0] == "0" else 0
+    return prefix, serial, suffix, width
+
+class RollRange(str):
+    """
+    One compacted run of roll numbers, e.g. '201-208', 'CS045-CS052' or '201A'.
+
+    It is the plain label as a str; first and last keep the two ends (last is None for a
+    single roll) so sheets can format the run without splitting on '-', which may be part
+    of the roll numbers themselves.
+    """
+
+    def __new__(cls, first: str, last: str = None):
+        if last is None:
+            label = first
         else:
-            # Gap found, save current range
-            if start == end:
-                ranges.append(str(start))
-            else:
-                ranges.append(f"{start}-{end}")
-            start = sorted_nums[i]
-            end = sorted_nums[i]
-    
-    # Add the last range
-    if start == end:
-        ranges.append(str(start))
+            label = f"{first}-{last}" if "-" not in first + last else f"{first} - {last}"
+        self = super().__new__(cls, label)
+        self.first = first
+        self.last = last
+        return self
+
+    def __reduce__(self):
+        return RollRange, (self.first, self.last)
+
+def _range_text(r) -> str:
+    """MSP text for a range: '(201 to 208)', or the roll itself for a single one."""
+    first, last = getattr(r, "first", None), getattr(r, "last", None)
+    if first is None and "-" in r:
+        first, last = r.split("-", 1)  # a plain '201-208' label
+    return f"({first} to {last})" if last is not None else str(r)
+
+def _roll_label(roll_key: tuple, serial: int) -> str:
+    prefix, suffix, width = roll_key
+    return f"{prefix}{serial:0{width}d}{suffix}"
+
+def _roll_runs(groups: np.ndarray, keys: np.ndarray, serials: np.ndarray):
+    """
+    Consecutive runs of serials within each (group, roll key), in one sort-and-diff pass.
+
+    Duplicates are dropped and serials < 0 (no roll number) ignored. Returns parallel
+    arrays (group, key, first, last) of the runs, sorted by group, key and serial.
+    """
+    valid = serials >= 0
+    groups, keys, serials = groups[valid], keys[valid], serials[valid]
+    order = np.lexsort((serials, keys, groups))
+    groups, keys, serials = groups[order], keys[order], serials[order]
+    if len(serials):
+        same = (groups[1:] == groups[:-1]) & (keys[1:] == keys[:-1])
+        keep = np.concatenate(([True], ~same | (serials[1:] != serials[:-1])))
+        groups, keys, serials = groups[keep], keys[keep], serials[keep]
+        same = same[keep[1:]]
+        starts = np.flatnonzero(np.concatenate(([True], ~same | (serials[1:] != serials[:-1] + 1))))
+        ends = np.append(starts[1:], len(serials)) - 1
     else:
-        ranges.append(f"{start}-{end}")
-    
-    return ranges
+        starts = ends = np.empty(0, dtype=np.intp)
+    return groups[starts], keys[starts], serials[starts], serials[ends]
+
+def _range_labels(roll_keys: list, keys: np.ndarray, firsts: np.ndarray, lasts: np.ndarray) -> list:
+    """RollRange labels for runs as returned by _roll_runs."""
+    labels = []
+    for key, first, last in zip(keys.tolist(), firsts.tolist(), lasts.tolist()):
+        roll_key = roll_keys[key]
+        if first == last:
+            labels.append(RollRange(_roll_label(roll_key, first)))
+        else:
+            labels.append(RollRange(_roll_label(roll_key, first), _roll_label(roll_key, last)))
+    return labels
 
-def upload_students(file):
-    df = pd.read_excel(file,
-                    sheet_name="main",
-                    usecols = ['Roll No. Series-1', 'Roll No. Series-2'],
-                    )
+def _find_consecutive_ranges(numbers):
+    """Find consecutive number ranges from a list of roll number strings.
+    Rolls are grouped by the text around their last run of digits, so '201A' and
+    'CS201' do not merge with '201'. Returns a list like ['201-208', '210-220', 'CS301-CS305']"""
+    roster = Roster()  # only for its roll key table
+    keys, serials = [], []
+    for roll in numbers or ():
+        key, serial = roster._roll_serial(None, str(roll).strip()) if roll else (0, -1)
+        keys.append(key)
+        serials.append(serial)
+    _, keys, firsts, lasts = _roll_runs(np.zeros(len(keys), dtype=np.int64), np.asarray(keys, dtype=np.int64),
+                                        np.asarray(serials, dtype=np.int64))
+    return _range_labels(roster.roll_keys, keys, firsts, lasts)
+
+# counted*: the seat has both a roll number and a branch, so it shows up in
+# the branch counts; num* is the serial (last run of digits) of the roll, -1
+# where it has none, and key* its id in Roster.roll_keys (0: digits only)
+RosterColumns = namedtuple("RosterColumns", ["branch1", "branch2", "counted1", "counted2", "num1", "num2",
+                                             "key1", "key2"])
+
+def _roll_or_missing(num):
+    return num if num is not None and num < 2 ** 63 else -1
+
+_COLUMN_DTYPES = (np.int32, np.int32, bool, bool, np.int64, np.int64, np.int32, np.int32)
+
+class StudentPair:
+    """
+    One bench (Series-1 and Series-2 student) parsed once at ingestion.
 
-    pairs = df.to_dict(orient="records") #[{'Roll No. Series-1': str or nan , 'Roll No. Series-2': '2200970700064\n MBA-II'}]
-    return pairs
+    Roll numbers are kept as ints; the original text is only stored when it
+    is not just the decimal form of that int (e.g. '201A'). Branches are ids
+    into the owning Roster's `branches` list, 0 meaning no branch.
+    """
+    __slots__ = ("num1", "text1", "branch1", "num2", "text2", "branch2")
 
-def upload_rooms(file):
-    df = pd.read_excel(file,
-                    sheet_name="main",
-                    usecols = ['Room No.', 'Row', 'Column'],
-                    )
+    def __init__(self, num1, text1, branch1, num2, text2, branch2):
+        self.num1 = num1
+        self.text1 = text1
+        self.branch1 = branch1
+        self.num2 = num2
+        self.text2 = text2
+        self.branch2 = branch2
 
-    rooms = df.dropna(how="all").to_dict(orient="records") #[{'Room No.': 'D-104' or nan, 'Row': 8.0 or nan , 'Column': 4.0 or nan}...]
-    return rooms
+    @property
+    def roll1(self) -> str:
+        return self.text1 if self.text1 is not None else str(self.num1)
 
-def upload_college_sem(file):
-    """Read college name and exam name from Excel file.
-    Returns (college_name, exam_name) tuple from the first non-empty record."""
-    df = pd.read_excel(file,
-                    sheet_name="main",
-                    usecols = ['College Name', 'Exam Name'])
-    info = df.dropna(how="all").to_dict(orient="records")
-    
+    @property
+    def roll2(self) -> str:
+        return self.text2 if self.text2 is not None else str(self.num2)
+
+    def labels(self, branch_names: list):
+        """Return the (s1, s2) cell text, 'roll\\nbranch', for a room sheet."""
+        s1 = "\n".join(filter(None, [self.roll1, branch_names[self.branch1]]))
+        s2 = "\n".join(filter(None, [self.roll2, branch_names[self.branch2]]))
+        return s1, s2
+
+    def __getstate__(self):
+        return (self.num1, self.text1, self.branch1, self.num2, self.text2, self.branch2)
+
+    def __setstate__(self, state):
+        self.num1, self.text1, self.branch1, self.num2, self.text2, self.branch2 = state
+
+
+class Roster:
+    """
+    Parsed student pairs plus the table of interned branch names.
+
+    Build one with Roster.from_pairs(pair_dicts) or by calling add(s1, s2)
+    with the raw 'Roll No. Series-1/2' cell values. roll_keys interns the
+    (prefix, suffix, width) around the serial of rolls that are not just
+    digits, e.g. ('CS', '', 3) for 'CS045'; it is filled as columns are built.
+    The zero-padded width is part of the key, so 'CS045' and 'CS45' never
+    share a run and every label reproduces the rolls as they were written.
+    """
+    __slots__ = ("pairs", "branches", "_branch_ids", "_columns", "roll_keys", "_roll_key_ids")
+
+    def __init__(self):
+        self.pairs = []
+        self.branches = [""]
+        self._branch_ids = {"": 0}
+        self._columns = None
+        self.roll_keys = [("", "", 0)]
+        self._roll_key_ids = {("", "", 0): 0}
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __iter__(self):
+        return iter(self.pairs)
+
+    def __getitem__(self, idx):
+        return self.pairs[idx]
+
+    def __getstate__(self):
+        return self.pairs, self.branches
+
+    def __setstate__(self, state):
+        self.pairs, self.branches = state
+        self._branch_ids = {name: idx for idx, name in enumerate(self.branches)}
+        self._columns = None
+        self.roll_keys = [("", "", 0)]
+        self._roll_key_ids = {("", "", 0): 0}
+
+    def __sizeof__(self):
+        size = object.__sizeof__(self) + sys.getsizeof(self.pairs) + sys.getsizeof(self.branches)
+        size += sum(map(sys.getsizeof, self.branches)) + sys.getsizeof(self._branch_ids)
+        size += sys.getsizeof(self.roll_keys) + sys.getsizeof(self._roll_key_ids)
+        size += sum(sys.getsizeof(key) + sum(map(sys.getsizeof, key)) for key in self.roll_keys)
+        for pair in self.pairs:
+            size += sys.getsizeof(pair)
+            for value in (pair.num1, pair.text1, pair.num2, pair.text2):
+                if value is not None:
+                    size += sys.getsizeof(value)
+        if self._columns is not None:
+            size += sum(column.nbytes for column in self._columns)
+        return size
+
+    def branch_id(self, name: str) -> int:
+        branch_id = self._branch_ids.get(name)
+        if branch_id is None:
+            branch_id = self._branch_ids[name] = len(self.branches)
+            self.branches.append(name)
+        return branch_id
+
+    def _roll_serial(self, num, text) -> tuple:
+        """(roll key id, serial) of one side of a pair, serial -1 when it has no digits."""
+        if text is None:
+            return 0, _roll_or_missing(num)  # digits only, or no roll at all
+        parts = _roll_parts(text)
+        if parts is None:
+            return 0, -1
+        prefix, serial, suffix, width = parts
+        key = (prefix, suffix, width)
+        key_id = self._roll_key_ids.get(key)
+        if key_id is None:
+            key_id = self._roll_key_ids[key] = len(self.roll_keys)
+            self.roll_keys.append(key)
+        return key_id, serial
+
+    def _pair_columns(self, p) -> tuple:
+        """One pair's values for each RosterColumns field."""
+        key1, num1 = self._roll_serial(p.num1, p.text1)
+        key2, num2 = self._roll_serial(p.num2, p.text2)
+        return (p.branch1, p.branch2,
+                bool(p.branch1 and (p.num1 is not None or p.text1)), bool(p.branch2 and (p.num2 is not None or p.text2)),
+                num1, num2, key1, key2)
+
+    def _parse(self, raw_value):
+        roll, branch = _split_roll_and_branch(_clean_value(raw_value) if raw_value else "")
+        num = _extract_roll_number(roll)
+        text = None if num is not None and str(num) == roll else roll
+        return num, text, self.branch_id(branch)
+
+    def add(self, s1_raw, s2_raw) -> StudentPair:
+        pair = StudentPair(*self._parse(s1_raw), *self._parse(s2_raw))
+        self.pairs.append(pair)
+        return pair
+
+    def replace(self, idx: int, pair: StudentPair):
+        """Swap the pair at idx, keeping the cached columns in step."""
+        self.pairs[idx] = pair
+        if self._columns is not None and idx < len(self._columns.num1):
+            for name, value in zip(RosterColumns._fields, self._pair_columns(pair)):
+                getattr(self._columns, name)[idx] = value
+
+    def copy(self) -> "Roster":
+        """Copy that can be added to or replaced in without touching this roster."""
+        roster = Roster()
+        roster.pairs = list(self.pairs)
+        roster.branches = list(self.branches)
+        roster._branch_ids = dict(self._branch_ids)
+        roster.roll_keys = list(self.roll_keys)
+        roster._roll_key_ids = dict(self._roll_key_ids)
+        if self._columns is not None:
+            roster._columns = RosterColumns(*(column.copy() for column in self._columns))
+        return roster
+
+    def columns(self) -> "RosterColumns":
+        """Per-pair numpy columns for vectorised allocation, built once and extended as pairs are added."""
+        cached = self._columns
+        start = 0 if cached is None else len(cached.num1)
+        if start == len(self.pairs) and cached is not None:
+            return cached
+
+        tail = self.pairs[start:]
+        rows = [self._pair_columns(p) for p in tail]
+        new = RosterColumns(*(np.fromiter((row[i] for row in rows), dtype=dtype, count=len(tail))
+                              for i, dtype in enumerate(_COLUMN_DTYPES)))
+        self._columns = new if cached is None else RosterColumns(*map(np.concatenate, zip(cached, new)))
+        return self._columns
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Build a Roster from pair dicts as produced by upload_students."""
+        roster = cls()
+        for pair in pairs:
+            roster.add(pair.get("Roll No. Series-1", pair.get("s1", "")),
+                       pair.get("Roll No. Series-2", pair.get("s2", "")))
+        return roster
+
+def as_roster(pairs) -> Roster:
+    """Return `pairs` as a Roster, parsing it first if it is a list of pair dicts."""
+    if isinstance(pairs, Roster):
+        return pairs
+    return Roster.from_pairs(pairs)
+
+STUDENT_COLUMNS = ['Roll No. Series-1', 'Roll No. Series-2']
+ROOM_COLUMNS = ['Room No.', 'Row', 'Column']
+INFO_COLUMNS = ['College Name', 'Exam Name']
+MAIN_SHEET_COLUMNS = STUDENT_COLUMNS + ROOM_COLUMNS + INFO_COLUMNS
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+UPLOAD_FORMATS = ("xlsx", "csv", "parquet", "jsonl")
+
+def _first_college_sem(info: list):
+    """Return (college_name, exam_name) from the first non-empty info record."""
     if not info:
         return "", ""
-    
+
     first_record = info[0]
     college_name = str(first_record.get("College Name", "")).strip() if first_record.get("College Name") else ""
     exam_name = str(first_record.get("Exam Name", "")).strip() if first_record.get("Exam Name") else ""
-    
+
     return college_name, exam_name
 
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def _column_positions(header: list, columns: list, source: str) -> list:
+    header = [str(name).strip() if name is not None else "" for name in header]
+    missing = [name for name in columns if name not in header]
+    if missing:
+        raise ValueError(f"{source} is missing columns: {missing}")
+    return [header.index(name) for name in columns]
+
+def iter_main_sheet(file, columns: list = MAIN_SHEET_COLUMNS):
+    """
+    Stream the "main" sheet row by row as tuples ordered like `columns`.
+
+    Uses openpyxl read-only mode, so only the current row is held in memory
+    and peak memory depends on the row width, not the number of rows.
+    Empty cells come back as None. A file that is not a readable workbook, or
+    has no "main" sheet, raises ValueError.
+    """
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # KeyError: a zip without the workbook parts, e.g. a .docx; SyntaxError: XML parse errors
+    # (ElementTree's and lxml's); zlib.error and EOFError: damaged or truncated zip members
+    unreadable = (BadZipFile, InvalidFileException, KeyError, SyntaxError, zlib.error, EOFError)
+    try:
+        wb = load_workbook(file, read_only=True, data_only=True)
+    except unreadable as exc:
+        raise ValueError(f"Not a readable .xlsx workbook ({exc})") from exc
+    try:
+        if "main" not in wb.sheetnames:
+            raise ValueError(f"Workbook has no 'main' sheet (found: {', '.join(wb.sheetnames)})")
+        rows = wb["main"].iter_rows(values_only=True)
+        positions = _column_positions(next(rows, ()), columns, "'main' sheet")
+
+        for row in rows:
+            yield tuple(row[pos] if pos < len(row) else None for pos in positions)
+    except unreadable as exc:
+        raise ValueError(f"Not a readable .xlsx workbook ({exc})") from exc
+    finally:
+        wb.close()
+
+def detect_upload_format(file) -> str:
+    """
+    Tell the upload formats apart from the first bytes of the file: 'xlsx' (a zip),
+    'parquet' (PAR1 magic), 'jsonl' (starts with '{') or else 'csv'.
+    The file position is left where it was.
+    """
+    position = file.tell()
+    head = file.read(64)
+    file.seek(position)
+    if head.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{"):
+        return "jsonl"
+    return "csv"
+
+def _missing_to_none(value):
+    """None for the ways text formats spell an empty cell ('' or NaN), the value otherwise."""
+    if value == "" or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+def _iter_csv_rows(file, columns: list):
+    """Stream a CSV upload (UTF-8, header row first) as tuples ordered like `columns`."""
+    text = TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        rows = csv.reader(text)
+        positions = _column_positions(next(rows, []), columns, "CSV header")
+        for row in rows:
+            yield tuple(_missing_to_none(row[pos]) if pos < len(row) else None for pos in positions)
+    finally:
+        text.detach()  # leave the upload open for the caller
+
+def _iter_parquet_rows(file, columns: list, batch_size: int = 64 * 1024):
+    """Stream a Parquet upload batch by batch; only the needed columns are decoded."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet uploads need pyarrow installed (pip install 'backend[parquet]')") from None
+    parquet = pq.ParquetFile(file)
+    names = parquet.schema_arrow.names
+    positions = _column_positions(names, columns, "Parquet schema")
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=[names[pos] for pos in positions]):
+        values = [[_missing_to_none(value) for value in batch.column(i).to_pylist()] for i in range(len(columns))]
+        yield from zip(*values)
+
+def _iter_jsonl_rows(file, columns: list):
+    """Stream a JSON Lines upload, one object per line keyed by column name."""
+    keys = None
+    for line in file:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if keys is None:
+            # Every column must be present in the first record, as in a header row
+            names = {str(key).strip(): key for key in record}
+            _column_positions(list(names), columns, "First JSON Lines record")
+            keys = [names[name] for name in columns]
+        yield tuple(_missing_to_none(record.get(key)) for key in keys)
+
+def iter_main_rows(file, columns: list = MAIN_SHEET_COLUMNS, upload_format: str = None):
+    """
+    Stream the main table of an upload in any of UPLOAD_FORMATS as tuples ordered like
+    `columns`, with None for empty cells.
+
+    An xlsx file is read from its "main" sheet; CSV, Parquet and JSON Lines files use the
+    same column names. The format is detected from the content unless given.
+    """
+    upload_format = upload_format or detect_upload_format(file)
+    if upload_format == "xlsx":
+        return iter_main_sheet(file, columns)
+    if upload_format == "csv":
+        return _iter_csv_rows(file, columns)
+    if upload_format == "parquet":
+        return _iter_parquet_rows(file, columns)
+    if upload_format == "jsonl":
+        return _iter_jsonl_rows(file, columns)
+    raise ValueError(f"Unknown upload format: {upload_format!r}")
+
+def _pairs_from_rows(rows):
+    """Yield (s1, s2) from student rows.
+
+    Blank pairs between students are kept so they still occupy a seat, but
+    blank rows after the last student are dropped."""
+    pending_blanks = 0
+    for s1, s2 in rows:
+        if _is_blank(s1) and _is_blank(s2):
+            pending_blanks += 1
+            continue
+        for _ in range(pending_blanks):
+            yield None, None
+        pending_blanks = 0
+        yield s1, s2
+
+def _room_number(value):
+    """Room No. as text ('D-104', or '101' for a numeric cell read as 101.0), None if blank."""
+    value = _missing_to_none(value)
+    if _is_blank(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _room_size(room_no, value):
+    """A Row/Column cell as an int (text formats give '8' or '8.0'), None if blank."""
+    value = _missing_to_none(value)
+    if _is_blank(value):
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Room {room_no!r} has a Row/Column that is not a number: {value!r}") from None
+
+def _room_record(room_no, rows, cols) -> dict:
+    """One room row with clean values: Room No. as text, Row and Column as ints, blanks as None."""
+    room_no = _room_number(room_no)
+    return {'Room No.': room_no, 'Row': _room_size(room_no, rows), 'Column': _room_size(room_no, cols)}
+
+def iter_student_pairs(file):
+    """Lazily yield {'Roll No. Series-1': ..., 'Roll No. Series-2': ...} pairs."""
+    for s1, s2 in _pairs_from_rows(iter_main_rows(file, STUDENT_COLUMNS)):
+        yield {'Roll No. Series-1': s1, 'Roll No. Series-2': s2}
+
+def iter_rooms(file):
+    """Lazily yield {'Room No.': ..., 'Row': ..., 'Column': ...} for non-empty room rows."""
+    for room_no, rows, cols in iter_main_rows(file, ROOM_COLUMNS):
+        if _is_blank(room_no) and _is_blank(rows) and _is_blank(cols):
+            continue
+        yield _room_record(room_no, rows, cols)
+
+def upload_main_sheet(file):
+    """
+    Read the "main" sheet once and split it into everything /upload-file needs.
+
+    Equivalent to calling upload_students, upload_rooms and upload_college_sem
+    on the same file, but the workbook is only decompressed and parsed once,
+    row by row. CSV, Parquet and JSON Lines files with the same columns are
+    accepted too (see iter_main_rows).
+
+    Returns:
+        (roster, rooms, college_name, exam_name) where roster is a Roster
+        of the student pairs, parsed as they are read.
+    """
+    roster = Roster()
+    rooms = []
+    info = []
+
+    def student_rows():
+        for s1, s2, room_no, rows, cols, college, exam in iter_main_rows(file):
+            if not (_is_blank(room_no) and _is_blank(rows) and _is_blank(cols)):
+                rooms.append(_room_record(room_no, rows, cols))
+            if not info and not (_is_blank(college) and _is_blank(exam)):
+                info.append({'College Name': college, 'Exam Name': exam})
+            yield s1, s2
+
+    with metrics.span("parse"):
+        for s1, s2 in _pairs_from_rows(student_rows()):
+            roster.add(s1, s2)
+    college_name, exam_name = _first_college_sem(info)
+
+    return roster, rooms, college_name, exam_name
+
+def upload_students(file):
+    pairs = list(iter_student_pairs(file)) #[{'Roll No. Series-1': str or None , 'Roll No. Series-2': '2200970700064\n MBA-II'}]
+    return pairs
+
+def upload_rooms(file):
+    rooms = list(iter_rooms(file)) #[{'Room No.': 'D-104' or None, 'Row': 8 or None , 'Column': 4 or None}...]
+    return rooms
+
+def upload_college_sem(file):
+    """Read college name and exam name from Excel file.
+    Returns (college_name, exam_name) tuple from the first non-empty record."""
+    for college, exam in iter_main_rows(file, INFO_COLUMNS):
+        if not (_is_blank(college) and _is_blank(exam)):
+            return _first_college_sem([{'College Name': college, 'Exam Name': exam}])
+    return "", ""
+
 def find_capacity_per_room(rooms: dict) -> dict[Any, Any]:
     room_capacity = {}
     for room in rooms:
         room_no = room['Room No.']
-        rows = int(room['Row'] or 0)
-        cols = int(room['Column'] or 0)
+        rows = int(float(room['Row'] or 0))  # ingestion gives ints; hand-made rooms may give '8' or '8.0'
+        cols = int(float(room['Column'] or 0))
 
         room_capacity[room_no] = {
             "rows": rows,
@@ -154,1002 +644,884 @@ def find_capacity_per_room(rooms: dict) -> dict[Any, Any]:
         }
     return room_capacity        #room_capacity = {'D-104': {'rows':8,'cols':4,'capacity':32}...}
 
-def fill_room(pairs: list, room_capacity: dict):
-    room_layout = defaultdict(list)  # creates an empty dictionary with values as lists {some_key: []}
-    branch_counts_per_room = defaultdict(lambda: defaultdict(int))  # {room_no: {branch: count}}
+SEAT_MASKS = {
+    # mode: f(row_idx, col_idx) -> True where a pair may sit; args broadcast
+    "normal": lambda r, c: (r >= 0) & (c >= 0),
+    "row_gap": lambda r, c: (r % 2 == 0) & (c >= 0),   # keep alternate rows empty
+    "col_gap": lambda r, c: (r >= 0) & (c % 2 == 0),   # keep alternate columns empty
+    "checkerboard": lambda r, c: (r + c) % 2 == 0,
+}
+
+def seat_mask(rows: int, cols: int, mode: str = "normal", blocked: list = None) -> np.ndarray:
+    """
+    Return a rows x cols bool array that is True where a pair may be seated.
+
+    Args:
+        mode: One of SEAT_MASKS
+        blocked: 1-based (row, col) benches that must stay empty, e.g. broken benches
+    """
+    if mode not in SEAT_MASKS:
+        raise ValueError(f"Unknown seating mode: {mode!r}")
+    mask = np.broadcast_to(SEAT_MASKS[mode](np.arange(rows)[:, None], np.arange(cols)[None, :]), (rows, cols))
+    if blocked:
+        mask = mask.copy()
+        for row, col in blocked:
+            if 1 <= row <= rows and 1 <= col <= cols:
+                mask[row - 1, col - 1] = False
+    return mask
+
+def masks_from_blocked_seats(room_capacity: dict, blocked_seats: dict) -> dict:
+    """Turn {room_no: [(row, col), ...]} into per-room masks for allocate_seats."""
+    room_masks = {}
+    for room_no, blocked in (blocked_seats or {}).items():
+        spec = room_capacity.get(room_no)
+        if spec and blocked:
+            room_masks[room_no] = seat_mask(int(spec.get("rows", 0) or 0), int(spec.get("cols", 0) or 0),
+                                            "normal", blocked)
+    return room_masks
+
+@lru_cache(maxsize=512)
+def _seat_order(rows: int, cols: int, mode: str):
+    """(row_idx, col_idx) of usable seats in fill order, column by column."""
+    col_idx, row_idx = np.nonzero(seat_mask(rows, cols, mode).T)
+    row_idx.flags.writeable = False
+    col_idx.flags.writeable = False
+    return row_idx, col_idx
+
+def _branch_summaries(roster: Roster, seated: dict) -> tuple:
+    """
+    Branch counts and roll ranges for many rooms in one vectorised pass.
+
+    seated maps room_no to a slice or index array of the pair indices in that room, in
+    seat order. Branches are ordered by first appearance in seat order, Series-1 before
+    Series-2; a branch's ranges are grouped by roll prefix/suffix and sorted.
+
+    Returns:
+        ({room_no: {branch: count}}, {room_no: {branch: [RollRange, ...]}}) for every room
+        in seated
+    """
+    columns = roster.columns()
+    rooms = list(seated)
+    if not rooms:
+        return {}, {}
+    pair_idx = [np.arange(*idx.indices(len(columns.num1))) if isinstance(idx, slice) else np.asarray(idx, dtype=np.intp)
+                for idx in seated.values()]
+    room_of = np.repeat(np.arange(len(rooms)), [2 * len(idx) for idx in pair_idx])
+    pair_idx = np.concatenate(pair_idx)
+
+    def sides(first, second):
+        return np.column_stack((first[pair_idx], second[pair_idx])).ravel()
+
+    counted = sides(columns.counted1, columns.counted2)
+    room_of = room_of[counted]
+    branch_ids = sides(columns.branch1, columns.branch2)[counted].astype(np.int64)
+    nums = sides(columns.num1, columns.num2)[counted]
+    keys = sides(columns.key1, columns.key2)[counted].astype(np.int64)
+
+    # (room, branch) groups in order of first appearance; seats are concatenated room by room
+    width = len(roster.branches)
+    groups = room_of * width + branch_ids
+    ids, first_seen, counts = np.unique(groups, return_index=True, return_counts=True)
+    ranges = defaultdict(list)
+    run_groups, run_keys, firsts, lasts = _roll_runs(groups, keys, nums)
+    for group, label in zip(run_groups.tolist(), _range_labels(roster.roll_keys, run_keys, firsts, lasts)):
+        ranges[group].append(label)
+
+    branch_counts = {room_no: {} for room_no in rooms}
+    branch_ranges = {room_no: {} for room_no in rooms}
+    for i in np.argsort(first_seen, kind="stable").tolist():
+        group = int(ids[i])
+        room_no, name = rooms[group // width], roster.branches[group % width]
+        branch_counts[room_no][name] = int(counts[i])
+        if group in ranges:  # Only add if there are ranges
+            branch_ranges[room_no][name] = ranges[group]
+    return branch_counts, branch_ranges
+
+class Allocation:
+    """
+    Seats assigned by allocate_seats.
+
+    Attributes:
+        roster: Roster the seat indices point into
+        mode: Seating mode that was used
+        room_capacity: The room catalogue the allocation was made against
+        room_masks: The extra per-room masks that were applied (blocked seats)
+        seats: {room_no: rows x cols int32 array of pair indices, -1 for an empty seat}
+        waiting: int array of the pair indices that got no seat, in queue order
+        unallocated: Number of students (two per pair) that did not fit
+        branch_counts: {room_no: {branch: count}}
+        branch_ranges: {room_no: {branch: ['201-208', '210']}}
+        stats: Extra figures from the allocator, e.g. adjacency from allocate_seats_spread
+    """
+
+    def __init__(self, roster: Roster, mode: str, room_capacity: dict = None, room_masks: dict = None):
+        self.roster = roster
+        self.mode = mode
+        self.room_capacity = room_capacity or {}
+        self.room_masks = room_masks or {}
+        self.seats = {}
+        self.waiting = np.empty(0, dtype=np.int32)
+        self.unallocated = 0
+        self.branch_counts = {}
+        self.branch_ranges = {}
+        self.stats = {}
+        self._branch_index = None
+
+    def room_rows(self, room_no) -> list:
+        """Rows of StudentPair/None for one room, [] if nobody was seated there."""
+        grid = self.seats[room_no]
+        if not (grid >= 0).any():
+            return []
+        pairs = self.roster.pairs
+        return [[pairs[idx] if idx >= 0 else None for idx in row] for row in grid.tolist()]
+
+    def room_layout(self) -> dict:
+        return {room_no: self.room_rows(room_no) for room_no in self.seats}
+
+    def branch_index(self) -> "BranchRoomIndex":
+        """The branch x room aggregate of branch_counts and branch_ranges, built on first use."""
+        if self._branch_index is None:
+            self._branch_index = BranchRoomIndex(self.branch_counts, self.branch_ranges)
+        return self._branch_index
+
+    def as_tuple(self):
+        """(room_layout, unallocated, branch_counts_per_room, branch_range_per_room), as fill_room returns."""
+        return self.room_layout(), self.unallocated, self.branch_counts, self.branch_ranges
+
+def allocate_seats(pairs, room_capacity: dict, mode: str = "normal", room_masks: dict = None) -> Allocation:
+    """
+    Seat pairs room by room, column by column, on the seats allowed by a mask.
+
+    Args:
+        pairs: Roster (or list of pair dicts) in seating order
+        room_capacity: {room_no: {'rows': 8, 'cols': 4, ...}} in room order
+        mode: One of SEAT_MASKS ('normal', 'row_gap', 'col_gap', 'checkerboard')
+        room_masks: Optional {room_no: rows x cols bool array-like}, combined with
+            the mode's mask, e.g. from masks_from_blocked_seats for broken benches
+
+    Every room's seat coordinates are computed in one vectorised step; a room's
+    grid keeps its full rows x cols shape so skipped seats stay visible.
+    """
+    roster = as_roster(pairs)
+    total = len(roster)
+    allocation = Allocation(roster, mode, room_capacity, room_masks)
     pair_idx = 0
-    branch_range_per_room = defaultdict(lambda: defaultdict(list))  # {room_no: {branch: [roll_numbers]}}
+    placed = {}  # {room_no: slice of the pairs seated there}
 
     for room_no, spec in room_capacity.items():
+        if pair_idx >= total:
+            break  # no more students to allocate
         rows = int(spec.get("rows", 0) or 0)
         cols = int(spec.get("cols", 0) or 0)
 
-        # build a grid [row][col], but fill column by column so
-        # students in the same "current_row" list end up in one column
-        grid = [[None for _ in range(cols)] for _ in range(rows)]
-
-        for c in range(cols):
-            for r in range(rows):
-                if pair_idx >= len(pairs):
-                    break
-                grid[r][c] = pairs[pair_idx]
-                
-                # Count branches for this pair
-                pair = pairs[pair_idx]
-                s1_raw = pair.get("Roll No. Series-1", pair.get("s1", ""))
-                s2_raw = pair.get("Roll No. Series-2", pair.get("s2", ""))
-                
-                roll1, branch1 = _split_roll_and_branch(s1_raw)
-                roll2, branch2 = _split_roll_and_branch(s2_raw)
-                
-                # Track roll numbers for range calculation
-                if branch1 and roll1:
-                    branch_range_per_room[room_no][branch1].append(roll1)
-                    branch_counts_per_room[room_no][branch1] += 1
-                if branch2 and roll2:
-                    branch_range_per_room[room_no][branch2].append(roll2)
-                    branch_counts_per_room[room_no][branch2] += 1
-                
-                pair_idx += 1
-            if pair_idx >= len(pairs):
-                break
+        if room_masks and room_no in room_masks:
+            mask = seat_mask(rows, cols, mode) & np.asarray(room_masks[room_no], dtype=bool)
+            col_idx, row_idx = np.nonzero(mask.T)
+        else:
+            row_idx, col_idx = _seat_order(rows, cols, mode)
 
-        # convert grid back to list-of-lists (rows), dropping empty seats
-        cleaned_rows = []
-        for r in range(rows):
-            row_seats = [seat for seat in grid[r] if seat is not None]
-            if row_seats:
-                cleaned_rows.append(row_seats)
+        seated = min(len(row_idx), total - pair_idx)
+        grid = np.full((rows, cols), -1, dtype=np.int32)
+        grid[row_idx[:seated], col_idx[:seated]] = np.arange(pair_idx, pair_idx + seated, dtype=np.int32)
+        allocation.seats[room_no] = grid
 
-        room_layout[room_no] = cleaned_rows
+        if seated:
+            placed[room_no] = slice(pair_idx, pair_idx + seated)
+        pair_idx += seated
 
-        if pair_idx >= len(pairs):
-            break  # no more students to allocate
-    
-    # Convert roll number lists to consecutive ranges
-    branch_range_per_room_final = {}
-    for room_no, branch_rolls in branch_range_per_room.items():
-        branch_range_per_room_final[room_no] = {}
-        for branch, roll_numbers in branch_rolls.items():
-            ranges = _find_consecutive_ranges(roll_numbers)
-            if ranges:  # Only add if there are ranges
-                branch_range_per_room_final[room_no][branch] = ranges
-    
-    # Store in the original variable name for access
-    branch_range_per_room = branch_range_per_room_final
-    
-    unallocated = (len(pairs) - pair_idx) * 2
-    # Convert defaultdict to regular dict for return
-    branch_counts_dict = {room: dict(branches) for room, branches in branch_counts_per_room.items()}
-    
-    return room_layout,unallocated, branch_counts_dict, branch_range_per_room     # ({'D-104': [[{pair1}, {pair2}, ...], [{pairN}, ...]]}, {'D-104': {'branch1': count, 'branch2': count}})
-
-def build_qpd_sheet(ws, branch_counts_per_room: dict, college_name: str = "", exam_name: str = "", 
-                    date: str = "", shift_time: str = "", unallocated: int = 0):
+    # Counts and ranges of every room in one pass over the placed pairs
+    allocation.branch_counts, allocation.branch_ranges = _branch_summaries(roster, placed)
+    allocation.waiting = np.arange(pair_idx, total, dtype=np.int32)
+    allocation.unallocated = (total - pair_idx) * 2
+    return allocation
+
+def _student_table(roster: Roster) -> tuple:
     """
-    Build a formatted QPD (Quarterly Progress Distribution) sheet on the given worksheet.
-    
-    Args:
-        ws: openpyxl worksheet object to build the QPD sheet on
-        branch_counts_per_room: Dict like {'D-104': {'IT-II': 32, 'MBA-IV': 32}, ...}
-        college_name: Name of the college
-        exam_name: Name of the exam
-        date: Date string (e.g., "04-07-2023")
-        shift_time: Shift time (e.g., "10:00-12:00")
-        unallocated: Number of unallocated students
+    Intern every student of a roster once.
+
+    Returns:
+        (rolls, branch ids, series-1 ids, series-2 ids): one entry per distinct
+        (roll, branch) in first-seen order, and each pair's index into them,
+        -1 for a blank side
     """
-    # Build the nested structure: {semester: {branch: {room: count}}}
-    qpd = defaultdict(lambda: defaultdict(dict))
-    all_rooms = []  # Preserve order from input
-    
-    for room, branch_counts in branch_counts_per_room.items():
-        if room not in all_rooms:
-            all_rooms.append(room)
-        for branch_sem, count in branch_counts.items():
-            # Split branch-semester like 'IT-II' into branch='IT' and semester='II'
-            if '-' in branch_sem:
-                branch_name, semester = branch_sem.rsplit('-', 1)
-                qpd[semester][branch_name][room] = count
-    
-    # Get all semesters and branches, sorted
-    semesters = sorted(qpd.keys())
-    all_branches_by_sem = {}
-    for sem in semesters:
-        all_branches_by_sem[sem] = sorted(qpd[sem].keys())
-    
-    # Styling - use thick borders for entire table
-    thick = Side(border_style="thick", color="000000")
-    border = Border(top=thick, bottom=thick, left=thick, right=thick)
-    header_border = Border(top=thick, bottom=thick, left=thick, right=thick)
-    yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    
-    current_row = 1
-    
-    # Determine column structure first (needed for header width calculation)
-    col = 1
-    room_col_left = col
-    col += 1
-    
-    semester_start_cols = {}
-    semester_col_ranges = {}
-    
-    for sem in semesters:
-        semester_start_cols[sem] = col
-        num_branches = len(all_branches_by_sem[sem])
-        semester_col_ranges[sem] = (col, col + num_branches - 1)
-        col += num_branches
-    
-    total_col = col
-    col += 1
-    room_col_right = col
-    table_width = room_col_right
-    
-    # Header section
-    if exam_name:
-        title = f"QPD - {exam_name}"
-        ws.merge_cells(start_row=current_row, start_column=1, 
-                      end_row=current_row, end_column=table_width)
-        cell = ws.cell(row=current_row, column=1, value=title)
-        cell.font = Font(size=16, bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        current_row += 1
-    
-    if date or shift_time:
-        info_text = ""
-        if date:
-            info_text = f"Date: {date}"
-        if shift_time:
-            if info_text:
-                info_text += f" | Shift: {shift_time}"
-            else:
-                info_text = f"Shift: {shift_time}"
-        
-        ws.merge_cells(start_row=current_row, start_column=1, 
-                      end_row=current_row, end_column=table_width)
-        cell = ws.cell(row=current_row, column=1, value=info_text)
-        cell.font = Font(size=12, bold=False)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        current_row += 2  # Extra space after header
-    
-    # Build header rows
-    header_row = current_row
-    
-    # First header row: Semester labels
-    cell = ws.cell(row=header_row, column=room_col_left, value="ROOM NO.")
-    cell.font = Font(size=11, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    
-    for sem in semesters:
-        start_col, end_col = semester_col_ranges[sem]
-        ws.merge_cells(start_row=header_row, start_column=start_col,
-                      end_row=header_row, end_column=end_col)
-        cell = ws.cell(row=header_row, column=start_col, value=f"{sem} SEM")
-        cell.font = Font(size=11, bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = header_border
-    
-    cell = ws.cell(row=header_row, column=total_col, value="Total")
-    cell.font = Font(size=11, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    
-    cell = ws.cell(row=header_row, column=room_col_right, value="ROOM NO.")
-    cell.font = Font(size=11, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    
-    current_row += 1
-    
-    # Second header row: Branch names
-    for sem in semesters:
-        start_col = semester_start_cols[sem]
-        for idx, branch in enumerate(all_branches_by_sem[sem]):
-            col_idx = start_col + idx
-            cell = ws.cell(row=current_row, column=col_idx, value=branch)
-            cell.font = Font(size=10, bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = header_border
-    
-    # Empty cells for room columns and total in second header row
-    for col_idx in [room_col_left, total_col, room_col_right]:
-        cell = ws.cell(row=current_row, column=col_idx, value="")
-        cell.border = header_border
-    
-    current_row += 1
-    
-    # Data rows - preserve original order from input
-    for room in all_rooms:
-        row_total = 0
-        
-        # Left ROOM NO.
-        cell = ws.cell(row=current_row, column=room_col_left, value=room)
-        cell.font = Font(size=10, bold=False)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = border
-        
-        # Semester columns
-        for sem in semesters:
-            start_col = semester_start_cols[sem]
-            for idx, branch in enumerate(all_branches_by_sem[sem]):
-                count = qpd[sem].get(branch, {}).get(room, 0)
-                if count > 0:
-                    row_total += count
-                
-                col_idx = start_col + idx
-                cell = ws.cell(row=current_row, column=col_idx, value=count if count > 0 else "")
-                cell.font = Font(size=10, bold=False)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = border
-                if count > 0:
-                    cell.fill = yellow_fill
-        
-        # Total
-        cell = ws.cell(row=current_row, column=total_col, value=row_total if row_total > 0 else "")
-        cell.font = Font(size=10, bold=False)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = border
-        if row_total > 0:
-            cell.fill = yellow_fill
-        
-        # Right ROOM NO.
-        cell = ws.cell(row=current_row, column=room_col_right, value=room)
-        cell.font = Font(size=10, bold=False)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = border
-        
-        current_row += 1
-    
-    # Summary row
-    summary_row = current_row
-    current_row += 1
-    
-    # Summary label
-    cell = ws.cell(row=summary_row, column=room_col_left, value="Total")
-    cell.font = Font(size=10, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    
-    grand_total = 0
-    
-    # Semester totals
-    for sem in semesters:
-        start_col = semester_start_cols[sem]
-        for idx, branch in enumerate(all_branches_by_sem[sem]):
-            branch_total = sum(qpd[sem].get(branch, {}).values())
-            grand_total += branch_total
-            
-            col_idx = start_col + idx
-            cell = ws.cell(row=summary_row, column=col_idx, value=branch_total if branch_total > 0 else "")
-            cell.font = Font(size=10, bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = header_border
-            if branch_total > 0:
-                cell.fill = yellow_fill
-    
-    # Grand total
-    cell = ws.cell(row=summary_row, column=total_col, value=grand_total)
-    cell.font = Font(size=10, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    if grand_total > 0:
-        cell.fill = yellow_fill
-    
-    cell = ws.cell(row=summary_row, column=room_col_right, value="")
-    cell.border = header_border
-    
-    current_row += 1
-    
-    # Unallocated row
-    if unallocated > 0:
-        unallocated_row = current_row
-        current_row += 1
-        
-        # Left ROOM NO. - show "Unallocated"
-        cell = ws.cell(row=unallocated_row, column=room_col_left, value="Unallocated")
-        cell.font = Font(size=10, bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = header_border
-        
-        # Empty cells for all semester/branch columns
-        for sem in semesters:
-            start_col = semester_start_cols[sem]
-            for idx, branch in enumerate(all_branches_by_sem[sem]):
-                col_idx = start_col + idx
-                cell = ws.cell(row=unallocated_row, column=col_idx, value="")
-                cell.border = header_border
-        
-        # Total column - show unallocated count
-        cell = ws.cell(row=unallocated_row, column=total_col, value=unallocated)
-        cell.font = Font(size=10, bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = header_border
-        cell.fill = yellow_fill
-        
-        # Right ROOM NO. - empty
-        cell = ws.cell(row=unallocated_row, column=room_col_right, value="")
-        cell.border = header_border
-    
-    # Add header rows at the bottom (branches first, then semester labels)
-    bottom_header_row1 = current_row  # Branch names row (first at bottom)
-    current_row += 1
-    
-    # First header row at bottom: Branch names
-    for sem in semesters:
-        start_col = semester_start_cols[sem]
-        for idx, branch in enumerate(all_branches_by_sem[sem]):
-            col_idx = start_col + idx
-            cell = ws.cell(row=bottom_header_row1, column=col_idx, value=branch)
-            cell.font = Font(size=10, bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = header_border
-    
-    # Empty cells for room columns and total in first header row at bottom
-    for col_idx in [room_col_left, total_col, room_col_right]:
-        cell = ws.cell(row=bottom_header_row1, column=col_idx, value="")
-        cell.border = header_border
-    
-    bottom_header_row2 = current_row  # Semester labels row (second at bottom)
-    
-    # Second header row at bottom: Semester labels and ROOM NO.
-    cell = ws.cell(row=bottom_header_row2, column=room_col_left, value="ROOM NO.")
-    cell.font = Font(size=11, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    
-    for sem in semesters:
-        start_col, end_col = semester_col_ranges[sem]
-        ws.merge_cells(start_row=bottom_header_row2, start_column=start_col,
-                      end_row=bottom_header_row2, end_column=end_col)
-        cell = ws.cell(row=bottom_header_row2, column=start_col, value=f"{sem} SEM")
-        cell.font = Font(size=11, bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = header_border
-    
-    cell = ws.cell(row=bottom_header_row2, column=total_col, value="Total")
-    cell.font = Font(size=11, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    
-    cell = ws.cell(row=bottom_header_row2, column=room_col_right, value="ROOM NO.")
-    cell.font = Font(size=11, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    cell.border = header_border
-    
-    # Set column widths
-    ws.column_dimensions[get_column_letter(room_col_left)].width = 12
-    ws.column_dimensions[get_column_letter(room_col_right)].width = 12
-    ws.column_dimensions[get_column_letter(total_col)].width = 10
-    
-    for sem in semesters:
-        start_col = semester_start_cols[sem]
-        for idx, branch in enumerate(all_branches_by_sem[sem]):
-            col_idx = start_col + idx
-            ws.column_dimensions[get_column_letter(col_idx)].width = 10
-    
-    # Set row heights
-    for row in range(header_row, current_row + 1):
-        ws.row_dimensions[row].height = 20
-
-
-def build_msp_base_sheet(ws, branch_range_per_room: dict):
+    import pandas as pd
+
+    # Both sides of every pair, interleaved so first-seen order is seat order
+    rolls = np.array([roll for p in roster.pairs
+                      for roll in (p.text1 if p.text1 is not None else "" if p.num1 is None else str(p.num1),
+                                   p.text2 if p.text2 is not None else "" if p.num2 is None else str(p.num2))],
+                     dtype=object)
+    columns = roster.columns()
+    branches = np.column_stack((columns.branch1, columns.branch2)).ravel().astype(np.int64)
+    ids = np.full(len(rolls), -1, dtype=np.int32)
+    present = rolls != ""
+    roll_codes, roll_names = pd.factorize(rolls[present])
+    width = len(roster.branches)
+    ids[present], keys = pd.factorize(roll_codes * width + branches[present])
+    ids = ids.reshape(-1, 2)
+    return roll_names[keys // width].tolist(), (keys % width).tolist(), ids[:, 0], ids[:, 1]
+
+def allocation_preview(allocation: Allocation) -> dict:
     """
-    Build MSP_BASE (Master Student Plan Base) sheet showing roll number ranges per room and branch.
-    
-    Args:
-        ws: openpyxl worksheet object to build the MSP_BASE sheet on
-        branch_range_per_room: Dict like {'D-104': {'IT-II': ['201-208', '210-220'], 'EE-IV': ['401-410']}, ...}
+    The seat layout of an allocation as compact per-room matrices, without rendering a workbook.
+
+    Students are listed once in `students` (roll) and `student_branches` (id into
+    `branches`); each room has rows x cols matrices `series1`/`series2` of student
+    indices (-1 for an empty seat), `branch1`/`branch2` of branch ids (0 for none)
+    and `mask`, 1 where the mode and blocked seats allow a pair.
     """
-    # Styling - use thick borders throughout
-    thick = Side(border_style="thick", color="000000")
-    border = Border(top=thick, bottom=thick, left=thick, right=thick)
-    header_border = Border(top=thick, bottom=thick, left=thick, right=thick)
-    
-    current_row = 1
-    
-    # Headers
-    headers = ["Room No.", "Branch", "Student Roll Nos."]
-    header_row = current_row
-    
-    for col_idx, header in enumerate(headers, start=1):
-        cell = ws.cell(row=header_row, column=col_idx, value=header)
-        cell.font = Font(size=11, bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = header_border
-    
-    current_row += 1
-    
-    # Data rows - preserve order of rooms (not sorted)
-    for room_no in branch_range_per_room.keys():
-        branches = branch_range_per_room[room_no]
-        if not branches:
-            continue
-        
-        # Get all branches for this room (sorted for consistent display)
-        branch_list = sorted(branches.keys())
-        num_branches = len(branch_list)
-        
-        # First branch row
-        first_branch_row = current_row
-        
-        # Room No. cell (will be merged if multiple branches)
-        room_cell = ws.cell(row=first_branch_row, column=1, value=room_no)
-        room_cell.font = Font(size=10, bold=False)
-        room_cell.alignment = Alignment(horizontal="left", vertical="center")
-        room_cell.border = border
-        
-        # Process each branch in this room
-        for branch_idx, branch in enumerate(branch_list):
-            row_num = first_branch_row + branch_idx
-            
-            # Branch
-            branch_cell = ws.cell(row=row_num, column=2, value=branch)
-            branch_cell.font = Font(size=10, bold=False)
-            branch_cell.alignment = Alignment(horizontal="left", vertical="center")
-            branch_cell.border = border
-            
-            # Format roll numbers
-            ranges = branches[branch]
-            formatted_ranges = []
-            for r in ranges:
-                if '-' in r:
-                    # Range format: "201-208" -> "(201 to 208)"
-                    start, end = r.split('-', 1)
-                    formatted_ranges.append(f"({start} to {end})")
-                else:
-                    # Single number
-                    formatted_ranges.append(r)
-            
-            roll_nos_text = ", ".join(formatted_ranges)
-            roll_cell = ws.cell(row=row_num, column=3, value=roll_nos_text)
-            roll_cell.font = Font(size=10, bold=False)
-            roll_cell.alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
-            roll_cell.border = border
-            
-            # Calculate row height based on content length (reduced from before)
-            # Excel column width of 80 ≈ 80 characters (varies by font)
-            # Estimate wrapped lines: account for text length and wrapping
-            text_length = len(roll_nos_text)
-            column_width_chars = 80  # Column width in characters
-            # Account for comma+space separators (avg 2 chars per range/number)
-            # More conservative estimate to ensure all text fits
-            chars_per_line = max(60, column_width_chars - 20)  # Account for padding
-            estimated_lines = max(1, (text_length + chars_per_line - 1) // chars_per_line)
-            # Excel row height: reduced base height per line
-            base_height_per_line = 13  # Reduced further
-            calculated_height = max(18, estimated_lines * base_height_per_line + 3)  # Reduced padding
-            # Cap at reasonable maximum but allow for very long lists
-            row_height = min(calculated_height, 250)  # Reduced max further
-            ws.row_dimensions[row_num].height = row_height
-        
-        # Update current_row after processing all branches
-        current_row = first_branch_row + num_branches
-        
-        # Merge Room No. cell if multiple branches
-        if num_branches > 1:
-            ws.merge_cells(start_row=first_branch_row, start_column=1,
-                          end_row=current_row - 1, end_column=1)
-            # Reapply border to all cells in merged area
-            for r in range(first_branch_row, current_row):
-                cell = ws.cell(row=r, column=1)
-                cell.border = border
-    
-    # Set column widths
-    ws.column_dimensions[get_column_letter(1)].width = 15  # Room No.
-    ws.column_dimensions[get_column_letter(2)].width = 20   # Branch
-    ws.column_dimensions[get_column_letter(3)].width = 80  # Student Roll Nos.
-    
-    # Set header row height
-    ws.row_dimensions[header_row].height = 20
-
-
-def build_msp_sheet(ws, branch_range_per_room: dict):
+    with metrics.span("preview"):
+        return _allocation_preview(allocation)
+
+def _allocation_preview(allocation: Allocation) -> dict:
+    roster = allocation.roster
+    rolls, student_branches, side1, side2 = _student_table(roster)
+    branch_of = np.append(np.asarray(student_branches, dtype=np.int32), 0)  # index -1 -> no branch
+    rooms = []
+    for room_no, grid in allocation.seats.items():
+        rows, cols = grid.shape
+        seated = grid >= 0
+        idx = np.where(seated, grid, 0)
+        series1 = np.where(seated, side1[idx] if len(side1) else -1, -1)
+        series2 = np.where(seated, side2[idx] if len(side2) else -1, -1)
+        mask = seat_mask(rows, cols, allocation.mode)
+        if room_no in allocation.room_masks:
+            mask = mask & np.asarray(allocation.room_masks[room_no], dtype=bool)
+        rooms.append({
+            "room": str(room_no),
+            "rows": rows,
+            "cols": cols,
+            "series1": series1.tolist(),
+            "series2": series2.tolist(),
+            "branch1": branch_of[series1].tolist(),
+            "branch2": branch_of[series2].tolist(),
+            "mask": mask.astype(np.int8).tolist(),
+        })
+    return {
+        "mode": allocation.mode,
+        "branches": list(roster.branches),
+        "students": rolls,
+        "student_branches": student_branches,
+        "unallocated": allocation.unallocated,
+        "rooms": rooms,
+    }
+
+ReplanResult = namedtuple("ReplanResult", ["allocation", "changed_rooms", "moved", "unseated"])
+
+_BLANK_SIDE = (None, "", 0)  # (num, text, branch) of an empty Series-1/2 cell
+
+def _room_allowed_seats(room_masks: dict, mode: str, room_no, rows: int, cols: int) -> np.ndarray:
+    mask = seat_mask(rows, cols, mode)
+    if room_no in room_masks:
+        mask = mask & np.asarray(room_masks[room_no], dtype=bool)
+    return mask
+
+def replan_seats(allocation: Allocation, add_pairs: list = None, remove_rolls: list = None,
+                 add_rooms: dict = None, remove_rooms: list = None) -> ReplanResult:
     """
-    Build MSP (Master Student Plan) sheet showing roll number ranges grouped by branch.
-    Structure: Branch -> Student Roll Nos. -> Room No.
-    
+    Apply a change to an existing allocation while moving as few students as possible.
+
     Args:
-        ws: openpyxl worksheet object to build the MSP sheet on
-        branch_range_per_room: Dict like {'D-104': {'IT-II': ['201-208', '210-220'], 'EE-IV': ['401-410']}, ...}
+        allocation: Result of allocate_seats (or of an earlier replan); left untouched
+        add_pairs: Pair dicts (as from upload_students) for late registrations
+        remove_rolls: Roll numbers to take out; a pair with one student left keeps its bench
+        add_rooms: {room_no: {'rows': .., 'cols': ..}} appended to the catalogue; giving an
+            existing room a new size empties it, drops its blocked seats and reseats its students
+        remove_rooms: Rooms taken offline; their students are reseated
+
+    Everybody else keeps their seat. Students that need a seat (from removed rooms first,
+    then those left unallocated before, then new pairs) fill free seats in the mode's seat
+    order, in rooms that changed anyway before untouched ones, so as few room sheets as
+    possible change.
+
+    Returns:
+        ReplanResult(allocation, changed_rooms, moved, unseated): the new Allocation, the rooms
+        whose sheet differs (in catalogue order), how many already seated pairs changed seat
+        and how many already seated pairs lost their seat without getting another
     """
-    # Transform data structure: from {room: {branch: ranges}} to {branch: {room: ranges}}
-    # Preserve branch order and room order as they appear in the original data
-    branch_to_room_ranges = defaultdict(lambda: defaultdict(list))
-    branch_order = []
-    branch_room_order = defaultdict(list)  # Track room order for each branch
-    
-    for room_no, branches in branch_range_per_room.items():
-        for branch, ranges in branches.items():
-            if branch not in branch_order:
-                branch_order.append(branch)
-            if room_no not in branch_room_order[branch]:
-                branch_room_order[branch].append(room_no)
-            branch_to_room_ranges[branch][room_no].extend(ranges)
-    
-    # Styling - use thick borders throughout
-    thick = Side(border_style="thick", color="000000")
-    border = Border(top=thick, bottom=thick, left=thick, right=thick)
-    header_border = Border(top=thick, bottom=thick, left=thick, right=thick)
-    
-    current_row = 1
-    
-    # Headers
-    headers = ["Branch", "Student Roll Nos.", "Room No."]
-    header_row = current_row
-    
-    for col_idx, header in enumerate(headers, start=1):
-        cell = ws.cell(row=header_row, column=col_idx, value=header)
-        cell.font = Font(size=11, bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.border = header_border
-    
-    current_row += 1
-    
-    # Data rows - grouped by branch (preserve order)
-    for branch in branch_order:
-        rooms = branch_to_room_ranges[branch]
-        room_list = branch_room_order[branch]  # Preserve room order as they first appeared
-        num_rooms = len(room_list)
-        
-        # First room row for this branch
-        first_branch_row = current_row
-        
-        # Branch cell (will be merged if multiple rooms)
-        branch_cell = ws.cell(row=first_branch_row, column=1, value=branch)
-        branch_cell.font = Font(size=10, bold=False)
-        branch_cell.alignment = Alignment(horizontal="center", vertical="center")
-        branch_cell.border = border
-        
-        # Process each room for this branch
-        for room_idx, room_no in enumerate(room_list):
-            row_num = first_branch_row + room_idx
-            
-            # Format roll numbers for this branch-room combination
-            ranges = rooms[room_no]
-            formatted_ranges = []
-            for r in ranges:
-                if '-' in r:
-                    # Range format: "201-208" -> "(201 to 208)"
-                    start, end = r.split('-', 1)
-                    formatted_ranges.append(f"({start} to {end})")
-                else:
-                    # Single number
-                    formatted_ranges.append(r)
-            
-            roll_nos_text = ", ".join(formatted_ranges)
-            roll_cell = ws.cell(row=row_num, column=2, value=roll_nos_text)
-            roll_cell.font = Font(size=10, bold=False)
-            roll_cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            roll_cell.border = border
-            
-            # Room No.
-            room_cell = ws.cell(row=row_num, column=3, value=room_no)
-            room_cell.font = Font(size=10, bold=False)
-            room_cell.alignment = Alignment(horizontal="center", vertical="center")
-            room_cell.border = border
-            
-            # Calculate row height based on content length
-            text_length = len(roll_nos_text)
-            column_width_chars = 100  # Column width in characters for roll nos
-            chars_per_line = max(70, column_width_chars - 30)  # Account for padding
-            estimated_lines = max(1, (text_length + chars_per_line - 1) // chars_per_line)
-            # Excel row height: reduced base height per line
-            base_height_per_line = 13
-            calculated_height = max(18, estimated_lines * base_height_per_line + 3)
-            # Cap at reasonable maximum
-            row_height = min(calculated_height, 250)
-            ws.row_dimensions[row_num].height = row_height
-        
-        # Update current_row after processing all rooms for this branch
-        current_row = first_branch_row + num_rooms
-        
-        # Merge Branch cell if multiple rooms
-        if num_rooms > 1:
-            ws.merge_cells(start_row=first_branch_row, start_column=1,
-                          end_row=current_row - 1, end_column=1)
-            # Reapply border to all cells in merged area
-            for r in range(first_branch_row, current_row):
-                cell = ws.cell(row=r, column=1)
-                cell.border = border
-    
-    # Set column widths - wider for better content visibility
-    ws.column_dimensions[get_column_letter(1)].width = 30  # Branch
-    ws.column_dimensions[get_column_letter(2)].width = 120  # Student Roll Nos. (wider for long lists)
-    ws.column_dimensions[get_column_letter(3)].width = 18  # Room No.
-    
-    # Set header row height
-    ws.row_dimensions[header_row].height = 25
-
-
-def generate_qpd(branch_counts_per_room: dict, college_name: str = "", exam_name: str = "", 
-                 date: str = "", shift_time: str = "", output_path: str = "qpd.xlsx", unallocated: int = 0):
+    add_rooms = add_rooms or {}
+    dropped_rooms = set(remove_rooms or ()) | (set(add_rooms) & set(allocation.room_capacity))
+    roster = allocation.roster.copy()
+
+    # A resized room keeps its place in the catalogue, new rooms go last
+    room_capacity = {room: add_rooms.get(room, spec) for room, spec in allocation.room_capacity.items()
+                     if room not in (remove_rooms or ())}
+    room_capacity.update(add_rooms)
+    room_masks = {room: mask for room, mask in allocation.room_masks.items() if room not in dropped_rooms}
+    seats = {room: grid.copy() for room, grid in allocation.seats.items() if room not in dropped_rooms}
+    changed = set()
+
+    # Students of removed rooms lose their seat, in their old seat order
+    displaced = [idx for room, grid in allocation.seats.items() if room in dropped_rooms
+                 for idx in grid.T.ravel().tolist() if idx >= 0]
+    waiting = allocation.waiting.tolist()
+
+    remove = set(remove_rolls or ()) - {""}
+    if remove:
+        hit, gone = set(), set()
+        for idx, pair in enumerate(roster.pairs):
+            side1, side2 = pair.roll1 in remove, pair.roll2 in remove
+            if not (side1 or side2):
+                continue
+            state = pair.__getstate__()
+            state = (_BLANK_SIDE if side1 else state[:3]) + (_BLANK_SIDE if side2 else state[3:])
+            roster.replace(idx, StudentPair(*state))
+            if not pair.roll1 or not pair.roll2 or (side1 and side2):
+                gone.add(idx)  # nobody left on the bench
+            hit.add(idx)
+        hit = np.fromiter(hit, dtype=np.int32, count=len(hit))
+        empty = np.fromiter(gone, dtype=np.int32, count=len(gone))
+        for room, grid in seats.items():
+            if np.isin(grid, hit).any():
+                changed.add(room)
+                grid[np.isin(grid, empty)] = -1
+        displaced = [idx for idx in displaced if idx not in gone]
+        waiting = [idx for idx in waiting if idx not in gone]
+
+    new_pairs = []
+    for pair in add_pairs or ():
+        roster.add(pair.get("Roll No. Series-1", pair.get("s1", "")), pair.get("Roll No. Series-2", pair.get("s2", "")))
+        new_pairs.append(len(roster) - 1)
+
+    # Fill free seats, rooms that changed anyway first, then the rest in catalogue order
+    queue = displaced + waiting + new_pairs
+    placed = 0
+    for room in sorted(room_capacity, key=lambda room: room not in changed):
+        if placed >= len(queue):
+            break
+        spec = room_capacity[room]
+        rows, cols = int(spec.get("rows", 0) or 0), int(spec.get("cols", 0) or 0)
+        grid = seats.get(room)
+        if grid is None:
+            grid = np.full((rows, cols), -1, dtype=np.int32)
+        col_idx, row_idx = np.nonzero((_room_allowed_seats(room_masks, allocation.mode, room, rows, cols) &
+                                       (grid < 0)).T)
+        count = min(len(row_idx), len(queue) - placed)
+        if count:
+            grid[row_idx[:count], col_idx[:count]] = queue[placed:placed + count]
+            seats[room] = grid
+            changed.add(room)
+            placed += count
+
+    result = Allocation(roster, allocation.mode, room_capacity, room_masks)
+    result.seats = {room: seats[room] for room in room_capacity if room in seats}
+    result.waiting = np.asarray(queue[placed:], dtype=np.int32)
+    result.unallocated = len(result.waiting) * 2
+
+    # Summaries of untouched rooms are kept, changed rooms are summarised in one pass
+    resummarise = {}
+    for room, grid in result.seats.items():
+        if room not in changed:
+            if room in allocation.branch_counts:
+                result.branch_counts[room] = allocation.branch_counts[room]
+                result.branch_ranges[room] = allocation.branch_ranges[room]
+            continue
+        seated = grid.T.ravel()
+        seated = seated[seated >= 0]
+        if len(seated):
+            resummarise[room] = seated
+    counts, ranges = _branch_summaries(roster, resummarise)
+    result.branch_counts = {room: counts.get(room, result.branch_counts.get(room)) for room in result.seats
+                            if room in counts or room in result.branch_counts}
+    result.branch_ranges = {room: ranges.get(room, result.branch_ranges.get(room)) for room in result.seats
+                            if room in ranges or room in result.branch_ranges}
+    changed_rooms = [room for room in result.seats if room in changed]
+    moved = len(set(displaced).intersection(queue[:placed]))  # displaced pairs that got a new seat
+    return ReplanResult(result, changed_rooms, moved, len(displaced) - moved)
+
+MAX_TIME_BUDGET = 30.0  # seconds, upper bound for a request's local search
+
+def _branch_grids(allocation: Allocation, room_no):
+    """(Series-1, Series-2) branch id grids of a room, 0 for empty seats and students without a branch."""
+    grid = allocation.seats[room_no]
+    columns = allocation.roster.columns()
+    seated = grid >= 0
+    b1 = np.zeros(grid.shape, dtype=np.int32)
+    b2 = np.zeros(grid.shape, dtype=np.int32)
+    b1[seated] = np.where(columns.counted1[grid[seated]], columns.branch1[grid[seated]], 0)
+    b2[seated] = np.where(columns.counted2[grid[seated]], columns.branch2[grid[seated]], 0)
+    return b1, b2
+
+def adjacency_stats(allocation: Allocation) -> dict:
     """
-    Generate a formatted QPD (Question Paper Distribution) Excel file.
-    
-    Args:
-        branch_counts_per_room: Dict like {'D-104': {'IT-II': 32, 'MBA-IV': 32}, ...}
-        college_name: Name of the college
-        exam_name: Name of the exam
-        date: Date string (e.g., "04-07-2023")
-        shift_time: Shift time (e.g., "10:00-12:00")
-        output_path: Path to save the Excel file
-        unallocated: Number of unallocated students
+    Count same-branch neighbours over every room grid.
+
+    horizontal: Series-2 student next to the Series-1 student of the next bench in the row
+    vertical: student directly in front of a student of the same series
+    same_bench: both students of one bench (fixed by the uploaded pairs)
+    total: horizontal + vertical + same_bench
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "QPD"
-    
-    build_qpd_sheet(ws, branch_counts_per_room, college_name, exam_name, date, shift_time, unallocated)
-    
-    wb.save(output_path)
-
-
-def fill_room_row_gap(pairs: list, room_capacity: dict):
-    room_layout = defaultdict(list)
-    branch_counts_per_room = defaultdict(lambda: defaultdict(int))  # {room_no: {branch: count}}
-    pair_idx = 0
-    branch_range_per_room = defaultdict(lambda: defaultdict(list))  # {room_no: {branch: [roll_numbers]}}
+    horizontal = vertical = same_bench = 0
+    for room_no in allocation.seats:
+        b1, b2 = _branch_grids(allocation, room_no)
+        horizontal += int(np.count_nonzero((b2[:, :-1] == b1[:, 1:]) & (b1[:, 1:] > 0)))
+        vertical += int(np.count_nonzero((b1[:-1] == b1[1:]) & (b1[1:] > 0)))
+        vertical += int(np.count_nonzero((b2[:-1] == b2[1:]) & (b2[1:] > 0)))
+        same_bench += int(np.count_nonzero((b1 == b2) & (b1 > 0)))
+    return {"horizontal": horizontal, "vertical": vertical, "same_bench": same_bench,
+            "total": horizontal + vertical + same_bench}
+
+def _seat_conflicts(b1, b2, r: int, c: int, s1: int, s2: int) -> int:
+    """Same-branch neighbours a bench with branches (s1, s2) would have at (r, c) of the list grids b1/b2."""
+    conflicts = 0
+    if s1:
+        conflicts += (c > 0 and b2[r][c - 1] == s1) + (r > 0 and b1[r - 1][c] == s1) + (r + 1 < len(b1) and b1[r + 1][c] == s1)
+    if s2:
+        conflicts += (c + 1 < len(b1[r]) and b1[r][c + 1] == s2) + (r > 0 and b2[r - 1][c] == s2) + (r + 1 < len(b2) and b2[r + 1][c] == s2)
+    return conflicts
+
+def allocate_seats_spread(pairs, room_capacity: dict, mode: str = "normal", room_masks: dict = None,
+                          time_budget: float = 1.0, seed: int = 0) -> Allocation:
+    """
+    Like allocate_seats, but arranges the seated pairs so few students sit next to
+    (or in front of) a student of the same branch.
 
-    for room_no, spec in room_capacity.items():
+    The same seats are used and the same pairs get a seat as with allocate_seats; pairs
+    stay intact (Series-1 stays Series-1) but may move to any used seat in any room.
+
+      1. Greedy: seats are filled in seat order; each takes the (branch1, branch2) kind of
+         pair with the fewest clashes against the benches already placed to its left and in
+         front, preferring the kind with the most pairs left. Within a kind, input order is kept.
+      2. Local search: random swaps of a clashing bench with another bench, kept when the
+         clashes do not increase, until time_budget seconds (capped at MAX_TIME_BUDGET) or
+         50 tries per seat have been spent.
+
+    allocation.stats holds adjacency_stats for input order, after the greedy pass and at
+    the end, plus the swaps made, tries and seconds spent.
+    """
+    started = time.perf_counter()
+    deadline = started + min(max(time_budget, 0.0), MAX_TIME_BUDGET)
+    base = allocate_seats(pairs, room_capacity, mode, room_masks)
+    roster = base.roster
+    columns = roster.columns()
+    stats = {"input_order": adjacency_stats(base)}
+
+    # Seats in seat order and the pairs that will fill them
+    rooms = list(base.seats)
+    seat_list = []
+    for k, room_no in enumerate(rooms):
+        grid = base.seats[room_no]
+        col_idx, row_idx = np.nonzero((grid >= 0).T)
+        seat_list.extend(zip([k] * len(row_idx), row_idx.tolist(), col_idx.tolist()))
+    seated = np.concatenate([grid.T.ravel() for grid in base.seats.values()]) if rooms else np.empty(0, np.int32)
+    seated = np.sort(seated[seated >= 0])
+
+    b1_all = np.where(columns.counted1, columns.branch1, 0)
+    b2_all = np.where(columns.counted2, columns.branch2, 0)
+    kinds, kind_of = np.unique(np.column_stack((b1_all[seated], b2_all[seated])), axis=0, return_inverse=True)
+    kind_of = kind_of.ravel()
+    queues = [seated[kind_of == k].tolist()[::-1] for k in range(len(kinds))]  # popped from the end
+    remaining = np.array([len(q) for q in queues], dtype=np.int64)
+    kind_b1, kind_b2 = kinds[:, 0], kinds[:, 1]
+    big = len(seated) + 1
+
+    # 1. Greedy construction, room grids kept as lists for cheap scalar access
+    grids = [[[-1] * base.seats[room_no].shape[1] for _ in range(base.seats[room_no].shape[0])] for room_no in rooms]
+    g1 = [[[0] * len(row) for row in grid] for grid in grids]
+    g2 = [[[0] * len(row) for row in grid] for grid in grids]
+    for k, r, c in seat_list:
+        left = g2[k][r][c - 1] if c > 0 else 0
+        front1 = g1[k][r - 1][c] if r > 0 else 0
+        front2 = g2[k][r - 1][c] if r > 0 else 0
+        clashes = (kind_b1 == left).astype(np.int64) * (left > 0)
+        clashes += (kind_b1 == front1) * (front1 > 0) + (kind_b2 == front2) * (front2 > 0)
+        key = np.where(remaining > 0, clashes * big - remaining, np.iinfo(np.int64).max)
+        kind = int(np.argmin(key))
+        remaining[kind] -= 1
+        grids[k][r][c] = queues[kind].pop()
+        g1[k][r][c], g2[k][r][c] = int(kind_b1[kind]), int(kind_b2[kind])
+
+    def snapshot():
+        result = Allocation(roster, base.mode, base.room_capacity, base.room_masks)
+        result.seats = {room_no: np.array(grids[k], dtype=np.int32).reshape(base.seats[room_no].shape)
+                        for k, room_no in enumerate(rooms)}
+        result.waiting = base.waiting
+        result.unallocated = base.unallocated
+        return result
+
+    stats["greedy"] = adjacency_stats(snapshot())
+
+    # 2. Bounded local search over swaps of a clashing bench with any other bench
+    rng = random.Random(seed)
+    swaps = tries = 0
+    max_tries = 50 * len(seat_list)
+
+    def find_clashing():
+        return [(k, r, c) for k, r, c in seat_list if _seat_conflicts(g1[k], g2[k], r, c, g1[k][r][c], g2[k][r][c])]
+
+    clashing = find_clashing()
+    while tries < max_tries:
+        if not clashing:
+            # The list is only maintained for the swapped seats; look again before giving up
+            clashing = find_clashing()
+            if not clashing:
+                break
+        if tries % 256 == 0 and time.perf_counter() >= deadline:
+            break
+        tries += 1
+        ka, ra, ca = a = clashing[rng.randrange(len(clashing))]
+        kb, rb, cb = rng.choice(seat_list)
+        if ka == kb and abs(ra - rb) + abs(ca - cb) <= 1:
+            continue  # neighbours (or the same seat): their clashes are not independent
+        a1, a2, b1, b2 = g1[ka][ra][ca], g2[ka][ra][ca], g1[kb][rb][cb], g2[kb][rb][cb]
+        if (a1, a2) == (b1, b2):
+            continue
+        before = _seat_conflicts(g1[ka], g2[ka], ra, ca, a1, a2) + _seat_conflicts(g1[kb], g2[kb], rb, cb, b1, b2)
+        if not before:
+            clashing.remove(a)
+            continue
+        after = _seat_conflicts(g1[ka], g2[ka], ra, ca, b1, b2) + _seat_conflicts(g1[kb], g2[kb], rb, cb, a1, a2)
+        if after <= before:
+            g1[ka][ra][ca], g2[ka][ra][ca], g1[kb][rb][cb], g2[kb][rb][cb] = b1, b2, a1, a2
+            grids[ka][ra][ca], grids[kb][rb][cb] = grids[kb][rb][cb], grids[ka][ra][ca]
+            swaps += 1
+            if not _seat_conflicts(g1[ka], g2[ka], ra, ca, b1, b2):
+                clashing.remove(a)
+            if _seat_conflicts(g1[kb], g2[kb], rb, cb, a1, a2):
+                clashing.append((kb, rb, cb))
+
+    allocation = snapshot()
+    orders = {room_no: grid.T.ravel() for room_no, grid in allocation.seats.items()}
+    allocation.branch_counts, allocation.branch_ranges = _branch_summaries(
+        roster, {room_no: order[order >= 0] for room_no, order in orders.items()})
+    stats["final"] = adjacency_stats(allocation)
+    stats.update(swaps=swaps, tries=tries, seconds=round(time.perf_counter() - started, 3))
+    allocation.stats = stats
+    return allocation
+
+ROOM_OBJECTIVES = ("rooms", "invigilators", "cost")
+STUDENTS_PER_INVIGILATOR = 30
+
+def _room_building(room_no) -> str:
+    """Building part of a room number: 'D' for 'D-104' or 'D 104', the whole name without a separator."""
+    return re.split(r"[-\s/]", str(room_no).strip(), maxsplit=1)[0]
+
+def _usable_seats(room_capacity: dict, mode: str, room_masks: dict = None) -> np.ndarray:
+    """Benches each room offers under a seating mode and its blocked seats, in catalogue order."""
+    usable = np.zeros(len(room_capacity), dtype=np.int64)
+    for i, (room_no, spec) in enumerate(room_capacity.items()):
         rows = int(spec.get("rows", 0) or 0)
         cols = int(spec.get("cols", 0) or 0)
-        grid = [[None for _ in range(cols)] for _ in range(rows)]
-
-        for c in range(cols):
-            for r in range(rows):
-                if r % 2 != 0:  # skip odd rows to keep alternate rows empty
-                    continue
-                if pair_idx >= len(pairs):
-                    break
-                grid[r][c] = pairs[pair_idx]
-                
-                # Count branches for this pair
-                pair = pairs[pair_idx]
-                s1_raw = pair.get("Roll No. Series-1", pair.get("s1", ""))
-                s2_raw = pair.get("Roll No. Series-2", pair.get("s2", ""))
-                
-                roll1, branch1 = _split_roll_and_branch(s1_raw)
-                roll2, branch2 = _split_roll_and_branch(s2_raw)
-                
-                # Track roll numbers for range calculation
-                if branch1 and roll1:
-                    branch_range_per_room[room_no][branch1].append(roll1)
-                    branch_counts_per_room[room_no][branch1] += 1
-                if branch2 and roll2:
-                    branch_range_per_room[room_no][branch2].append(roll2)
-                    branch_counts_per_room[room_no][branch2] += 1
-                
-                pair_idx += 1
-            if pair_idx >= len(pairs):
-                break
+        if room_masks and room_no in room_masks:
+            usable[i] = int((seat_mask(rows, cols, mode) & np.asarray(room_masks[room_no], dtype=bool)).sum())
+        else:
+            usable[i] = len(_seat_order(rows, cols, mode)[0])
+    return usable
+
+def _take_better(best: np.ndarray, benches: np.ndarray, candidate: np.ndarray,
+                 candidate_benches: np.ndarray) -> np.ndarray:
+    """Copy candidate sets that are cheaper, or as cheap with fewer benches, into best; returns where."""
+    # Costs are sums of floats, so equal costs may differ in the last bits
+    tie = np.isfinite(best) & np.isclose(candidate, best, rtol=1e-9, atol=1e-12)
+    better = np.where(tie, candidate_benches < benches, candidate < best)
+    np.copyto(best, candidate, where=better)
+    np.copyto(benches, candidate_benches, where=better)
+    return better
+
+def _cover_rooms(usable: np.ndarray, costs: np.ndarray, need: int, buildings: np.ndarray = None,
+                 building_cost: float = 0.0) -> tuple:
+    """
+    Cheapest set of rooms whose usable benches add up to at least need.
+
+    A 0/1 covering knapsack solved by dynamic programming over bench counts (capped at
+    need). Rooms with the same building, size and cost are pooled and split into 1, 2, 4,
+    ... room bundles, so a catalogue of hundreds of identical rooms costs a handful of
+    passes. With buildings, each building used adds building_cost: its rooms are tried on
+    a copy of the table that has paid the building once, which is merged back afterwards,
+    so the building costs are part of the same single pass. Among sets of equal cost, the
+    one with the fewest benches (fewest spare) wins; the two are compared in that order,
+    so no bench count can outweigh a cost difference.
+
+    Returns:
+        (total cost, bool array of chosen rooms), or (inf, None) if the rooms cannot cover need
+    """
+    if buildings is None:
+        buildings = np.zeros(len(usable), dtype=np.int8)  # one building, and it is free
+    groups = defaultdict(list)
+    for i in np.flatnonzero(usable > 0).tolist():
+        groups[buildings[i], usable[i], costs[i]].append(i)
+
+    building_bundles = defaultdict(list)  # {building: [(group rooms, how many of them, benches, cost)]}
+    for (building, size, cost), rooms in groups.items():
+        left, take = len(rooms), 1
+        while left:
+            take = min(take, left)
+            building_bundles[building].append((rooms, take, int(size) * take, float(cost) * take))
+            left -= take
+            take *= 2
+
+    # best[c]: cheapest cost reaching at least c benches, benches[c]: benches of that set.
+    # Per building, chose[j] marks where bundle j improved the opened table and merged where
+    # that table improved best.
+    best = np.full(need + 1, np.inf)
+    best[0] = 0.0
+    benches = np.zeros(need + 1, dtype=np.int64)
+    candidate = np.empty_like(best)
+    candidate_benches = np.empty_like(benches)
+    steps = []
+    for bundles in building_bundles.values():
+        opened, opened_benches = best + building_cost, benches.copy()
+        chose = []
+        for _, _, size, cost in bundles:
+            reach = min(size, need)
+            candidate[reach:] = opened[:need + 1 - reach]
+            candidate[:reach] = opened[0]
+            candidate += cost
+            candidate_benches[reach:] = opened_benches[:need + 1 - reach]
+            candidate_benches[:reach] = opened_benches[0]
+            candidate_benches += size
+            chose.append(np.packbits(_take_better(opened, opened_benches, candidate, candidate_benches)))
+        merged = np.packbits(_take_better(best, benches, opened, opened_benches))
+        steps.append((bundles, chose, merged))
+    if not np.isfinite(best[need]):
+        return float("inf"), None
+
+    def marked(bits, c):
+        return (bits[c >> 3] >> (7 - (c & 7))) & 1
+
+    taken = defaultdict(int)
+    c = need
+    for bundles, chose, merged in reversed(steps):
+        if c == 0 or not marked(merged, c):
+            continue
+        for j in range(len(bundles) - 1, -1, -1):
+            if c > 0 and marked(chose[j], c):
+                rooms, count, size, _ = bundles[j]
+                taken[id(rooms)] += count
+                c = max(c - size, 0)
+    chosen = np.zeros(len(usable), dtype=bool)
+    for rooms in groups.values():
+        chosen[rooms[:taken[id(rooms)]]] = True  # the earliest rooms of a group in catalogue order
+    return float(best[need]), chosen
+
+def select_rooms(room_capacity: dict, total_pairs: int, mode: str = "normal", room_masks: dict = None,
+                 objective: str = "rooms", room_costs: dict = None, building_cost: float = 0.0,
+                 students_per_invigilator: int = STUDENTS_PER_INVIGILATOR) -> dict:
+    """
+    Choose which rooms to seat total_pairs pairs in and put them first in the catalogue.
 
-        cleaned_rows = []
-        for r in range(rows):
-            row_seats = [seat for seat in grid[r] if seat is not None]
-            # Include all rows (filled or empty) to show skipped alternate rows
-            if row_seats:
-                cleaned_rows.append(row_seats)
-            else:
-                # Insert empty row to indicate this row was skipped
-                cleaned_rows.append([])
+    Args:
+        room_capacity: {room_no: {'rows': 8, 'cols': 4, ...}} as from find_capacity_per_room
+        mode, room_masks: Seating mask the plan will use, as for allocate_seats
+        objective: 'rooms' to use the fewest rooms, 'invigilators' for the fewest invigilators
+            (one per students_per_invigilator students a room can hold), or 'cost' for the
+            lowest sum of room_costs ({room_no: cost}, 1 for rooms not listed)
+        building_cost: Extra cost per building used (see _room_building), to keep an
+            exam in few buildings
+
+    Ties are broken towards fewer spare benches. The chosen rooms come first, in catalogue
+    order, followed by the others, so allocate_seats fills only the chosen rooms and
+    replan_seats can still overflow into the rest. If even every room is too small the
+    catalogue is returned unchanged.
+    """
+    if objective not in ROOM_OBJECTIVES:
+        raise ValueError(f"Unknown room objective: {objective!r}")
+    rooms = list(room_capacity)
+    usable = _usable_seats(room_capacity, mode, room_masks)
+    need = int(total_pairs)
+    if need <= 0 or usable.sum() <= need:
+        return dict(room_capacity)
+
+    if objective == "rooms":
+        costs = np.ones(len(rooms))
+    elif objective == "invigilators":
+        costs = np.maximum(np.ceil(usable * 2 / max(int(students_per_invigilator), 1)), 1)
+    else:
+        room_costs = room_costs or {}
+        costs = np.array([float(room_costs.get(room_no, 1.0)) for room_no in rooms])
+        if (costs < 0).any():
+            raise ValueError("Room costs must not be negative")
+    if building_cost < 0:
+        raise ValueError("Building cost must not be negative")
+    buildings = np.array([_room_building(room_no) for room_no in rooms]) if building_cost else None
+    _, chosen = _cover_rooms(usable, costs, need, buildings, building_cost)
 
-        room_layout[room_no] = cleaned_rows
+    order = [i for i in range(len(rooms)) if chosen[i]] + [i for i in range(len(rooms)) if not chosen[i]]
+    return {rooms[i]: room_capacity[rooms[i]] for i in order}
 
-        if pair_idx >= len(pairs):
-            break
-    
-    # Convert roll number lists to consecutive ranges
-    branch_range_per_room_final = {}
-    for room_no, branch_rolls in branch_range_per_room.items():
-        branch_range_per_room_final[room_no] = {}
-        for branch, roll_numbers in branch_rolls.items():
-            ranges = _find_consecutive_ranges(roll_numbers)
-            if ranges:  # Only add if there are ranges
-                branch_range_per_room_final[room_no][branch] = ranges
-    
-    # Store in the original variable name for access
-    branch_range_per_room = branch_range_per_room_final
-
-    unallocated = (len(pairs) - pair_idx) * 2
-    # Convert defaultdict to regular dict for return
-    branch_counts_dict = {room: dict(branches) for room, branches in branch_counts_per_room.items()}
-    
-    return room_layout, unallocated, branch_counts_dict, branch_range_per_room
-
-def fill_room_col_gap(pairs: list, room_capacity: dict):
-    room_layout = defaultdict(list)
-    branch_counts_per_room = defaultdict(lambda: defaultdict(int))  # {room_no: {branch: count}}
-    pair_idx = 0
-    branch_range_per_room = defaultdict(lambda: defaultdict(list))  # {room_no: {branch: [roll_numbers]}}
+def fill_room(pairs, room_capacity: dict):
+    return allocate_seats(pairs, room_capacity, "normal").as_tuple()     # ({'D-104': [[pair1, pair2, ...], [pairN, ...]]}, unallocated, {'D-104': {'branch1': count}}, {'D-104': {'branch1': ['201-208']}})
 
-    for room_no, spec in room_capacity.items():
-        rows = int(spec.get("rows", 0) or 0)
-        cols = int(spec.get("cols", 0) or 0)
-        grid = [[None for _ in range(cols)] for _ in range(rows)]
+def fill_room_row_gap(pairs, room_capacity: dict):
+    return allocate_seats(pairs, room_capacity, "row_gap").as_tuple()
+
+def fill_room_col_gap(pairs, room_capacity: dict):
+    return allocate_seats(pairs, room_capacity, "col_gap").as_tuple()
+
+class BranchRoomIndex:
+    """
+    Branch x room aggregate that the QPD, MSP_BASE and MSP sheets are built from.
+
+    Built once per plan in time linear in the (room, branch) entries, so no builder
+    rescans nested dicts or searches lists.
+
+    Attributes:
+        rooms: Room numbers in plan order
+        branches: Branch names in order of first appearance
+        counts: len(branches) x len(rooms) int64 array of students
+        counted: Per branch, whether it appears in the per-room counts at all
+        ranges: {(branch_idx, room_idx): [RollRange, ...]}
+        room_branches: Per room, the indices of branches with ranges, in the room's own order
+        branch_rooms: Per branch, the indices of rooms where it has ranges, in room order
+        range_branches: Indices of branches with ranges, in order of first appearance
+    """
 
-        for c in range(cols):
-            if c % 2 != 0:  # skip odd columns to leave a gap between columns
+    def __init__(self, branch_counts_per_room: dict = None, branch_range_per_room: dict = None):
+        room_ids = {}
+        branch_ids = {}
+
+        def index_of(ids, key):
+            idx = ids.get(key)
+            if idx is None:
+                idx = ids[key] = len(ids)
+            return idx
+
+        entries = []
+        for room_no, branch_counts in (branch_counts_per_room or {}).items():
+            r = index_of(room_ids, room_no)
+            entries.extend((index_of(branch_ids, branch), r, count) for branch, count in branch_counts.items())
+
+        self.ranges = {}
+        self.room_branches = []
+        range_branch_ids = {}
+        for room_no, branches in (branch_range_per_room or {}).items():
+            r = index_of(room_ids, room_no)
+            self.room_branches.extend([] for _ in range(len(room_ids) - len(self.room_branches)))
+            for branch, ranges in branches.items():
+                b = index_of(branch_ids, branch)
+                index_of(range_branch_ids, b)
+                if (b, r) not in self.ranges:
+                    self.room_branches[r].append(b)
+                    self.ranges[b, r] = []
+                self.ranges[b, r].extend(ranges)
+
+        self.rooms = list(room_ids)
+        self.branches = list(branch_ids)
+        self.room_branches.extend([] for _ in range(len(self.rooms) - len(self.room_branches)))
+        self.range_branches = list(range_branch_ids)
+        self.branch_rooms = [[] for _ in self.branches]
+        for b, r in sorted(self.ranges, key=lambda key: key[1]):
+            self.branch_rooms[b].append(r)
+
+        self.counts = np.zeros((len(self.branches), len(self.rooms)), dtype=np.int64)
+        self.counted = np.zeros(len(self.branches), dtype=bool)
+        if entries:
+            b, r, count = np.array(entries, dtype=np.int64).T
+            np.add.at(self.counts, (b, r), count)
+            self.counted[b] = True
+
+
+class _ChunkPipe:
+    """
+    Write-only, unseekable file object whose bytes are handed to a reader thread in chunks.
+
+    At most max_chunks full chunks wait in the queue, so a fast writer blocks
+    until the reader catches up instead of buffering the whole output.
+    """
+
+    def __init__(self, chunk_size: int, max_chunks: int):
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(max_chunks)
+        self.cancelled = threading.Event()
+        self._pending = bytearray()
+        self._written = 0
+        self._broken = False
+
+    def write(self, data) -> int:
+        if self._broken:
+            return len(data)  # the writer's ZipFile may still flush from __del__; drop it quietly
+        self._pending += data
+        self._written += len(data)
+        while len(self._pending) >= self.chunk_size:
+            self._put(bytes(self._pending[:self.chunk_size]))
+            del self._pending[:self.chunk_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written  # ZipFile records member offsets from this
+
+    def flush(self):
+        pass
+
+    def finish(self, error: BaseException = None):
+        """Queue what is left, then the end marker (or the writer's error)."""
+        if error is None and self._pending:
+            self._put(bytes(self._pending))
+        self._pending.clear()
+        self._put(error)
+
+    def _put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
                 continue
-            for r in range(rows):
-                if pair_idx >= len(pairs):
-                    break
-                grid[r][c] = pairs[pair_idx]
-                
-                # Count branches for this pair
-                pair = pairs[pair_idx]
-                s1_raw = pair.get("Roll No. Series-1", pair.get("s1", ""))
-                s2_raw = pair.get("Roll No. Series-2", pair.get("s2", ""))
-                
-                roll1, branch1 = _split_roll_and_branch(s1_raw)
-                roll2, branch2 = _split_roll_and_branch(s2_raw)
-                
-                # Track roll numbers for range calculation
-                if branch1 and roll1:
-                    branch_range_per_room[room_no][branch1].append(roll1)
-                    branch_counts_per_room[room_no][branch1] += 1
-                if branch2 and roll2:
-                    branch_range_per_room[room_no][branch2].append(roll2)
-                    branch_counts_per_room[room_no][branch2] += 1
-                
-                pair_idx += 1
-            if pair_idx >= len(pairs):
-                break
+        self._broken = True
+        raise BrokenPipeError("reader went away")
 
-        cleaned_rows = []
-        for r in range(rows):
-            # Include all columns (filled or empty) to show skipped alternate columns
-            row_seats = grid[r]  # Keep all columns, including None for skipped columns
-            # Only include rows that have at least one filled seat
-            if any(seat is not None for seat in row_seats):
-                cleaned_rows.append(row_seats)
 
-        room_layout[room_no] = cleaned_rows
+def iter_written_bytes(write, chunk_size: int = 64 * 1024, max_chunks: int = 16):
+    """
+    Run write(fileobj) in a thread and yield what it writes, chunk by chunk, as it is written.
 
-        if pair_idx >= len(pairs):
-            break
-    
-    # Convert roll number lists to consecutive ranges
-    branch_range_per_room_final = {}
-    for room_no, branch_rolls in branch_range_per_room.items():
-        branch_range_per_room_final[room_no] = {}
-        for branch, roll_numbers in branch_rolls.items():
-            ranges = _find_consecutive_ranges(roll_numbers)
-            if ranges:  # Only add if there are ranges
-                branch_range_per_room_final[room_no][branch] = ranges
-    
-    # Store in the original variable name for access
-    branch_range_per_room = branch_range_per_room_final
-
-    unallocated = (len(pairs) - pair_idx) * 2
-    # Convert defaultdict to regular dict for return
-    branch_counts_dict = {room: dict(branches) for room, branches in branch_counts_per_room.items()}
-    
-    return room_layout, unallocated, branch_counts_dict, branch_range_per_room
-
-
-def build_room_sheet(ws, room_name: str, rows: list, college_name: str = "", exam_name: str = "", branch_counts: dict = None):
-    if not rows:
-        return
-
-    max_seats = max(len(row) for row in rows)
-    total_columns = max(1, max_seats * 2)  # s1 and s2 occupy separate columns
-    arrow_banner = "^" * (max(5, total_columns * 2))
-    
-    # Use provided branch_counts or empty dict if not provided
-    if branch_counts is None:
-        branch_counts = {}
-
-    # Calculate required width for college name (font size 20, bold)
-    # Excel column width: 1 unit ≈ 1 character at default font size
-    # For font size 20, we need approximately: len(text) * (20/11) * 1.2 (for bold)
-    base_column_width = 18  # Default width for seating columns
-    column_width = base_column_width  # Will be adjusted if needed
-    
-    if college_name:
-        college_name_clean = _clean_value(college_name) or ""
-        if college_name_clean:
-            # Estimate width needed: account for larger font (20pt vs 11pt default) and bold
-            # Font size 20 is ~1.8x larger than default 11pt, plus 1.3 factor for bold and spacing
-            required_width = len(college_name_clean) * (20 / 11) * 1.3
-            current_total_width = total_columns * base_column_width
-            
-            # If college name needs more width, adjust column widths
-            if required_width > current_total_width:
-                # Calculate new column width to accommodate college name
-                column_width = max(base_column_width, required_width / total_columns)
-    
-    # Set all columns to the calculated width (before displaying college name)
-    for col in range(1, total_columns + 1):
-        ws.column_dimensions[get_column_letter(col)].width = column_width
-
-    def merge_and_set(row_idx, value, font_size=14, bold=True):
-        ws.merge_cells(start_row=row_idx, start_column=1, end_row=row_idx, end_column=total_columns)
-        cell = ws.cell(row=row_idx, column=1, value=_clean_value(value))
-        cell.font = Font(size=font_size, bold=bold)
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-
-    current_row = 1
-    
-    # Display college name in big font (no blank line after)
-    if college_name:
-        merge_and_set(current_row, college_name, font_size=20, bold=True)
-        current_row += 1
-    
-    # Display exam name in big font (no blank line after)
-    if exam_name:
-        merge_and_set(current_row, exam_name, font_size=20, bold=True)
-        current_row += 1
-    
-    # Display 'Seating Plan' heading (no blank line after)
-    merge_and_set(current_row, "Seating Plan", font_size=18)
-    current_row += 1
-    
-    # Display room name (no blank line after)
-    merge_and_set(current_row, room_name, font_size=16)
-    current_row += 1
-
-    thin = Side(border_style="thin", color="000000")
-    border = Border(top=thin, bottom=thin, left=thin, right=thin)
-    # data_start_row starts right after the room name (blackboard will be first row of table)
-    data_start_row = current_row + 1
-    
-    # Add blackboard heading as first row of the table
-    blackboard_row = data_start_row
-    ws.row_dimensions[blackboard_row].height = 36
-    ws.merge_cells(start_row=blackboard_row, start_column=1, end_row=blackboard_row, end_column=total_columns)
-    blackboard_cell = ws.cell(row=blackboard_row, column=1, value=f"{arrow_banner}  Black Board  {arrow_banner}")
-    blackboard_cell.font = Font(size=11, bold=False)
-    blackboard_cell.alignment = Alignment(horizontal="center", vertical="center")
-    # Apply border to the merged cell (apply to all cells in merged range for proper display)
-    for col in range(1, total_columns + 1):
-        ws.cell(row=blackboard_row, column=col).border = border
-    
-    # Adjust data_start_row to start after blackboard row
-    data_start_row = blackboard_row + 1
-
-    for row_offset, row in enumerate(rows):
-        excel_row = data_start_row + row_offset
-        ws.row_dimensions[excel_row].height = 36
-
-        for seat_idx in range(1, max_seats + 1):
-            s1_col = (seat_idx - 1) * 2 + 1
-            s2_col = s1_col + 1
-
-            for col in (s1_col, s2_col):
-                cell = ws.cell(row=excel_row, column=col)
-                # Don't overwrite column width - use the width already set for college name
-                # ws.column_dimensions[get_column_letter(col)].width is already set above
-                cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-                cell.border = border
-
-            if seat_idx <= len(row):
-                student = row[seat_idx - 1] or {}
-                s1_raw = student.get("Roll No. Series-1", student.get("s1", ""))
-                s2_raw = student.get("Roll No. Series-2", student.get("s2", ""))
-                
-                # Clean NaN values before processing
-                s1_raw = _clean_value(s1_raw) if s1_raw else ""
-                s2_raw = _clean_value(s2_raw) if s2_raw else ""
-
-                roll1, branch1 = _split_roll_and_branch(s1_raw)
-                roll2, branch2 = _split_roll_and_branch(s2_raw)
-
-                s1_value = "\n".join(filter(None, [roll1, branch1]))
-                s2_value = "\n".join(filter(None, [roll2, branch2]))
-                ws.cell(row=excel_row, column=s1_col).value = s1_value if s1_value else ""
-                ws.cell(row=excel_row, column=s2_col).value = s2_value if s2_value else ""
-
-    if branch_counts:
-        summary_start = data_start_row + len(rows) + 2
-        # Use columns after the seating table to avoid conflicts
-        # Place summary in a dedicated area (columns 1-2, but ensure proper width)
-        summary_col1 = 1
-        summary_col2 = 2
-        
-        # Header row
-        header_row = summary_start
-        name_header = ws.cell(header_row, summary_col1, "Branch Name")
-        name_header.font = Font(bold=True, size=12)
-        name_header.alignment = Alignment(horizontal="left", vertical="center")
-        
-        count_header = ws.cell(header_row, summary_col2, "No. of Students")
-        count_header.font = Font(bold=True, size=12)
-        count_header.alignment = Alignment(horizontal="left", vertical="center")
-        
-        # Ensure column widths are adequate for summary (only if not already set wider)
-        if summary_col1 <= total_columns:
-            current_width = ws.column_dimensions[get_column_letter(summary_col1)].width or 18
-            ws.column_dimensions[get_column_letter(summary_col1)].width = max(current_width, 20)
-        else:
-            ws.column_dimensions[get_column_letter(summary_col1)].width = 20
-            
-        if summary_col2 <= total_columns:
-            current_width = ws.column_dimensions[get_column_letter(summary_col2)].width or 18
-            ws.column_dimensions[get_column_letter(summary_col2)].width = max(current_width, 18)
-        else:
-            ws.column_dimensions[get_column_letter(summary_col2)].width = 18
-        
-        # Data rows - each branch gets its own row
-        for idx, (branch, count) in enumerate(branch_counts.items(), start=1):
-            data_row = summary_start + idx
-            name_cell = ws.cell(data_row, summary_col1, _clean_value(branch))
-            name_cell.alignment = Alignment(horizontal="left", vertical="center")
-            name_cell.font = Font(size=11)
-            
-            count_cell = ws.cell(data_row, summary_col2, _clean_value(count))
-            count_cell.alignment = Alignment(horizontal="center", vertical="center")
-            count_cell.font = Font(size=11)
-
-
-def build_workbook(room_layout: dict, output_path: str = "C:/Users/Ankita/OneDrive/Desktop/sample.xlsx", college_name: str = "", exam_name: str = "", 
-                  branch_counts_per_room: dict = None, unallocated: int = 0, date: str = "", shift_time: str = "",
-                  branch_range_per_room: dict = None):
+    Memory stays bounded by max_chunks * chunk_size however large the output
+    is, and the first chunk is ready as soon as the writer produces it. If the
+    consumer stops early (client disconnected), the writer is cancelled.
     """
-    Build or update an Excel workbook with QPD/MSP and room-wise layouts.
+    pipe = _ChunkPipe(chunk_size, max_chunks)
+
+    def run():
+        try:
+            write(pipe)
+        except BaseException as exc:
+            if not pipe.cancelled.is_set():
+                pipe.finish(exc)
+        else:
+            pipe.finish()
+
+    writer = threading.Thread(target=run, name="stream-writer", daemon=True)
+    writer.start()
+    try:
+        while True:
+            chunk = pipe.chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+    finally:
+        pipe.cancelled.set()
+        writer.join()
+
 
-    - If `output_path` already exists, it is loaded and **kept intact**.
-      New sheets are inserted **after the 'main' sheet** in that workbook.
-    - If `output_path` does not exist, a new workbook is created.
+def iter_workbook_bytes(wb, chunk_size: int = 64 * 1024):
     """
-    # Load existing workbook if it exists, otherwise create a new one
-    if os.path.exists(output_path):
-        wb = load_workbook(output_path)
-    else:
-        wb = Workbook()
-        # Remove default sheet in a brand-new workbook
-        if wb.worksheets:
-            wb.remove(wb.active)
-
-    # Determine insertion index: right after 'main' if present, else at the end
-    sheet_names = wb.sheetnames
-    if "main" in sheet_names:
-        insert_index = sheet_names.index("main") + 1
-    else:
-        insert_index = len(wb.worksheets)
-
-    # Helper to create/replace a sheet at the current insert_index
-    def create_or_replace_sheet(title: str):
-        nonlocal insert_index
-        if title in wb.sheetnames:
-            wb.remove(wb[title])
-        ws_local = wb.create_sheet(title=title, index=insert_index)
-        insert_index += 1
-        return ws_local
-
-    # Create QPD sheet first if branch_counts_per_room is provided
-    if branch_counts_per_room:
-        qpd_ws = create_or_replace_sheet("QPD")
-        build_qpd_sheet(qpd_ws, branch_counts_per_room, college_name, exam_name, date, shift_time, unallocated)
-    
-    # Create MSP_BASE and MSP sheets if branch_range_per_room is provided
-    if branch_range_per_room:
-        msp_base_ws = create_or_replace_sheet("MSP_BASE")
-        build_msp_base_sheet(msp_base_ws, branch_range_per_room)
-
-        msp_ws = create_or_replace_sheet("MSP")
-        build_msp_sheet(msp_ws, branch_range_per_room)
-    
-    # Create room layout sheets (one per room), after the analytic sheets
-    for room_name, rows in room_layout.items():
-        # Replace existing sheet with same room name, if any
-        ws = create_or_replace_sheet(room_name)
-        # Get branch counts for this room if provided
-        branch_counts = branch_counts_per_room.get(room_name, {}) if branch_counts_per_room else {}
-        build_room_sheet(ws, room_name, rows, college_name, exam_name, branch_counts)
-
-    wb.save(output_path)
-
-    print(f"Workbook created: {output_path}")
-    print(f"Workbook created with {len(wb.sheetnames)} sheets")
-    print(f"Sheet names: {wb.sheetnames}")
+    Yield the xlsx bytes of a workbook while it is being saved, ready for a
+    StreamingResponse. The zip is written to an unseekable pipe, so no full
+    copy of the file is ever held in memory and nothing is written to disk by us.
+    """
+    def save(pipe):
+        try:
+            with metrics.span("save"):
+                wb.save(pipe)
+        finally:
+            wb.close()
+
+    return iter_written_bytes(save, chunk_size)
 
 
 if __name__ == "__main__":
-    ### CHANGE PATH
-    with open("C:/Users/Ankita/OneDrive/Desktop/sample.xlsx", "rb") as f:
-        pairs = upload_students(f)
-        rooms = upload_rooms(f)
-        college_name, exam_name = upload_college_sem(f)
+    # Run from the repository root: python -m backend.utils INPUT.xlsx [OUTPUT.xlsx]
+    from backend.workbook import build_workbook
+
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python -m backend.utils INPUT.xlsx [OUTPUT.xlsx]")
+    input_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) == 3 else "seating_plan.xlsx"
+
+    with open(input_path, "rb") as f:
+        pairs, rooms, college_name, exam_name = upload_main_sheet(f)
         room_capacity = find_capacity_per_room(rooms)
 
         ### UNCOMMENT ANY ONE FUNCTION TO GENERATE DIFFERENT FORMATS
@@ -1158,8 +1530,7 @@ if __name__ == "__main__":
         # room_layout, unallocated, branch_counts_per_room, branch_range_per_room = fill_room_row_gap(pairs, room_capacity)
         # room_layout, unallocated, branch_counts_per_room, branch_range_per_room = fill_room_col_gap(pairs, room_capacity)
 
-        ### CHANGE PATH
-        build_workbook(room_layout, "C:/Users/Ankita/OneDrive/Desktop/sample.xlsx", college_name, exam_name, branch_counts_per_room, 
+        build_workbook(room_layout, output_path, college_name, exam_name, branch_counts_per_room, 
                       unallocated=unallocated, date="04-07-2023", shift_time="10:00-12:00", 
-                      branch_range_per_room=branch_range_per_room)
+                      branch_range_per_room=branch_range_per_room, branch_names=pairs.branches)
         
\ No newline at end of file
@@ -0,0 +1,1232 @@
+"""
+Excel output of seating plans: the QPD, MSP_BASE, MSP and room sheets, and
+the workbooks built from them.
+
+Everything that needs openpyxl lives here rather than in utils.py, so that
+importing utils (and with it starting the API) does not load openpyxl. utils
+forwards these names on first use, e.g. utils.build_workbook_in_memory imports
+this module the first time a workbook is built.
+"""
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+import datetime
+from io import BytesIO
+import multiprocessing
+import os
+import posixpath
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import weakref
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED, BadZipFile, ZipFile, ZipInfo
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell.cell import MergedCell
+from openpyxl.styles import Alignment, Border, Font, Side, PatternFill
+from openpyxl.packaging.relationship import RelationshipList
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE
+from openpyxl.styles.stylesheet import apply_stylesheet, write_stylesheet
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.merge import MergedCellRange
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.xml.constants import ARC_CONTENT_TYPES, ARC_STYLE, REL_NS, SHEET_MAIN_NS
+from openpyxl.xml.functions import fromstring, tostring
+
+from backend import metrics
+from backend.utils import (BranchRoomIndex, _clean_value, _range_text, allocate_seats, allocate_seats_spread,
+                           as_roster, masks_from_blocked_seats)
+
+
+_THICK = Side(border_style="thick", color="000000")
+_THIN = Side(border_style="thin", color="000000")
+THICK_BORDER = Border(top=_THICK, bottom=_THICK, left=_THICK, right=_THICK)
+THIN_BORDER = Border(top=_THIN, bottom=_THIN, left=_THIN, right=_THIN)
+YELLOW_FILL = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+_CENTER = Alignment(horizontal="center", vertical="center")
+_CENTER_WRAP = Alignment(horizontal="center", vertical="center", wrap_text=True)
+_LEFT = Alignment(horizontal="left", vertical="center")
+
+class CellStyle:
+    """
+    One named combination of font, alignment, border and fill.
+
+    The style objects are built once at import time and registered with each
+    workbook only the first time they are used in it; after that, styling a cell
+    is a copy of the cached style ids instead of four descriptor lookups.
+    """
+
+    __slots__ = ("font", "alignment", "border", "fill", "_arrays")
+
+    def __init__(self, font: Font = None, alignment: Alignment = None, border: Border = None,
+                 fill: PatternFill = None):
+        self.font = font
+        self.alignment = alignment
+        self.border = border
+        self.fill = fill
+        self._arrays = weakref.WeakKeyDictionary()  # {workbook: StyleArray}
+
+    def _style_array(self, wb) -> StyleArray:
+        array = self._arrays.get(wb)
+        if array is None:
+            array = StyleArray()
+            if self.font is not None:
+                array.fontId = wb._fonts.add(self.font)
+            if self.alignment is not None:
+                array.alignmentId = wb._alignments.add(self.alignment)
+            if self.border is not None:
+                array.borderId = wb._borders.add(self.border)
+            if self.fill is not None:
+                array.fillId = wb._fills.add(self.fill)
+            self._arrays[wb] = array
+        return array
+
+    def apply(self, cell):
+        """Give cell exactly this style, replacing whatever it had."""
+        cell._style = copy(self._style_array(cell.parent.parent))
+
+    def register(self, wb):
+        """Add this style to wb up front, so style ids do not depend on cell order."""
+        self._style_array(wb)
+
+STYLES = {
+    "title_20": CellStyle(Font(size=20, bold=True), _CENTER),
+    "title_18": CellStyle(Font(size=18, bold=True), _CENTER),
+    "title_16": CellStyle(Font(size=16, bold=True), _CENTER),
+    "title_14": CellStyle(Font(size=14, bold=True), _CENTER),
+    "subtitle_12": CellStyle(Font(size=12, bold=False), _CENTER),
+    "header": CellStyle(Font(size=11, bold=True), _CENTER, THICK_BORDER),
+    "header_10": CellStyle(Font(size=10, bold=True), _CENTER, THICK_BORDER),
+    "header_10_yellow": CellStyle(Font(size=10, bold=True), _CENTER, THICK_BORDER, YELLOW_FILL),
+    "cell": CellStyle(Font(size=10, bold=False), _CENTER, THICK_BORDER),
+    "cell_yellow": CellStyle(Font(size=10, bold=False), _CENTER, THICK_BORDER, YELLOW_FILL),
+    "cell_left": CellStyle(Font(size=10, bold=False), _LEFT, THICK_BORDER),
+    "cell_wrap": CellStyle(Font(size=10, bold=False), _CENTER_WRAP, THICK_BORDER),
+    "cell_wrap_top_left": CellStyle(Font(size=10, bold=False),
+                                    Alignment(horizontal="left", vertical="top", wrap_text=True), THICK_BORDER),
+    "thick_border": CellStyle(border=THICK_BORDER),
+    "blackboard": CellStyle(Font(size=11, bold=False), _CENTER, THIN_BORDER),
+    "seat": CellStyle(alignment=_CENTER_WRAP, border=THIN_BORDER),
+    "thin_border": CellStyle(border=THIN_BORDER),
+    "summary_header": CellStyle(Font(bold=True, size=12), _LEFT),
+    "summary_name": CellStyle(Font(size=11), _LEFT),
+    "summary_count": CellStyle(Font(size=11), _CENTER),
+}   # shared by build_qpd_sheet, build_msp_base_sheet, build_msp_sheet and build_room_sheet
+
+def register_styles(wb):
+    """Register every entry of STYLES with wb in a fixed order (ids then match across workbooks)."""
+    for style in STYLES.values():
+        style.register(wb)
+
+def _merge_column(ws, column: int, first_row: int, last_row: int):
+    """
+    Merge one column over first_row..last_row and give the covered cells a thick border.
+
+    Same result as ws.merge_cells plus setting cell.border on each cell, without
+    openpyxl's scan of every earlier merged range (the MSP sheets never merge
+    overlapping ranges) or its per-cell edge borders that are overwritten anyway,
+    so building the sheet stays linear in its rows. The top cell keeps its style.
+    """
+    letter = get_column_letter(column)
+    ws.merged_cells.ranges.add(MergedCellRange(ws, f"{letter}{first_row}:{letter}{last_row}"))
+    for row in range(first_row + 1, last_row + 1):
+        cell = ws._cells[row, column] = MergedCell(ws, row, column)
+        STYLES["thick_border"].apply(cell)
+
+def _as_branch_index(branch_counts_per_room=None, branch_range_per_room=None) -> BranchRoomIndex:
+    """Use a BranchRoomIndex as it is, or build one from the per-room dicts."""
+    for value in (branch_counts_per_room, branch_range_per_room):
+        if isinstance(value, BranchRoomIndex):
+            return value
+    return BranchRoomIndex(branch_counts_per_room, branch_range_per_room)
+
+def build_qpd_sheet(ws, branch_counts_per_room: dict, college_name: str = "", exam_name: str = "", 
+                    date: str = "", shift_time: str = "", unallocated: int = 0):
+    """
+    Build a formatted QPD (Quarterly Progress Distribution) sheet on the given worksheet.
+    
+    Args:
+        ws: openpyxl worksheet object to build the QPD sheet on
+        branch_counts_per_room: Dict like {'D-104': {'IT-II': 32, 'MBA-IV': 32}, ...}, or a BranchRoomIndex
+        college_name: Name of the college
+        exam_name: Name of the exam
+        date: Date string (e.g., "04-07-2023")
+        shift_time: Shift time (e.g., "10:00-12:00")
+        unallocated: Number of unallocated students
+    """
+    index = _as_branch_index(branch_counts_per_room)
+    all_rooms = index.rooms  # Preserve order from input
+
+    # Split each branch-semester like 'IT-II' into branch='IT' and semester='II', once per branch
+    qpd = defaultdict(dict)  # {semester: {branch: branch_idx}}
+    for b, branch_sem in enumerate(index.branches):
+        if '-' in branch_sem and index.counted[b]:
+            branch_name, semester = branch_sem.rsplit('-', 1)
+            qpd[semester][branch_name] = b
+    
+    # Get all semesters and branches, sorted
+    semesters = sorted(qpd.keys())
+    all_branches_by_sem = {}
+    for sem in semesters:
+        all_branches_by_sem[sem] = sorted(qpd[sem].keys())
+
+    # One count column per (semester, branch), as rows of room counts
+    columns = [qpd[sem][branch] for sem in semesters for branch in all_branches_by_sem[sem]]
+    table = index.counts[columns]
+    room_counts = table.T.tolist()
+    branch_totals = table.sum(axis=1).tolist()
+    
+    current_row = 1
+    
+    # Determine column structure first (needed for header width calculation)
+    col = 1
+    room_col_left = col
+    col += 1
+    
+    semester_start_cols = {}
+    semester_col_ranges = {}
+    
+    for sem in semesters:
+        semester_start_cols[sem] = col
+        num_branches = len(all_branches_by_sem[sem])
+        semester_col_ranges[sem] = (col, col + num_branches - 1)
+        col += num_branches
+    
+    total_col = col
+    col += 1
+    room_col_right = col
+    table_width = room_col_right
+    
+    # Header section
+    if exam_name:
+        title = f"QPD - {exam_name}"
+        ws.merge_cells(start_row=current_row, start_column=1, 
+                      end_row=current_row, end_column=table_width)
+        cell = ws.cell(row=current_row, column=1, value=title)
+        STYLES["title_16"].apply(cell)
+        current_row += 1
+    
+    if date or shift_time:
+        info_text = ""
+        if date:
+            info_text = f"Date: {date}"
+        if shift_time:
+            if info_text:
+                info_text += f" | Shift: {shift_time}"
+            else:
+                info_text = f"Shift: {shift_time}"
+        
+        ws.merge_cells(start_row=current_row, start_column=1, 
+                      end_row=current_row, end_column=table_width)
+        cell = ws.cell(row=current_row, column=1, value=info_text)
+        STYLES["subtitle_12"].apply(cell)
+        current_row += 2  # Extra space after header
+    
+    # Build header rows
+    header_row = current_row
+    
+    # First header row: Semester labels
+    cell = ws.cell(row=header_row, column=room_col_left, value="ROOM NO.")
+    STYLES["header"].apply(cell)
+    
+    for sem in semesters:
+        start_col, end_col = semester_col_ranges[sem]
+        ws.merge_cells(start_row=header_row, start_column=start_col,
+                      end_row=header_row, end_column=end_col)
+        cell = ws.cell(row=header_row, column=start_col, value=f"{sem} SEM")
+        STYLES["header"].apply(cell)
+    
+    cell = ws.cell(row=header_row, column=total_col, value="Total")
+    STYLES["header"].apply(cell)
+    
+    cell = ws.cell(row=header_row, column=room_col_right, value="ROOM NO.")
+    STYLES["header"].apply(cell)
+    
+    current_row += 1
+    
+    # Second header row: Branch names
+    for sem in semesters:
+        start_col = semester_start_cols[sem]
+        for idx, branch in enumerate(all_branches_by_sem[sem]):
+            col_idx = start_col + idx
+            cell = ws.cell(row=current_row, column=col_idx, value=branch)
+            STYLES["header_10"].apply(cell)
+    
+    # Empty cells for room columns and total in second header row
+    for col_idx in [room_col_left, total_col, room_col_right]:
+        STYLES["thick_border"].apply(ws.cell(row=current_row, column=col_idx, value=""))
+    
+    current_row += 1
+    
+    # Data rows - preserve original order from input
+    for room, counts in zip(all_rooms, room_counts):
+        row_total = 0
+        
+        # Left ROOM NO.
+        cell = ws.cell(row=current_row, column=room_col_left, value=room)
+        STYLES["cell"].apply(cell)
+        
+        # Semester columns, in the same order as `columns`
+        col_idx = room_col_left
+        for count in counts:
+            if count > 0:
+                row_total += count
+
+            col_idx += 1
+            cell = ws.cell(row=current_row, column=col_idx, value=count if count > 0 else "")
+            (STYLES["cell_yellow"] if count > 0 else STYLES["cell"]).apply(cell)
+        
+        # Total
+        cell = ws.cell(row=current_row, column=total_col, value=row_total if row_total > 0 else "")
+        (STYLES["cell_yellow"] if row_total > 0 else STYLES["cell"]).apply(cell)
+        
+        # Right ROOM NO.
+        cell = ws.cell(row=current_row, column=room_col_right, value=room)
+        STYLES["cell"].apply(cell)
+        
+        current_row += 1
+    
+    # Summary row
+    summary_row = current_row
+    current_row += 1
+    
+    # Summary label
+    cell = ws.cell(row=summary_row, column=room_col_left, value="Total")
+    STYLES["header_10"].apply(cell)
+    
+    grand_total = 0
+    
+    # Semester totals
+    for col_idx, branch_total in enumerate(branch_totals, start=room_col_left + 1):
+        grand_total += branch_total
+        cell = ws.cell(row=summary_row, column=col_idx, value=branch_total if branch_total > 0 else "")
+        (STYLES["header_10_yellow"] if branch_total > 0 else STYLES["header_10"]).apply(cell)
+    
+    # Grand total
+    cell = ws.cell(row=summary_row, column=total_col, value=grand_total)
+    (STYLES["header_10_yellow"] if grand_total > 0 else STYLES["header_10"]).apply(cell)
+    
+    STYLES["thick_border"].apply(ws.cell(row=summary_row, column=room_col_right, value=""))
+    
+    current_row += 1
+    
+    # Unallocated row
+    if unallocated > 0:
+        unallocated_row = current_row
+        current_row += 1
+        
+        # Left ROOM NO. - show "Unallocated"
+        cell = ws.cell(row=unallocated_row, column=room_col_left, value="Unallocated")
+        STYLES["header_10"].apply(cell)
+        
+        # Empty cells for all semester/branch columns
+        for sem in semesters:
+            start_col = semester_start_cols[sem]
+            for idx, branch in enumerate(all_branches_by_sem[sem]):
+                col_idx = start_col + idx
+                STYLES["thick_border"].apply(ws.cell(row=unallocated_row, column=col_idx, value=""))
+        
+        # Total column - show unallocated count
+        cell = ws.cell(row=unallocated_row, column=total_col, value=unallocated)
+        STYLES["header_10_yellow"].apply(cell)
+        
+        # Right ROOM NO. - empty
+        STYLES["thick_border"].apply(ws.cell(row=unallocated_row, column=room_col_right, value=""))
+    
+    # Add header rows at the bottom (branches first, then semester labels)
+    bottom_header_row1 = current_row  # Branch names row (first at bottom)
+    current_row += 1
+    
+    # First header row at bottom: Branch names
+    for sem in semesters:
+        start_col = semester_start_cols[sem]
+        for idx, branch in enumerate(all_branches_by_sem[sem]):
+            col_idx = start_col + idx
+            cell = ws.cell(row=bottom_header_row1, column=col_idx, value=branch)
+            STYLES["header_10"].apply(cell)
+    
+    # Empty cells for room columns and total in first header row at bottom
+    for col_idx in [room_col_left, total_col, room_col_right]:
+        STYLES["thick_border"].apply(ws.cell(row=bottom_header_row1, column=col_idx, value=""))
+    
+    bottom_header_row2 = current_row  # Semester labels row (second at bottom)
+    
+    # Second header row at bottom: Semester labels and ROOM NO.
+    cell = ws.cell(row=bottom_header_row2, column=room_col_left, value="ROOM NO.")
+    STYLES["header"].apply(cell)
+    
+    for sem in semesters:
+        start_col, end_col = semester_col_ranges[sem]
+        ws.merge_cells(start_row=bottom_header_row2, start_column=start_col,
+                      end_row=bottom_header_row2, end_column=end_col)
+        cell = ws.cell(row=bottom_header_row2, column=start_col, value=f"{sem} SEM")
+        STYLES["header"].apply(cell)
+    
+    cell = ws.cell(row=bottom_header_row2, column=total_col, value="Total")
+    STYLES["header"].apply(cell)
+    
+    cell = ws.cell(row=bottom_header_row2, column=room_col_right, value="ROOM NO.")
+    STYLES["header"].apply(cell)
+    
+    # Set column widths
+    ws.column_dimensions[get_column_letter(room_col_left)].width = 12
+    ws.column_dimensions[get_column_letter(room_col_right)].width = 12
+    ws.column_dimensions[get_column_letter(total_col)].width = 10
+    
+    for sem in semesters:
+        start_col = semester_start_cols[sem]
+        for idx, branch in enumerate(all_branches_by_sem[sem]):
+            col_idx = start_col + idx
+            ws.column_dimensions[get_column_letter(col_idx)].width = 10
+    
+    # Set row heights
+    for row in range(header_row, current_row + 1):
+        ws.row_dimensions[row].height = 20
+
+
+def build_msp_base_sheet(ws, branch_range_per_room: dict):
+    """
+    Build MSP_BASE (Master Student Plan Base) sheet showing roll number ranges per room and branch.
+    
+    Args:
+        ws: openpyxl worksheet object to build the MSP_BASE sheet on
+        branch_range_per_room: Dict like {'D-104': {'IT-II': ['201-208', '210-220'], 'EE-IV': ['401-410']}, ...},
+            or a BranchRoomIndex
+    """
+    index = _as_branch_index(branch_range_per_room=branch_range_per_room)
+    current_row = 1
+    
+    # Headers
+    headers = ["Room No.", "Branch", "Student Roll Nos."]
+    header_row = current_row
+    
+    for col_idx, header in enumerate(headers, start=1):
+        cell = ws.cell(row=header_row, column=col_idx, value=header)
+        STYLES["header"].apply(cell)
+    
+    current_row += 1
+    
+    # Data rows - preserve order of rooms (not sorted)
+    for r, room_no in enumerate(index.rooms):
+        if not index.room_branches[r]:
+            continue
+        
+        # Get all branches for this room (sorted for consistent display)
+        branch_list = sorted(index.room_branches[r], key=index.branches.__getitem__)
+        num_branches = len(branch_list)
+        
+        # First branch row
+        first_branch_row = current_row
+        
+        # Room No. cell (will be merged if multiple branches)
+        room_cell = ws.cell(row=first_branch_row, column=1, value=room_no)
+        STYLES["cell_left"].apply(room_cell)
+        
+        # Process each branch in this room
+        for branch_idx, branch in enumerate(branch_list):
+            row_num = first_branch_row + branch_idx
+            
+            # Branch
+            branch_cell = ws.cell(row=row_num, column=2, value=index.branches[branch])
+            STYLES["cell_left"].apply(branch_cell)
+            
+            # Format roll numbers
+            ranges = index.ranges[branch, r]
+            # "201-208" -> "(201 to 208)", single rolls as they are
+            roll_nos_text = ", ".join(_range_text(r) for r in ranges)
+            roll_cell = ws.cell(row=row_num, column=3, value=roll_nos_text)
+            STYLES["cell_wrap_top_left"].apply(roll_cell)
+            
+            # Calculate row height based on content length (reduced from before)
+            # Excel column width of 80 ≈ 80 characters (varies by font)
+            # Estimate wrapped lines: account for text length and wrapping
+            text_length = len(roll_nos_text)
+            column_width_chars = 80  # Column width in characters
+            # Account for comma+space separators (avg 2 chars per range/number)
+            # More conservative estimate to ensure all text fits
+            chars_per_line = max(60, column_width_chars - 20)  # Account for padding
+            estimated_lines = max(1, (text_length + chars_per_line - 1) // chars_per_line)
+            # Excel row height: reduced base height per line
+            base_height_per_line = 13  # Reduced further
+            calculated_height = max(18, estimated_lines * base_height_per_line + 3)  # Reduced padding
+            # Cap at reasonable maximum but allow for very long lists
+            row_height = min(calculated_height, 250)  # Reduced max further
+            ws.row_dimensions[row_num].height = row_height
+        
+        # Update current_row after processing all branches
+        current_row = first_branch_row + num_branches
+        
+        # Merge Room No. cell if multiple branches, with a border on all cells in the merged area
+        if num_branches > 1:
+            _merge_column(ws, 1, first_branch_row, current_row - 1)
+    
+    # Set column widths
+    ws.column_dimensions[get_column_letter(1)].width = 15  # Room No.
+    ws.column_dimensions[get_column_letter(2)].width = 20   # Branch
+    ws.column_dimensions[get_column_letter(3)].width = 80  # Student Roll Nos.
+    
+    # Set header row height
+    ws.row_dimensions[header_row].height = 20
+
+
+def build_msp_sheet(ws, branch_range_per_room: dict):
+    """
+    Build MSP (Master Student Plan) sheet showing roll number ranges grouped by branch.
+    Structure: Branch -> Student Roll Nos. -> Room No.
+    
+    Args:
+        ws: openpyxl worksheet object to build the MSP sheet on
+        branch_range_per_room: Dict like {'D-104': {'IT-II': ['201-208', '210-220'], 'EE-IV': ['401-410']}, ...},
+            or a BranchRoomIndex
+    """
+    # The index already holds {room: {branch: ranges}} by branch, in branch and room order
+    index = _as_branch_index(branch_range_per_room=branch_range_per_room)
+    
+    current_row = 1
+    
+    # Headers
+    headers = ["Branch", "Student Roll Nos.", "Room No."]
+    header_row = current_row
+    
+    for col_idx, header in enumerate(headers, start=1):
+        cell = ws.cell(row=header_row, column=col_idx, value=header)
+        STYLES["header"].apply(cell)
+    
+    current_row += 1
+    
+    # Data rows - grouped by branch (preserve order)
+    for branch in index.range_branches:
+        room_list = index.branch_rooms[branch]  # Preserve room order as they first appeared
+        num_rooms = len(room_list)
+        
+        # First room row for this branch
+        first_branch_row = current_row
+        
+        # Branch cell (will be merged if multiple rooms)
+        branch_cell = ws.cell(row=first_branch_row, column=1, value=index.branches[branch])
+        STYLES["cell"].apply(branch_cell)
+        
+        # Process each room for this branch
+        for room_idx, r in enumerate(room_list):
+            row_num = first_branch_row + room_idx
+            room_no = index.rooms[r]
+            
+            # Format roll numbers for this branch-room combination
+            ranges = index.ranges[branch, r]
+            # "201-208" -> "(201 to 208)", single rolls as they are
+            roll_nos_text = ", ".join(_range_text(r) for r in ranges)
+            roll_cell = ws.cell(row=row_num, column=2, value=roll_nos_text)
+            STYLES["cell_wrap"].apply(roll_cell)
+            
+            # Room No.
+            room_cell = ws.cell(row=row_num, column=3, value=room_no)
+            STYLES["cell"].apply(room_cell)
+            
+            # Calculate row height based on content length
+            text_length = len(roll_nos_text)
+            column_width_chars = 100  # Column width in characters for roll nos
+            chars_per_line = max(70, column_width_chars - 30)  # Account for padding
+            estimated_lines = max(1, (text_length + chars_per_line - 1) // chars_per_line)
+            # Excel row height: reduced base height per line
+            base_height_per_line = 13
+            calculated_height = max(18, estimated_lines * base_height_per_line + 3)
+            # Cap at reasonable maximum
+            row_height = min(calculated_height, 250)
+            ws.row_dimensions[row_num].height = row_height
+        
+        # Update current_row after processing all rooms for this branch
+        current_row = first_branch_row + num_rooms
+        
+        # Merge Branch cell if multiple rooms, with a border on all cells in the merged area
+        if num_rooms > 1:
+            _merge_column(ws, 1, first_branch_row, current_row - 1)
+    
+    # Set column widths - wider for better content visibility
+    ws.column_dimensions[get_column_letter(1)].width = 30  # Branch
+    ws.column_dimensions[get_column_letter(2)].width = 120  # Student Roll Nos. (wider for long lists)
+    ws.column_dimensions[get_column_letter(3)].width = 18  # Room No.
+    
+    # Set header row height
+    ws.row_dimensions[header_row].height = 25
+
+
+def generate_qpd(branch_counts_per_room: dict, college_name: str = "", exam_name: str = "", 
+                 date: str = "", shift_time: str = "", output_path: str = "qpd.xlsx", unallocated: int = 0):
+    """
+    Generate a formatted QPD (Question Paper Distribution) Excel file.
+    
+    Args:
+        branch_counts_per_room: Dict like {'D-104': {'IT-II': 32, 'MBA-IV': 32}, ...}
+        college_name: Name of the college
+        exam_name: Name of the exam
+        date: Date string (e.g., "04-07-2023")
+        shift_time: Shift time (e.g., "10:00-12:00")
+        output_path: Path to save the Excel file
+        unallocated: Number of unallocated students
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "QPD"
+    
+    build_qpd_sheet(ws, branch_counts_per_room, college_name, exam_name, date, shift_time, unallocated)
+    
+    wb.save(output_path)
+
+
+def build_room_sheet(ws, room_name: str, rows: list, college_name: str = "", exam_name: str = "", branch_counts: dict = None,
+                     branch_names: list = None):
+    """
+    Build one room's seating sheet.
+
+    Args:
+        rows: Room layout rows of StudentPair (or None for an empty seat)
+        branch_names: The Roster's `branches` table used to label each seat
+    """
+    if not rows:
+        return
+
+    max_seats = max(len(row) for row in rows)
+    total_columns = max(1, max_seats * 2)  # s1 and s2 occupy separate columns
+    arrow_banner = "^" * (max(5, total_columns * 2))
+    
+    # Use provided branch_counts or empty dict if not provided
+    if branch_counts is None:
+        branch_counts = {}
+
+    # Calculate required width for college name (font size 20, bold)
+    # Excel column width: 1 unit ≈ 1 character at default font size
+    # For font size 20, we need approximately: len(text) * (20/11) * 1.2 (for bold)
+    base_column_width = 18  # Default width for seating columns
+    column_width = base_column_width  # Will be adjusted if needed
+    
+    if college_name:
+        college_name_clean = _clean_value(college_name) or ""
+        if college_name_clean:
+            # Estimate width needed: account for larger font (20pt vs 11pt default) and bold
+            # Font size 20 is ~1.8x larger than default 11pt, plus 1.3 factor for bold and spacing
+            required_width = len(college_name_clean) * (20 / 11) * 1.3
+            current_total_width = total_columns * base_column_width
+            
+            # If college name needs more width, adjust column widths
+            if required_width > current_total_width:
+                # Calculate new column width to accommodate college name
+                column_width = max(base_column_width, required_width / total_columns)
+    
+    # Set all columns to the calculated width (before displaying college name)
+    for col in range(1, total_columns + 1):
+        ws.column_dimensions[get_column_letter(col)].width = column_width
+
+    def merge_and_set(row_idx, value, font_size=14):
+        ws.merge_cells(start_row=row_idx, start_column=1, end_row=row_idx, end_column=total_columns)
+        STYLES[f"title_{font_size}"].apply(ws.cell(row=row_idx, column=1, value=_clean_value(value)))
+
+    current_row = 1
+    
+    # Display college name in big font (no blank line after)
+    if college_name:
+        merge_and_set(current_row, college_name, font_size=20)
+        current_row += 1
+    
+    # Display exam name in big font (no blank line after)
+    if exam_name:
+        merge_and_set(current_row, exam_name, font_size=20)
+        current_row += 1
+    
+    # Display 'Seating Plan' heading (no blank line after)
+    merge_and_set(current_row, "Seating Plan", font_size=18)
+    current_row += 1
+    
+    # Display room name (no blank line after)
+    merge_and_set(current_row, room_name, font_size=16)
+    current_row += 1
+
+    # data_start_row starts right after the room name (blackboard will be first row of table)
+    data_start_row = current_row + 1
+    
+    # Add blackboard heading as first row of the table
+    blackboard_row = data_start_row
+    ws.row_dimensions[blackboard_row].height = 36
+    ws.merge_cells(start_row=blackboard_row, start_column=1, end_row=blackboard_row, end_column=total_columns)
+    blackboard_cell = ws.cell(row=blackboard_row, column=1, value=f"{arrow_banner}  Black Board  {arrow_banner}")
+    STYLES["blackboard"].apply(blackboard_cell)
+    # Apply border to the merged cell (apply to all cells in merged range for proper display)
+    for col in range(2, total_columns + 1):
+        STYLES["thin_border"].apply(ws.cell(row=blackboard_row, column=col))
+    
+    # Adjust data_start_row to start after blackboard row
+    data_start_row = blackboard_row + 1
+
+    for row_offset, row in enumerate(rows):
+        excel_row = data_start_row + row_offset
+        ws.row_dimensions[excel_row].height = 36
+
+        for seat_idx in range(1, max_seats + 1):
+            s1_col = (seat_idx - 1) * 2 + 1
+            s2_col = s1_col + 1
+
+            for col in (s1_col, s2_col):
+                cell = ws.cell(row=excel_row, column=col)
+                # Don't overwrite column width - use the width already set for college name
+                # ws.column_dimensions[get_column_letter(col)].width is already set above
+                STYLES["seat"].apply(cell)
+
+            if seat_idx <= len(row) and row[seat_idx - 1] is not None:
+                # Seats were parsed once at ingestion, only the labels are built here
+                s1_value, s2_value = row[seat_idx - 1].labels(branch_names)
+                ws.cell(row=excel_row, column=s1_col).value = s1_value if s1_value else ""
+                ws.cell(row=excel_row, column=s2_col).value = s2_value if s2_value else ""
+
+    if branch_counts:
+        summary_start = data_start_row + len(rows) + 2
+        # Use columns after the seating table to avoid conflicts
+        # Place summary in a dedicated area (columns 1-2, but ensure proper width)
+        summary_col1 = 1
+        summary_col2 = 2
+        
+        # Header row
+        header_row = summary_start
+        name_header = ws.cell(header_row, summary_col1, "Branch Name")
+        STYLES["summary_header"].apply(name_header)
+        
+        count_header = ws.cell(header_row, summary_col2, "No. of Students")
+        STYLES["summary_header"].apply(count_header)
+        
+        # Ensure column widths are adequate for summary (only if not already set wider)
+        if summary_col1 <= total_columns:
+            current_width = ws.column_dimensions[get_column_letter(summary_col1)].width or 18
+            ws.column_dimensions[get_column_letter(summary_col1)].width = max(current_width, 20)
+        else:
+            ws.column_dimensions[get_column_letter(summary_col1)].width = 20
+            
+        if summary_col2 <= total_columns:
+            current_width = ws.column_dimensions[get_column_letter(summary_col2)].width or 18
+            ws.column_dimensions[get_column_letter(summary_col2)].width = max(current_width, 18)
+        else:
+            ws.column_dimensions[get_column_letter(summary_col2)].width = 18
+        
+        # Data rows - each branch gets its own row
+        for idx, (branch, count) in enumerate(branch_counts.items(), start=1):
+            data_row = summary_start + idx
+            name_cell = ws.cell(data_row, summary_col1, _clean_value(branch))
+            STYLES["summary_name"].apply(name_cell)
+            
+            count_cell = ws.cell(data_row, summary_col2, _clean_value(count))
+            STYLES["summary_count"].apply(count_cell)
+
+
+# Worksheet parts -------------------------------------------------------------
+# Room sheets do not depend on each other, so they can be rendered to worksheet
+# XML in other processes and spliced into the package when the workbook is saved.
+
+_STYLE_ID_ATTR = re.compile(rb'(<(?:c|row)\b[^>]*?\ss="|<col\b[^>]*?\sstyle=")(\d+)(")')
+
+def _style_table(wb) -> list:
+    """wb's cellXfs as picklable (StyleArray, font, fill, border, alignment, protection, number format) tuples."""
+    table = []
+    for array in wb._cell_styles:
+        num_fmt = array.numFmtId
+        if num_fmt >= BUILTIN_FORMATS_MAX_SIZE:
+            num_fmt = wb._number_formats[num_fmt - BUILTIN_FORMATS_MAX_SIZE]
+        table.append((tuple(array), wb._fonts[array.fontId], wb._fills[array.fillId], wb._borders[array.borderId],
+                      wb._alignments[array.alignmentId], wb._protections[array.protectionId], num_fmt))
+    return table
+
+def _merge_style_table(wb, table: list) -> list:
+    """Register another workbook's style table with wb; returns wb's cellXfs id for each entry."""
+    ids = []
+    for values, font, fill, border, alignment, protection, num_fmt in table:
+        array = StyleArray(values)
+        array.fontId = wb._fonts.add(font)
+        array.fillId = wb._fills.add(fill)
+        array.borderId = wb._borders.add(border)
+        array.alignmentId = wb._alignments.add(alignment)
+        array.protectionId = wb._protections.add(protection)
+        if isinstance(num_fmt, str):
+            num_fmt = wb._number_formats.add(num_fmt) + BUILTIN_FORMATS_MAX_SIZE
+        array.numFmtId = num_fmt
+        ids.append(wb._cell_styles.add(array))
+    return ids
+
+def _remap_style_ids(xml: bytes, ids: list) -> bytes:
+    """Rewrite the s="" / style="" attributes of worksheet XML through ids."""
+    if ids == list(range(len(ids))):
+        return xml
+    return _STYLE_ID_ATTR.sub(lambda m: b"%s%d%s" % (m[1], ids[int(m[2])], m[3]), xml)
+
+def _worksheet_xml(ws) -> bytes:
+    """The worksheet part openpyxl would save for ws (strings are written inline, not shared)."""
+    writer = WorksheetWriter(ws, out=BytesIO())
+    writer.write()
+    return writer.out.getvalue()
+
+_scratch = threading.local()
+
+def render_room_sheet_xml(room_name: str, rows: list, college_name: str = "", exam_name: str = "",
+                          branch_counts: dict = None, branch_names: list = None):
+    """
+    Render one room sheet in a scratch workbook and return (worksheet_xml, style_table).
+
+    Safe to run in another process; the style ids in the XML index into style_table,
+    which _merge_style_table maps onto the destination workbook.
+    """
+    wb = getattr(_scratch, "workbook", None)
+    if wb is None:
+        # Reused per thread; its default sheet stays first, so room sheets are never the selected tab
+        wb = _scratch.workbook = Workbook()
+    ws = wb.create_sheet(room_name)
+    try:
+        build_room_sheet(ws, room_name, rows, college_name, exam_name, branch_counts, branch_names)
+        xml = _worksheet_xml(ws)
+    finally:
+        wb.remove(ws)
+    return xml, _style_table(wb)
+
+def _render_room_task(args):
+    return render_room_sheet_xml(*args)
+
+def room_render_pool(processes: int = None) -> ProcessPoolExecutor:
+    """Process pool for build_workbook_in_memory(render_executor=...); use it as a context manager."""
+    return ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+
+class _SheetPartsWriter(ExcelWriter):
+    """ExcelWriter that copies PlanWorkbook.sheet_parts into the package instead of serialising cells."""
+
+    def write_worksheet(self, ws):
+        xml = self.workbook.sheet_parts.get(ws)
+        if xml is None:
+            return super().write_worksheet(ws)
+        ws._rels = RelationshipList()
+        self._archive.writestr(ws.path[1:], xml)
+        self.manifest.append(ws)
+
+class PlanWorkbook(Workbook):
+    """
+    Workbook whose worksheets may be supplied as finished XML parts.
+
+    A worksheet listed in sheet_parts is only a placeholder (title and position);
+    its XML is written as-is when the workbook is saved.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sheet_parts = {}  # {worksheet: worksheet XML bytes}
+
+    def save(self, filename):
+        if self.read_only:
+            raise TypeError("Workbook is read-only")
+        archive = ZipFile(filename, "w", ZIP_DEFLATED, allowZip64=True)
+        self.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+        _SheetPartsWriter(self, archive).save()
+
+
+def _add_plan_sheets(wb, room_layout: dict, college_name: str = "", exam_name: str = "",
+                     branch_counts_per_room: dict = None, unallocated: int = 0, date: str = "", shift_time: str = "",
+                     branch_range_per_room: dict = None, branch_names: list = None, progress=None,
+                     render_executor=None, room_parts: dict = None, branch_index: BranchRoomIndex = None):
+    """
+    Create (or replace) the QPD, MSP_BASE, MSP and room sheets right after 'main'.
+
+    The three summary sheets read one BranchRoomIndex, built here from the per-room dicts
+    unless branch_index (e.g. Allocation.branch_index()) is given.
+
+    progress, if given, is called as progress(rooms_done, total_rooms) after each room sheet.
+    With a render_executor (see room_render_pool) and a PlanWorkbook, room sheets are
+    rendered to XML in parallel and stored in wb.sheet_parts; sheet order and names are unchanged.
+    room_parts ({room: render_room_sheet_xml result}) supplies already rendered rooms; the
+    rooms rendered here are added to it, so a caller can keep it as a cache.
+    """
+    # Determine insertion index: right after 'main' if present, else at the end
+    sheet_names = wb.sheetnames
+    if "main" in sheet_names:
+        insert_index = sheet_names.index("main") + 1
+    else:
+        insert_index = len(wb.worksheets)
+
+    # Helper to create/replace a sheet at the current insert_index
+    def create_or_replace_sheet(title: str):
+        nonlocal insert_index
+        if title in wb.sheetnames:
+            wb.remove(wb[title])
+        ws_local = wb.create_sheet(title=title, index=insert_index)
+        insert_index += 1
+        return ws_local
+
+    if (branch_counts_per_room or branch_range_per_room) and branch_index is None:
+        branch_index = BranchRoomIndex(branch_counts_per_room, branch_range_per_room)
+
+    # Create QPD sheet first if branch_counts_per_room is provided
+    if branch_counts_per_room:
+        qpd_ws = create_or_replace_sheet("QPD")
+        with metrics.span("qpd"):
+            build_qpd_sheet(qpd_ws, branch_index, college_name, exam_name, date, shift_time, unallocated)
+        metrics.SHEETS.inc(kind="qpd")
+    
+    # Create MSP_BASE and MSP sheets if branch_range_per_room is provided
+    if branch_range_per_room:
+        msp_base_ws = create_or_replace_sheet("MSP_BASE")
+        with metrics.span("msp_base"):
+            build_msp_base_sheet(msp_base_ws, branch_index)
+
+        msp_ws = create_or_replace_sheet("MSP")
+        with metrics.span("msp"):
+            build_msp_sheet(msp_ws, branch_index)
+        metrics.SHEETS.inc(2, kind="msp")
+    
+    if isinstance(wb, PlanWorkbook) and (render_executor is not None or room_parts is not None):
+        room_parts = {} if room_parts is None else room_parts
+        tasks = [(room_name, rows, college_name, exam_name,
+                  branch_counts_per_room.get(room_name, {}) if branch_counts_per_room else {}, branch_names)
+                 for room_name, rows in room_layout.items() if room_name not in room_parts]
+        # map yields in submission order, so placeholders are created in the usual sheet order
+        if render_executor is not None:
+            rendered = render_executor.map(_render_room_task, tasks, chunksize=8)
+        else:
+            rendered = map(_render_room_task, tasks)
+        with metrics.span("room_sheets"):
+            for done, room_name in enumerate(room_layout, start=1):
+                if room_name not in room_parts:
+                    room_parts[room_name] = next(rendered)
+                xml, style_table = room_parts[room_name]
+                ws = create_or_replace_sheet(room_name)
+                wb.sheet_parts[ws] = _remap_style_ids(xml, _merge_style_table(wb, style_table))
+                if progress is not None:
+                    progress(done, len(room_layout))
+        metrics.SHEETS.inc(len(room_layout), kind="room")
+        return
+
+    # Create room layout sheets (one per room), after the analytic sheets
+    with metrics.span("room_sheets"):
+        for done, (room_name, rows) in enumerate(room_layout.items(), start=1):
+            # Replace existing sheet with same room name, if any
+            ws = create_or_replace_sheet(room_name)
+            # Get branch counts for this room if provided
+            branch_counts = branch_counts_per_room.get(room_name, {}) if branch_counts_per_room else {}
+            build_room_sheet(ws, room_name, rows, college_name, exam_name, branch_counts, branch_names)
+            if progress is not None:
+                progress(done, len(room_layout))
+    metrics.SHEETS.inc(len(room_layout), kind="room")
+
+
+def build_workbook_in_memory(room_layout: dict, college_name: str = "", exam_name: str = "",
+                             branch_counts_per_room: dict = None, unallocated: int = 0, date: str = "", shift_time: str = "",
+                             branch_range_per_room: dict = None, branch_names: list = None, progress=None,
+                             render_executor=None, room_parts: dict = None,
+                             branch_index: BranchRoomIndex = None) -> Workbook:
+    """
+    Build a new seating-plan workbook in memory, with the same sheets as
+    build_workbook, and return it without saving.
+
+    Pass render_executor=room_render_pool() to render the room sheets on several cores,
+    and room_parts to reuse room sheets rendered for an earlier build (see _add_plan_sheets).
+    """
+    wb = PlanWorkbook()
+    # Remove default sheet in a brand-new workbook
+    if wb.worksheets:
+        wb.remove(wb.active)
+
+    _add_plan_sheets(wb, room_layout, college_name, exam_name, branch_counts_per_room, unallocated,
+                     date, shift_time, branch_range_per_room, branch_names, progress, render_executor, room_parts,
+                     branch_index)
+    return wb
+
+
+def generate_plan_workbook(pairs, room_capacity: dict, college_name: str = "", exam_name: str = "",
+                           mode: str = "normal", blocked_seats: dict = None, progress=None, render_executor=None,
+                           date: str = "", shift_time: str = "", avoid_same_branch: bool = False,
+                           time_budget: float = 1.0):
+    """
+    Allocate seats for one exam and build its plan workbook in memory.
+
+    Args:
+        pairs: Roster (or list of pair dicts) in seating order
+        room_capacity: {room_no: {'rows': 8, 'cols': 4, ...}} in room order
+        mode: One of SEAT_MASKS
+        blocked_seats: Optional {room_no: [(row, col), ...]} benches to leave empty
+        progress: Optional progress(rooms_done, total_rooms) callback
+        render_executor: Optional pool (room_render_pool) to render room sheets in parallel
+        date, shift_time: Session shown in the QPD header
+        avoid_same_branch: Arrange pairs with allocate_seats_spread, searching for time_budget seconds
+
+    Returns:
+        (workbook, Allocation)
+    """
+    roster = as_roster(pairs)
+    room_masks = masks_from_blocked_seats(room_capacity, blocked_seats)
+    with metrics.span("allocate"):
+        if avoid_same_branch:
+            allocation = allocate_seats_spread(roster, room_capacity, mode, room_masks, time_budget)
+        else:
+            allocation = allocate_seats(roster, room_capacity, mode, room_masks)
+    room_layout, unallocated, branch_counts_per_room, branch_range_per_room = allocation.as_tuple()
+    wb = build_workbook_in_memory(room_layout, college_name, exam_name, branch_counts_per_room, unallocated,
+                                  date, shift_time, branch_range_per_room, roster.branches,
+                                  progress=progress, render_executor=render_executor,
+                                  branch_index=allocation.branch_index())
+    return wb, allocation
+
+_ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")  # signature, ..., file name length, extra field length
+_SHEET_ELEMENT = re.compile(rb"<(?:\w+:)?sheet\b[^>]*/>")
+_SHEETS_BLOCK = re.compile(rb"(<((?:\w+:)?)sheets\b[^>]*>).*?(</\2sheets>)", re.S)
+_DEFINED_NAME = re.compile(rb"<((?:\w+:)?)definedName\b[^>]*>.*?</\1definedName>", re.S)
+_LOCAL_SHEET_ID = re.compile(rb'(\blocalSheetId=")(\d+)(")')
+_EMPTY_DEFINED_NAMES = re.compile(rb"<((?:\w+:)?)definedNames>\s*</\1definedNames>")
+_ACTIVE_TAB = re.compile(rb'(\bactiveTab=")(\d+)(")')
+_FIRST_SHEET = re.compile(rb'(\bfirstSheet=")(\d+)(")')
+_RELATIONSHIP_ELEMENT = re.compile(rb"<(?:\w+:)?Relationship\b[^>]*/>")
+_OVERRIDE_ELEMENT = re.compile(rb"<(?:\w+:)?Override\b[^>]*/>")
+_ID_ATTR = re.compile(rb'\bId="([^"]*)"')
+_PART_NAME_ATTR = re.compile(rb'\bPartName="([^"]*)"')
+_REL_ID_PREFIX = re.compile(rb'\s(\w+):id="')
+_OFFICE_DOCUMENT_REL = REL_NS + "/officeDocument"
+_STYLES_REL = REL_NS + "/styles"
+_CALC_CHAIN_REL = REL_NS + "/calcChain"
+
+
+def _copy_zip_member(src: ZipFile, dst: ZipFile, info: ZipInfo, chunk_size: int = 1024 * 1024):
+    """Append a member of src to dst as its compressed bytes, without inflating and deflating it again."""
+    src.fp.seek(info.header_offset)
+    signature, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(src.fp.read(_ZIP_LOCAL_HEADER.size))
+    if signature != b"PK\x03\x04":
+        raise BadZipFile(f"Bad local file header for {info.filename}")
+    src.fp.seek(name_length + extra_length, os.SEEK_CUR)
+
+    copied = ZipInfo(info.filename, info.date_time)
+    copied.compress_type = info.compress_type
+    copied.CRC, copied.compress_size, copied.file_size = info.CRC, info.compress_size, info.file_size
+    copied.external_attr = info.external_attr
+    copied.header_offset = dst.fp.tell()
+    # Sizes and CRC go in the local header, so no data descriptor follows the data
+    dst.fp.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = src.fp.read(min(chunk_size, remaining))
+        if not chunk:
+            raise BadZipFile(f"Truncated data for {info.filename}")
+        dst.fp.write(chunk)
+        remaining -= len(chunk)
+    dst.filelist.append(copied)
+    dst.NameToInfo[copied.filename] = copied
+    dst.start_dir = dst.fp.tell()
+    dst._didModify = True
+
+def _rels_part(part: str) -> str:
+    """Name of the relationships part that belongs to part, e.g. xl/_rels/workbook.xml.rels ("" for the package's)."""
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", name + ".rels")
+
+def _relationships(src: ZipFile, members: dict, part: str) -> list:
+    """(id, type, resolved part name) of each relationship of part; members maps lower-cased names to names."""
+    name = members.get(_rels_part(part).lower())
+    if name is None:
+        return []
+    directory = posixpath.dirname(part)
+    relationships = []
+    for rel in fromstring(src.read(name)):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") != "External":
+            target = target[1:] if target.startswith("/") else posixpath.normpath(posixpath.join(directory, target))
+        relationships.append((rel.get("Id"), rel.get("Type"), target))
+    return relationships
+
+def _remap_positions(pattern, xml: bytes, positions: dict) -> bytes:
+    """Rewrite sheet position attributes matched by pattern through positions ({old: new})."""
+    return pattern.sub(lambda m: b"%s%d%s" % (m[1], positions.get(int(m[2]), 0), m[3]), xml)
+
+def _splice_plan_sheets(path: str, room_layout: dict, college_name: str = "", exam_name: str = "",
+                        branch_counts_per_room: dict = None, unallocated: int = 0, date: str = "",
+                        shift_time: str = "", branch_range_per_room: dict = None, branch_names: list = None):
+    """
+    Add (or replace) the plan sheets of an existing xlsx file at the package level.
+
+    Same result as loading the file, _add_plan_sheets and saving, but only the new
+    sheets are built: every other part, e.g. the 'main' roster sheet, is copied with
+    its compressed bytes unchanged, and only the workbook, its relationships, the
+    content types and the stylesheet (to which the new sheets' styles are appended)
+    are rewritten. Sheets with a generated name (compared case-insensitively, like
+    Excel does) are replaced together with their defined names; parts only they
+    referred to, e.g. drawings, are left in the package. The calculation chain is
+    dropped when a sheet is replaced, so Excel rebuilds it.
+
+    Returns:
+        The sheet names of the updated file, or None (file untouched) if its
+        layout is not one this handles, e.g. a stylesheet in a non-standard place
+    """
+    with ZipFile(path) as src:
+        members = {name.lower(): name for name in src.namelist()}
+        workbook_part = next((target for _, rel_type, target in _relationships(src, members, "")
+                              if rel_type == _OFFICE_DOCUMENT_REL), None)
+        if workbook_part is None or not {workbook_part.lower(), _rels_part(workbook_part).lower(),
+                                         ARC_CONTENT_TYPES.lower()} <= members.keys():
+            return None
+        relationships = _relationships(src, members, workbook_part)
+        if not any(rel_type == _STYLES_REL and target == ARC_STYLE for _, rel_type, target in relationships):
+            return None  # apply_stylesheet only reads xl/styles.xml
+        workbook_xml = src.read(members[workbook_part.lower()])
+        sheets_block = _SHEETS_BLOCK.search(workbook_xml)
+        sheets = [(sheet.get("name"), int(sheet.get("sheetId")), sheet.get(f"{{{REL_NS}}}id"))
+                  for sheet in fromstring(workbook_xml).findall(f"{{{SHEET_MAIN_NS}}}sheets/{{{SHEET_MAIN_NS}}}sheet")]
+        elements = _SHEET_ELEMENT.findall(sheets_block[0]) if sheets_block else []
+        rel_prefix = _REL_ID_PREFIX.search(elements[0]) if elements else None
+        if len(elements) != len(sheets) or rel_prefix is None:
+            return None
+
+        # Build only the new sheets, in a workbook that starts from this file's styles
+        shell = Workbook()
+        shell.remove(shell.active)
+        apply_stylesheet(src, shell)
+        _add_plan_sheets(shell, room_layout, college_name, exam_name, branch_counts_per_room, unallocated,
+                         date, shift_time, branch_range_per_room, branch_names)
+
+        with metrics.span("save"):
+            # Sheet order as _add_plan_sheets leaves it: the new sheets right after 'main', else at the end
+            generated = {ws.title.lower() for ws in shell.worksheets}
+            replaced = [i for i, (name, _, _) in enumerate(sheets) if name.lower() in generated]
+            kept = [i for i in range(len(sheets)) if i not in replaced]
+            insert_at = next((n + 1 for n, i in enumerate(kept) if sheets[i][0] == "main"), len(kept))
+
+            rel_targets = {rel_id: target for rel_id, _, target in relationships}
+            removed_ids = {sheets[i][2] for i in replaced}
+            removed_parts = set()
+            for rel_id in removed_ids:
+                part = rel_targets.get(rel_id, "")
+                removed_parts |= {part.lower(), _rels_part(part).lower()}
+            if replaced:
+                for rel_id, rel_type, target in relationships:
+                    if rel_type == _CALC_CHAIN_REL:
+                        removed_ids.add(rel_id)
+                        removed_parts.add(target.lower())
+
+            # Part names, relationship ids and sheet ids for the new sheets
+            used_ids = {rel_id for rel_id, _, _ in relationships}
+            sheet_id = max((sheet[1] for sheet in sheets), default=0)
+            workbook_dir = posixpath.dirname(workbook_part)
+            added = []  # (title, part, rel id, sheet id, worksheet)
+            number = 0
+            for ws in shell.worksheets:
+                number += 1
+                while posixpath.join(workbook_dir, "worksheets", f"sheet{number}.xml").lower() in members:
+                    number += 1
+                rel_number = len(used_ids) + 1
+                while f"rId{rel_number}" in used_ids:
+                    rel_number += 1
+                used_ids.add(f"rId{rel_number}")
+                sheet_id += 1
+                added.append((ws.title, posixpath.join(workbook_dir, "worksheets", f"sheet{number}.xml"),
+                              f"rId{rel_number}", sheet_id, ws))
+
+            # workbook.xml: new <sheets>, defined names and tab positions moved with their sheets
+            prefix = sheets_block[2]
+            new_elements = [b'<%ssheet name="%s" sheetId="%d" %s:id="%s"/>'
+                            % (prefix, escape(title, {'"': "&quot;"}).encode("utf-8"), new_id,
+                               rel_prefix[1], rel_id.encode("ascii")) for title, _, rel_id, new_id, _ in added]
+            order = [elements[i] for i in kept[:insert_at]] + new_elements + [elements[i] for i in kept[insert_at:]]
+            workbook_xml = _SHEETS_BLOCK.sub(lambda m: m[1] + b"".join(order) + m[3], workbook_xml, count=1)
+            kept_positions = {i: n + (n >= insert_at) * len(added) for n, i in enumerate(kept)}
+
+            def defined_name(m):
+                local = _LOCAL_SHEET_ID.search(m[0])
+                if local is None:
+                    return m[0]
+                if int(local[2]) in replaced:
+                    return b""
+                return _remap_positions(_LOCAL_SHEET_ID, m[0], kept_positions)
+
+            workbook_xml = _EMPTY_DEFINED_NAMES.sub(b"", _DEFINED_NAME.sub(defined_name, workbook_xml))
+            final_names = [sheets[i][0] for i in kept[:insert_at]] + [title for title, *_ in added] + \
+                          [sheets[i][0] for i in kept[insert_at:]]
+            # The selected tab stays on the same name (a replaced sheet is selected again); the first
+            # visible tab falls back to the first sheet if its sheet was replaced
+            by_name = {name.lower(): n for n, name in enumerate(final_names)}
+            workbook_xml = _remap_positions(_ACTIVE_TAB, workbook_xml, {i: by_name[name.lower()]
+                                                                       for i, (name, _, _) in enumerate(sheets)})
+            workbook_xml = _remap_positions(_FIRST_SHEET, workbook_xml, kept_positions)
+
+            # Relationships and content types: drop what was removed, add the new worksheets
+            rels_xml = src.read(members[_rels_part(workbook_part).lower()])
+            rels_xml = _RELATIONSHIP_ELEMENT.sub(
+                lambda m: b"" if _ID_ATTR.search(m[0])[1].decode() in removed_ids else m[0], rels_xml)
+            rels_xml = rels_xml.replace(b"</Relationships>", b"".join(
+                b'<Relationship Id="%s" Type="%s/worksheet" Target="%s"/>'
+                % (rel_id.encode("ascii"), REL_NS.encode("ascii"),
+                   posixpath.relpath(part, workbook_dir).encode("utf-8"))
+                for _, part, rel_id, _, _ in added) + b"</Relationships>")
+            types_xml = src.read(members[ARC_CONTENT_TYPES.lower()])
+            types_xml = _OVERRIDE_ELEMENT.sub(
+                lambda m: b"" if _PART_NAME_ATTR.search(m[0])[1].decode()[1:].lower() in removed_parts else m[0],
+                types_xml)
+            types_xml = types_xml.replace(b"</Types>", b"".join(
+                b'<Override PartName="/%s" ContentType="%s"/>' % (part.encode("utf-8"), Worksheet.mime_type.encode())
+                for _, part, _, _, _ in added) + b"</Types>")
+
+            rewritten = {
+                members[workbook_part.lower()]: workbook_xml,
+                members[_rels_part(workbook_part).lower()]: rels_xml,
+                members[ARC_CONTENT_TYPES.lower()]: types_xml,
+            }
+            styles_part = members[ARC_STYLE.lower()]
+            fd, part_path = tempfile.mkstemp(suffix=".xlsx.part", dir=os.path.dirname(os.path.abspath(path)))
+            os.close(fd)
+            try:
+                with ZipFile(part_path, "w", ZIP_DEFLATED, allowZip64=True) as dst:
+                    for info in src.infolist():
+                        if info.filename.lower() in removed_parts or info.filename == styles_part:
+                            continue
+                        if info.filename in rewritten:
+                            dst.writestr(info.filename, rewritten[info.filename])
+                        else:
+                            _copy_zip_member(src, dst, info)
+                    for _, part, _, _, ws in added:
+                        dst.writestr(part, _worksheet_xml(ws))
+                    # Last, as openpyxl only adds a cell's style to the workbook when the cell is written
+                    dst.writestr(styles_part, tostring(write_stylesheet(shell)))
+                shutil.copymode(path, part_path)
+            except BaseException:
+                os.remove(part_path)
+                raise
+    os.replace(part_path, path)
+    return final_names
+
+
+def build_workbook(room_layout: dict, output_path: str = "seating_plan.xlsx", college_name: str = "", exam_name: str = "", 
+                  branch_counts_per_room: dict = None, unallocated: int = 0, date: str = "", shift_time: str = "",
+                  branch_range_per_room: dict = None, branch_names: list = None):
+    """
+    Build or update an Excel workbook with QPD/MSP and room-wise layouts.
+
+    `branch_names` is the `branches` table of the Roster the layout was
+    allocated from.
+
+    - If `output_path` already exists, it is **kept intact**: the new sheets are
+      spliced into the file (see _splice_plan_sheets), inserted **after the 'main'
+      sheet**, and its other sheets are copied without being loaded.
+    - If `output_path` does not exist, a new workbook is created.
+    """
+    sheet_names = None
+    if os.path.exists(output_path):
+        sheet_names = _splice_plan_sheets(output_path, room_layout, college_name, exam_name, branch_counts_per_room,
+                                          unallocated, date, shift_time, branch_range_per_room, branch_names)
+    if sheet_names is None:
+        # Load an existing workbook the splice does not handle, otherwise create a new one
+        if os.path.exists(output_path):
+            wb = load_workbook(output_path)
+        else:
+            wb = Workbook()
+            # Remove default sheet in a brand-new workbook
+            if wb.worksheets:
+                wb.remove(wb.active)
+
+        _add_plan_sheets(wb, room_layout, college_name, exam_name, branch_counts_per_room, unallocated,
+                         date, shift_time, branch_range_per_room, branch_names)
+
+        wb.save(output_path)
+        sheet_names = wb.sheetnames
+
+    print(f"Workbook created: {output_path}")
+    print(f"Workbook created with {len(sheet_names)} sheets")
+    print(f"Sheet names: {sheet_names}")